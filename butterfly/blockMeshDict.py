@@ -7,8 +7,10 @@ import vectormath
 from .grading import SimpleGrading, Grading, MultiGrading
 from .parser import CppDictParser
 from .geometry import BFGeometry
-from math import sqrt, sin, cos, radians
-from collections import OrderedDict
+from .polymesh import BLOCKFACES, lineDivide
+from math import sqrt, sin, cos, radians, log
+from collections import OrderedDict, namedtuple
+import re
 
 
 class BlockMeshDict(FoamFile):
@@ -37,13 +39,23 @@ class BlockMeshDict(FoamFile):
 
     @classmethod
     def fromFile(cls, filepah):
-        """Create a blockMeshDict from file."""
-        _cls = cls()
+        """Create a blockMeshDict from file.
 
+        A file with several hex blocks should be a grid of blocks as written by
+        MultiBlockMeshDict and a MultiBlockMeshDict will be returned.
+        """
         with open(filepah, 'rb') as bf:
             lines = CppDictParser._removeComments(bf.read())
             bmd = ' '.join(lines.replace('\r\n', ' ').replace('\n', ' ').split())
 
+        # get blocks, order of vertices, nDivXYZ, grading
+        blocks = bmd.split('blocks')[-1].split(';')[0].strip()
+        hexBlocks = re.findall(
+            r'hex\s*\(([^)]*)\)\s*\(([^)]*)\)\s*simpleGrading\s*\(([^)]*)\)',
+            blocks)
+
+        _cls = cls() if len(hexBlocks) < 2 else MultiBlockMeshDict()
+
         _cls.values['convertToMeters'] = \
             float(bmd.split('convertToMeters')[-1].split(';')[0])
 
@@ -53,21 +65,21 @@ class BlockMeshDict(FoamFile):
                                     .strip()[1:-1]
                                     .split())))
 
-        # get blocks, order of vertices, nDivXYZ, grading
-        blocks = bmd.split('blocks')[-1].split(';')[0].strip()
-        xyz, simpleGrading = blocks.split('simpleGrading')
+        if len(hexBlocks) < 2:
+            xyz, simpleGrading = blocks.split('simpleGrading')
 
-        _cls.__order, _cls.nDivXYZ = eval(','.join(xyz.split('hex')[-1].split()))
+            _cls.__order, _cls.nDivXYZ = \
+                eval(','.join(xyz.split('hex')[-1].split()))
 
-        simpleGrading = eval(','.join(simpleGrading.strip()[:-1]
-                                      .replace('( ', '(')
-                                      .replace(' )', ')')
-                                      .split()))
+            simpleGrading = eval(','.join(simpleGrading.strip()[:-1]
+                                          .replace('( ', '(')
+                                          .replace(' )', ')')
+                                          .split()))
 
-        _cls.grading = SimpleGrading(
-            *(MultiGrading(tuple(Grading(*i) for i in g))
-              if isinstance(g, tuple) else Grading(g)
-              for g in simpleGrading))
+            _cls.grading = SimpleGrading(
+                *(MultiGrading(tuple(Grading(*i) for i in g))
+                  if isinstance(g, tuple) else Grading(g)
+                  for g in simpleGrading))
 
         # recreate boundary faces
         boundaryString = bmd.replace(' (', '(').replace(' )', ')') \
@@ -81,6 +93,11 @@ class BlockMeshDict(FoamFile):
 
                 _cls.values['boundary'][key] = values
 
+        if len(hexBlocks) > 1:
+            blocks = tuple(tuple(tuple(float(v) for v in b.split())
+                                 for b in block) for block in hexBlocks)
+            _cls.__fromGridOfBlocks(blocks)
+
         del((lines, bmd))
         return _cls
 
@@ -640,6 +657,83 @@ class BlockMeshDict(FoamFile):
         numofver = len(self.__rawvertices)
         return _x / numofver, _y / numofver, _z / numofver
 
+    def __fromGridOfBlocks(self, blocks):
+        """Set vertices, boundary and segments from a grid of blocks.
+
+        Args:
+            blocks: A list of (vertex indices, nDivXYZ, expansion ratios) with x
+                changing fastest, then y and z as written by MultiBlockMeshDict.
+        """
+        vertices = self.__vertices
+        first = tuple(int(i) for i in blocks[0][0])
+        dy = first[3] - first[0]
+        dz = first[4] - first[0]
+        nx, ny = dy - 1, dz // max(dy, 1) - 1
+        nz = len(vertices) // max(dz, 1) - 1
+
+        def vtx(i, j, k):
+            return i + j * dy + k * dz
+
+        expected = tuple(
+            (vtx(i, j, k), vtx(i + 1, j, k), vtx(i + 1, j + 1, k),
+             vtx(i, j + 1, k), vtx(i, j, k + 1), vtx(i + 1, j, k + 1),
+             vtx(i + 1, j + 1, k + 1), vtx(i, j + 1, k + 1))
+            for k in range(max(nz, 0)) for j in range(max(ny, 0))
+            for i in range(max(nx, 0)))
+
+        if expected != tuple(tuple(int(i) for i in b[0]) for b in blocks) or \
+                len(vertices) != (nx + 1) * (ny + 1) * (nz + 1):
+            raise ValueError(
+                'The {} blocks in blockMeshDict are not a grid of blocks. Only '
+                'a single block or blocks written by MultiBlockMeshDict are '
+                'supported.'.format(len(blocks)))
+
+        def grid(index):
+            return index % dy, index // dy % (ny + 1), index // dz
+
+        # faces of the blocks to sides of the domain
+        for name, attr in self.values['boundary'].iteritems():
+            faces = attr['faces']
+            if faces and not hasattr(faces[0], '__iter__'):
+                faces = (faces,)
+            sides = []
+            for face in faces:
+                coordinates = tuple(grid(i) for i in face)
+                for side, (axis, position) in enumerate(
+                        ((0, 0), (0, nx), (1, 0), (1, ny), (2, 0), (2, nz))):
+                    if all(c[axis] == position for c in coordinates):
+                        break
+                else:
+                    raise ValueError(
+                        '{} in {} is not on the boundary of the blocks.'.format(
+                            face, name))
+                if side not in sides:
+                    sides.append(side)
+            attr['faces'] = tuple(BLOCKFACES[side] for side in sides)
+
+        segment = namedtuple('Segment', 'length nDiv expansionRatio')
+        segments = []
+        for axis, count in enumerate((nx, ny, nz)):
+            step = (1, nx, nx * ny)[axis]
+            segments.append(tuple(
+                segment(self.__distance(
+                            vertices[vtx(*(n if a == axis else 0
+                                           for a in range(3)))],
+                            vertices[vtx(*(n + 1 if a == axis else 0
+                                           for a in range(3)))]),
+                        int(blocks[n * step][1][axis]),
+                        blocks[n * step][2][axis])
+                for n in range(count)))
+
+        corners = (vtx(0, 0, 0), vtx(nx, 0, 0), vtx(nx, ny, 0), vtx(0, ny, 0),
+                   vtx(0, 0, nz), vtx(nx, 0, nz), vtx(nx, ny, nz), vtx(0, ny, nz))
+        self.__vertices = [vertices[i] for i in corners]
+        self.__rawvertices = self.__vertices
+        self.__order = tuple(range(8))
+        self.nDivXYZ = tuple(sum(s.nDiv for s in segs) for segs in segments)
+        self.grading = None
+        self._setSegments(segments)
+
     def __sortVertices(self):
         """sort input vertices."""
         groups = {}
@@ -711,3 +805,377 @@ class BlockMeshDict(FoamFile):
     def __repr__(self):
         """BlockMeshDict representation."""
         return self.toOpenFOAM()
+
+
+class MultiBlockMeshDict(BlockMeshDict):
+    """BlockMeshDict with a core block and graded buffer blocks.
+
+    The domain is the same box as BlockMeshDict. The core is a box inside the
+    domain with uniform cells of cellSizeXYZ. The core splits the domain into
+    a grid of up to 3 x 3 x 3 blocks and the cells in the buffer blocks grow by
+    expansionRatio from the core cell size toward the boundaries of the domain.
+    All the blocks in a row have the same divisions so the mesh is conformal.
+
+    Boundary and geometry are the same as BlockMeshDict and the faces of each
+    boundary are split between the blocks. The grading of BlockMeshDict is not
+    used. If the core is not set the dictionary is written as a single block.
+
+    Usage:
+        bmd = MultiBlockMeshDict.fromMinMax((-100, -100, 0), (100, 300, 60))
+        bmd.nDivXYZByCellSize((2, 2, 2))
+        bmd.setCore(geometryVertices, margin=10)
+        print bmd.nDivXYZ
+    """
+
+    def __init__(self, values=None):
+        """Init class."""
+        BlockMeshDict.__init__(self, values)
+        self.__core = None
+        self.__cellSizeXYZ = None
+        # segments from a blockMeshDict file
+        self.__segments = None
+        self.expansionRatio = 1.2
+
+    @property
+    def core(self):
+        """Core box as (minPt, maxPt) in local coordinates of the block.
+
+        Local coordinates start from the first vertex and are along width,
+        length and height of the block. None if the core is not set.
+        """
+        return self.__core
+
+    @property
+    def expansionRatio(self):
+        """Ratio between the size of two neighbouring cells in buffer blocks."""
+        return self.__expansionRatio
+
+    @expansionRatio.setter
+    def expansionRatio(self, r):
+        self.__expansionRatio = float(r)
+        self.__segments = None
+        assert self.__expansionRatio >= 1, \
+            'expansionRatio should be larger than 1 not {}.'.format(r)
+
+    @property
+    def cellSizeXYZ(self):
+        """Cell size in the core block as (x, y, z).
+
+        By default cell size will be calculated from number of divisions for a
+        single block.
+        """
+        if self.__cellSizeXYZ:
+            return self.__cellSizeXYZ
+        nx, ny, nz = BlockMeshDict.nDivXYZ.fget(self)
+        return self.width / nx, self.length / ny, self.height / nz
+
+    @property
+    def nDivXYZ(self):
+        """Total number of divisions in (x, y, z) for all the blocks."""
+        if not self.core:
+            return BlockMeshDict.nDivXYZ.fget(self)
+        return tuple(sum(s.nDiv for s in segments)
+                     for segments in self.segments)
+
+    @nDivXYZ.setter
+    def nDivXYZ(self, dXYZ):
+        BlockMeshDict.nDivXYZ.fset(self, dXYZ)
+
+    @property
+    def segments(self):
+        """Segments of the blocks along x, y and z axis.
+
+        Each segment is a namedtuple as (length, nDiv, expansionRatio).
+        """
+        size = (self.width, self.length, self.height)
+        if self.__segments and all(
+                abs(sum(seg.length for seg in segments) - s) <= 1e-6 * s
+                for s, segments in zip(size, self.__segments)):
+            return self.__segments
+
+        if not self.core:
+            return tuple((self.__segment(s, n, 1),)
+                         for s, n in zip(size, self.nDivXYZ))
+
+        return tuple(
+            self.__axisSegments(s, mn, mx, cs) for s, mn, mx, cs in
+            zip(size, self.core[0], self.core[1], self.cellSizeXYZ))
+
+    @property
+    def divisions(self):
+        """Normalized position of points along x, y and z axis.
+
+        Use this property to create the points of the mesh for all the blocks.
+        None if the core is not set.
+        """
+        if not self.core:
+            return None
+
+        divisions = []
+        for size, segments in zip((self.width, self.length, self.height),
+                                  self.segments):
+            positions = [0.0]
+            start = 0.0
+            for seg in segments:
+                positions.extend(
+                    (start + seg.length * d) / size for d in
+                    lineDivide(Grading.fromExpansionRatio(seg.expansionRatio),
+                               seg.nDiv)[1:])
+                start += seg.length
+            positions[-1] = 1.0
+            divisions.append(positions)
+        return tuple(divisions)
+
+    def setCore(self, points, margin=0):
+        """Set the core block from a list of points.
+
+        Args:
+            points: A list of (x, y, z). The core is the bounding box of the
+                points in local coordinates of the block.
+            margin: Distance to expand the core in all directions. The core
+                will be clamped to the domain (default: 0).
+        """
+        local = tuple(self.toLocal(p) for p in points)
+        assert local, 'Number of points should be larger than 0.'
+        size = (self.width, self.length, self.height)
+        minPt = tuple(max(0, min(p[i] for p in local) - margin)
+                      for i in range(3))
+        maxPt = tuple(min(size[i], max(p[i] for p in local) + margin)
+                      for i in range(3))
+
+        for mn, mx in zip(minPt, maxPt):
+            assert mx > mn, 'Core is outside the domain: {}, {}'.format(
+                minPt, maxPt)
+
+        self.__core = minPt, maxPt
+        self.__segments = None
+
+    def removeCore(self):
+        """Remove the core and use a single block."""
+        self.__core = None
+        self.__segments = None
+
+    def _setSegments(self, segments):
+        """Set segments of the blocks from a blockMeshDict file.
+
+        The core, cellSizeXYZ and expansionRatio are calculated from the
+        segments. The segments are used as long as the size of the domain
+        doesn't change.
+        """
+        minPt, maxPt, cellSizeXYZ = [], [], []
+        ratios = []
+        for segs in segments:
+            # the core is between the graded buffer segments
+            if len(segs) == 3 or (len(segs) == 2 and
+                                  segs[0].expansionRatio != 1):
+                core = 1
+            else:
+                core = 0
+            minPt.append(sum(seg.length for seg in segs[:core]))
+            maxPt.append(minPt[-1] + segs[core].length)
+            cellSizeXYZ.append(segs[core].length / segs[core].nDiv)
+            ratios.extend(
+                max(seg.expansionRatio, 1.0 / seg.expansionRatio) **
+                (1.0 / (seg.nDiv - 1))
+                for i, seg in enumerate(segs)
+                if i != core and seg.nDiv > 1 and seg.expansionRatio != 1)
+
+        if ratios:
+            self.expansionRatio = ratios[0]
+        self.__core = tuple(minPt), tuple(maxPt)
+        self.__cellSizeXYZ = tuple(cellSizeXYZ)
+        self.__segments = tuple(tuple(segs) for segs in segments)
+
+    def toLocal(self, point):
+        """Convert a point to local coordinates of the block."""
+        v = self.vertices
+        o = self.verticesOrder
+        origin = v[o[0]]
+        d = vectormath.subtract(point, origin)
+        return tuple(
+            vectormath.dotProduct(
+                d, vectormath.normalize(vectormath.subtract(v[o[i]], origin)))
+            for i in (1, 3, 4))
+
+    def nDivXYZByCellSize(self, cellSizeXYZ):
+        """Set cell size for the core and number of divisions by cell size."""
+        self.__cellSizeXYZ = tuple(float(c) for c in cellSizeXYZ)
+        self.__segments = None
+        BlockMeshDict.nDivXYZByCellSize(self, cellSizeXYZ)
+
+    def make2d(self, planeOrigin, planeNormal, width=0.1):
+        """Make the blockMeshDict two dimensional.
+
+        Two dimensional blockMeshDict is always a single block.
+        """
+        if self.core:
+            print 'Removing the core of MultiBlockMeshDict for 2d blockMeshDict.'
+            self.removeCore()
+        BlockMeshDict.make2d(self, planeOrigin, planeNormal, width)
+
+    @staticmethod
+    def __segment(length, nDiv, expansionRatio):
+        s = namedtuple('Segment', 'length nDiv expansionRatio')
+        return s(length, nDiv, expansionRatio)
+
+    def __axisSegments(self, size, minimum, maximum, cellSize):
+        """Calculate segments along an axis for core between minimum and maximum."""
+        tol = 1e-6 * size
+        segments = []
+        if minimum > tol:
+            segments.append(self.__bufferSegment(minimum, cellSize, True))
+
+        segments.append(self.__segment(
+            maximum - minimum,
+            max(1, int(round((maximum - minimum) / cellSize))), 1))
+
+        if size - maximum > tol:
+            segments.append(self.__bufferSegment(size - maximum, cellSize))
+
+        return tuple(segments)
+
+    def __bufferSegment(self, length, cellSize, reverse=False):
+        """Calculate a graded segment which starts from cellSize near the core.
+
+        Cells grow toward the end of the segment. For reversed segments cells
+        grow toward the start of the segment.
+        """
+        r = self.expansionRatio
+        if r == 1 or length <= cellSize:
+            return self.__segment(
+                length, max(1, int(round(length / cellSize))), 1)
+
+        # number of cells for a geometric series that starts from cellSize
+        n = max(1, int(round(log(1 + length * (r - 1) / cellSize) / log(r))))
+        expansion = r ** (n - 1)
+        return self.__segment(length, n,
+                              1.0 / expansion if reverse else expansion)
+
+    def __gridVertices(self):
+        """Calculate vertices of all the blocks.
+
+        Vertices are ordered with x changing fastest, then y and z.
+        """
+        v = tuple(self.vertices[i] for i in self.verticesOrder)
+        size = (self.width, self.length, self.height)
+        positions = []
+        for axis, segments in enumerate(self.segments):
+            p = [0.0]
+            for seg in segments:
+                p.append(p[-1] + seg.length)
+            positions.append([c / size[axis] for c in p])
+
+        vertices = []
+        for w in positions[2]:
+            for t in positions[1]:
+                for s in positions[0]:
+                    vertices.append(tuple(round(
+                        (1 - s) * (1 - t) * (1 - w) * c0 +
+                        s * (1 - t) * (1 - w) * c1 + s * t * (1 - w) * c2 +
+                        (1 - s) * t * (1 - w) * c3 + (1 - s) * (1 - t) * w * c4 +
+                        s * (1 - t) * w * c5 + s * t * w * c6 +
+                        (1 - s) * t * w * c7, 8)
+                        for c0, c1, c2, c3, c4, c5, c6, c7 in zip(*v)))
+
+        return vertices
+
+    def __blocks(self):
+        """Get blocks as a list of (vertex indices, nDivXYZ, expansionRatios)."""
+        segments = self.segments
+        nx, ny, nz = (len(s) for s in segments)
+        dy = nx + 1
+        dz = (nx + 1) * (ny + 1)
+        blocks = []
+        for k in range(nz):
+            for j in range(ny):
+                for i in range(nx):
+                    a = i + j * dy + k * dz
+                    blocks.append((
+                        (a, a + 1, a + 1 + dy, a + dy,
+                         a + dz, a + 1 + dz, a + 1 + dy + dz, a + dy + dz),
+                        (segments[0][i].nDiv, segments[1][j].nDiv,
+                         segments[2][k].nDiv),
+                        (segments[0][i].expansionRatio,
+                         segments[1][j].expansionRatio,
+                         segments[2][k].expansionRatio),
+                        (i, j, k)))
+        return blocks, (nx, ny, nz)
+
+    def __boundaryFaces(self, blocks, counts):
+        """Split faces of boundary between the blocks."""
+        order = self.verticesOrder
+        sides = tuple(frozenset(order[i] for i in f) for f in BLOCKFACES)
+        last = tuple(c - 1 for c in counts)
+        boundary = []
+        for name, attr in self.boundary.iteritems():
+            faces = attr['faces']
+            if faces and not hasattr(faces[0], '__iter__'):
+                faces = (faces,)
+            try:
+                indices = tuple(sides.index(frozenset(f)) for f in faces)
+            except ValueError:
+                raise ValueError(
+                    'One of the faces in {} is not a face of the block.'.format(
+                        name))
+
+            blockFaces = []
+            for side in indices:
+                axis = side // 2
+                position = last[axis] if side % 2 else 0
+                blockFaces.extend(
+                    tuple(block[0][i] for i in BLOCKFACES[side])
+                    for block in blocks if block[3][axis] == position)
+
+            boundary.append((name, attr['type'], blockFaces))
+
+        return boundary
+
+    def toOpenFOAM(self):
+        """Return OpenFOAM representation as a string."""
+        if not self.core:
+            return BlockMeshDict.toOpenFOAM(self)
+
+        blocks, counts = self.__blocks()
+        _body = "   %s\n" \
+                "   {\n" \
+                "       type %s;\n" \
+                "       faces\n" \
+                "       (\n" \
+                "%s\n" \
+                "       );\n" \
+                "   }\n"
+
+        boundary = '\n'.join(
+            _body % (name, bType,
+                     '\n'.join('\t' + str(f).replace(",", "") for f in faces))
+            for name, bType, faces in self.__boundaryFaces(blocks, counts))
+
+        return self.header() + \
+            "\nconvertToMeters %.4f;\n" \
+            "\n" \
+            "vertices\n" \
+            "(\n\t%s\n);\n" \
+            "\n" \
+            "blocks\n" \
+            "(\n%s\n);\n" \
+            "\n" \
+            "edges\n" \
+            "(\n);\n" \
+            "\n" \
+            "boundary\n(%s);\n" \
+            "\n" \
+            "mergePatchPair\n" \
+            "(\n);\n" % (
+                self.convertToMeters,
+                "\n\t".join(str(ver).replace(",", "")
+                            for ver in self.__gridVertices()),
+                "\n".join(
+                    "hex %s %s simpleGrading (%s)" % (
+                        str(ind).replace(",", ""), str(div).replace(",", ""),
+                        ' '.join('{:.6g}'.format(e) for e in exp))
+                    for ind, div, exp, _ in blocks),
+                boundary)
+
+    def __repr__(self):
+        """MultiBlockMeshDict representation."""
+        return self.toOpenFOAM()
@@ -1,17 +1,27 @@
 ﻿"""Butterfly OpenFOAM Case."""
 import os
 import re  # to check input names
+import time
+import inspect
 from shutil import rmtree  # to remove case folders if needed
-from distutils.dir_util import copy_tree  # to copy sHM meshes over to tri
-from collections import namedtuple
+from collections import namedtuple, OrderedDict
 from copy import deepcopy
 
 from .version import Version
-from .utilities import loadCaseFiles, loadProbeValuesFromFolder
+from .utilities import loadCaseFiles, loadProbeValuesFromFolder, linktree, \
+    movetree, removetree, foldersize
 from .geometry import bfGeometryFromStlFile, calculateMinMaxFromBFGeometries
+from .boundarycondition import BoundaryCondition, IndoorWallBoundaryCondition
 from .refinementRegion import refinementRegionsFromStlFile
 from .meshingparameters import MeshingParameters
 from .fields import Field
+from .timeindex import TimeIndex
+from .decomposition import DecompositionState
+from .featureedges import FeatureEdgeMesh
+from .polymesh import PolyMesh
+from .locationinmesh import findLocationInMesh, validateLocationInMesh
+from .runreport import RunReport, commandRecord
+from .commandfuture import CommandFuture
 
 #
 from .foamfile import FoamFile
@@ -43,6 +53,7 @@ from .functions import Probes
 from .decomposeParDict import DecomposeParDict
 
 from .runmanager import RunManager
+from .localrunmanager import LocalRunManager
 
 
 class Case(object):
@@ -58,8 +69,8 @@ class Case(object):
             use fromFolder, and fromBFGeometries classmethods.
     """
 
-    SUBFOLDERS = ('0', 'constant', 'constant\\polyMesh',
-                  'constant\\triSurface', 'system', 'log')
+    SUBFOLDERS = ('0', 'constant', os.path.join('constant', 'polyMesh'),
+                  os.path.join('constant', 'triSurface'), 'system', 'log')
 
     # minimum list of files to be able to run blockMesh and snappyHexMesh
     MINFOAMFILES = ('fvSchemes', 'fvSolution', 'controlDict', 'blockMeshDict',
@@ -76,10 +87,18 @@ class Case(object):
         self.__version = float(Version.OFVer)
         self.decomposeParDict = None
 
+        # set to True to keep processor folders between parallel commands
+        self.keepDecomposed = False
+
         # optional input for changing working directory
         # should not be used on OpenFOAM on Windows
         self.workingDir = os.path.join(os.path.expanduser('~'), 'butterfly')
 
+        # files, geometries and refinement regions of a lazy case which will
+        # be loaded on the first access. See fromFolder.
+        self.__lazyFiles = OrderedDict()
+        self.__lazyStlFiles = None
+
         # set foamfiles dynamically. This is flexible but makes documentation
         # tricky. also autocomplete won't work for this cases.
         self.__foamfiles = []
@@ -91,15 +110,22 @@ class Case(object):
         # place holder for refinment regions
         # use .addRefinementRegions to add regions to case
         self.__refinementRegions = []
-        self.runmanager = RunManager(self.projectName)
+
+        # run manager will be created on the first call based on the platform
+        self.__runmanager = None
 
     @classmethod
-    def fromFolder(cls, path, name=None):
+    def fromFolder(cls, path, name=None, lazy=False):
         """Create a Butterfly case from a case folder.
 
         Args:
             path: Full path to case folder.
             name: An optional new name for this case.
+            lazy: Only index the files when the case is created. Each file is
+                parsed on the first access (e.g. case.controlDict) and STL
+                files are loaded once geometries or refinementRegions are
+                needed. Boundary conditions of geometries are created from the
+                files in 0 folder once they are accessed (default: False).
         """
         # collect foam files
         __originalName = os.path.split(path)[-1]
@@ -108,6 +134,17 @@ class Case(object):
 
         _files = loadCaseFiles(path, fullpath=True)
 
+        if lazy:
+            _case = cls(name, (), ())
+            for f in (_files.zero, _files.constant, _files.system):
+                for p in f:
+                    if p:
+                        _case.__lazyFiles.setdefault(
+                            os.path.split(p)[-1].split('.')[0], p)
+            _case.__lazyStlFiles = tuple(f for f in _files.stl if f)
+            _case.__originalName = __originalName
+            return _case
+
         # convert files to butterfly objects
         ff = tuple(cls.__createFoamfileFromFile(p)
                    for f in (_files.zero, _files.constant, _files.system)
@@ -129,17 +166,8 @@ class Case(object):
         _case = cls(name, ff, bfGeometries)
 
         # update each field of boundary condition for geometries
-        for ff in _case.getFoamFilesFromLocation('0'):
-            for geo in _case.geometries:
-                try:
-                    f = ff.getBoundaryField(geo.name)
-                except AttributeError as e:
-                    if not geo.name.endswith('Conditions'):
-                        print(str(e))
-                else:
-                    # set boundary condition for the field
-                    setattr(geo.boundaryCondition, ff.name,
-                            Field.fromDict(f))
+        for geo in _case.geometries:
+            _case.__updateBoundaryCondition(geo.boundaryCondition, geo.name)
 
         refinementRegions = tuple(
             ref for f in _files.stl
@@ -203,7 +231,10 @@ class Case(object):
         # set the locationInMesh for snappyHexMeshDict
         if make2dParameters:
             meshingParameters.locationInMesh = make2dParameters.origin
-        if not meshingParameters.locationInMesh:
+        elif meshingParameters.findLocationInMesh:
+            cls.__findLocationInMesh(blockMeshDict, geometries,
+                                     meshingParameters)
+        elif not meshingParameters.locationInMesh:
             meshingParameters.locationInMesh = blockMeshDict.center
 
         # rename name for snappyHexMeshDict and stl file if starts with a digit
@@ -249,6 +280,34 @@ class Case(object):
         _cls.__originalName = normname
         return _cls
 
+    @staticmethod
+    def __findLocationInMesh(blockMeshDict, geometries, meshingParameters):
+        """Check or find locationInMesh outside the geometries.
+
+        A provided locationInMesh is only checked. Indoor walls enclose the
+        mesh by design and are not considered as solids.
+        """
+        solids = tuple(
+            geo for geo in geometries
+            if not isinstance(geo.boundaryCondition,
+                              IndoorWallBoundaryCondition))
+        point = meshingParameters.locationInMesh
+        if point:
+            if isinstance(point, str):
+                point = tuple(float(v) for v in point.strip()[1:-1].split())
+            check = validateLocationInMesh(point, blockMeshDict, solids)
+            if not check.isValid:
+                print 'locationInMesh {} is not valid: {}'.format(
+                    tuple(point), check)
+            return
+
+        try:
+            meshingParameters.locationInMesh = findLocationInMesh(
+                blockMeshDict, solids, blockMeshDict.center)
+        except ValueError as e:
+            print 'Failed to find locationInMesh:\n\t{}'.format(e)
+            meshingParameters.locationInMesh = blockMeshDict.center
+
     @classmethod
     def fromWindTunnel(cls, windTunnel, make2dParameters=None):
         """Create case from wind tunnel."""
@@ -301,9 +360,15 @@ class Case(object):
             'Do not use whitespace or special charecters.'.format(name)
         self.__projectName = name
 
+    @property
+    def isLazy(self):
+        """True if some of the files of the case are not loaded yet."""
+        return bool(self.__lazyFiles) or self.__lazyStlFiles is not None
+
     @property
     def geometries(self):
         """Butterfly geometries."""
+        self.__loadLazyStlFiles()
         if hasattr(self, 'blockMeshDict'):
             return self.__geometries + self.blockMeshDict.geometry
 
@@ -350,12 +415,12 @@ class Case(object):
     @property
     def polyMeshFolder(self):
         """polyMesh folder fullpath."""
-        return os.path.join(self.projectDir, 'constant\\polyMesh')
+        return os.path.join(self.projectDir, 'constant', 'polyMesh')
 
     @property
     def triSurfaceFolder(self):
         """triSurface folder fullpath."""
-        return os.path.join(self.projectDir, 'constant\\triSurface')
+        return os.path.join(self.projectDir, 'constant', 'triSurface')
 
     @property
     def postProcessingFolder(self):
@@ -367,14 +432,57 @@ class Case(object):
         """Fullpath to probes folder."""
         return os.path.join(self.postProcessingFolder, 'probes')
 
+    @property
+    def decompositionState(self):
+        """DecompositionState for processor folders of this case."""
+        return DecompositionState(self.projectDir)
+
+    @property
+    def runReport(self):
+        """RunReport for commands of this case (log/runReport.json)."""
+        return RunReport(self.projectDir)
+
+    @property
+    def runmanager(self):
+        """Run manager for executing OpenFOAM commands.
+
+        By default butterfly uses RunManager to run OpenFOAM for Windows in docker
+        on Windows and LocalRunManager to run the commands from a native OpenFOAM
+        installation on other systems. Set a different run manager to change the
+        backend. A run manager should implement command, run, terminate and
+        checkFileContents.
+        """
+        if not self.__runmanager:
+            if os.name == 'nt':
+                self.__runmanager = RunManager(self.projectName)
+            else:
+                self.__runmanager = LocalRunManager(self.projectName,
+                                                    self.projectDir)
+
+        if hasattr(self.__runmanager, 'projectDir'):
+            # make sure run manager is in sync with workingDir
+            self.__runmanager.projectDir = self.projectDir
+
+        return self.__runmanager
+
+    @runmanager.setter
+    def runmanager(self, rm):
+        if rm:
+            for m in ('command', 'run', 'terminate', 'checkFileContents'):
+                assert hasattr(rm, m), \
+                    '{} is not a valid run manager. Missing {}.'.format(rm, m)
+        self.__runmanager = rm
+
     @property
     def foamFiles(self):
         """Get all the foamFiles."""
+        self.__loadLazyFiles()
         return tuple(f for f in self.__foamfiles)
 
     @property
     def refinementRegions(self):
         """Get refinement regions."""
+        self.__loadLazyStlFiles()
         return self.__refinementRegions
 
     @property
@@ -406,30 +514,20 @@ class Case(object):
 
     def getSnappyHexMeshFolders(self):
         """Return sorted list of numerical folders."""
-        _f = [int(name) for name in os.listdir(self.projectDir)
-              if (name.isdigit() and
-                  os.path.isdir(os.path.join(self.projectDir,
-                                             name, 'polyMesh'))
-                  )]
-
-        _f.sort()
-
-        return tuple(str(f) for f in _f)
+        return tuple(name for name in TimeIndex(self.projectDir).names
+                     if os.path.isdir(os.path.join(self.projectDir, name,
+                                                   'polyMesh')))
 
     def getResultFolders(self):
         """Return sorted list of numerical folders."""
-        _f = [int(name) for name in os.listdir(self.projectDir)
-              if (name != '0' and name.isdigit() and
-                  os.path.isdir(os.path.join(self.projectDir, name)) and
-                  not os.path.isdir(os.path.join(self.projectDir, name, 'polyMesh'))
-                  )]
-
-        _f.sort()
-
-        return tuple(str(f) for f in _f)
+        return tuple(name for t, name in TimeIndex(self.projectDir).items
+                     if t != 0 and
+                     not os.path.isdir(os.path.join(self.projectDir, name,
+                                                    'polyMesh')))
 
     def getFoamFilesFromLocation(self, location=None):
         """Get foamFiles in a specific location (0, constant, system)."""
+        self.__loadLazyFiles(location)
         if not location:
             return tuple(f for f in self.__foamfiles)
         else:
@@ -447,6 +545,8 @@ class Case(object):
             return
         assert hasattr(foamfile, 'isFoamFile'), \
             '{} is not a FoamFile'.format(foamfile)
+        # the file replaces the file on disk for a lazy case
+        self.__lazyFiles.pop(foamfile.name, None)
         try:
             setattr(self, foamfile.name, foamfile)
             self.__foamfiles.append(foamfile)
@@ -469,8 +569,27 @@ class Case(object):
 
         self.snappyHexMeshDict.addRefinementRegion(refinementRegion)
 
-    def copySnappyHexMesh(self, folderNumber=None, overwrite=True):
-        """Copy the results of snappyHexMesh to constant/polyMesh."""
+    def copySnappyHexMesh(self, folderNumber=None, overwrite=True, move=True,
+                          link=False):
+        """Copy the results of snappyHexMesh to constant/polyMesh.
+
+        By default the mesh is moved to constant/polyMesh which is independent of
+        the size of the mesh and all the snappyHexMesh folders are removed in the
+        background afterwards. Use move=False to keep the snappyHexMesh folders
+        and copy the mesh instead.
+
+        Args:
+            folderNumber: Optional snappyHexMesh folder. Default is the last one.
+            overwrite: Set to False to add files to the current files in
+                constant/polyMesh (default: True).
+            move: Set to False to copy the mesh and keep the snappyHexMesh
+                folders (default: True).
+            link: Hardlink the files instead of copying them if move is False.
+                Hardlinked files share the same data with the files in
+                snappyHexMesh folder. Commands that modify the mesh in place
+                (e.g. renumberMesh -overwrite) will change both of them
+                (default: False).
+        """
         # pick the last numerical folder
         if folderNumber:
             _s = os.path.join(self.projectDir, str(folderNumber), 'polyMesh')
@@ -481,14 +600,36 @@ class Case(object):
                 return
             _s = os.path.join(self.projectDir, _folders[-1], 'polyMesh')
 
-        # copy files to constant/polyMesh
-        if overwrite:
-            self.removePolyMeshContent()
-
         try:
-            copy_tree(_s, self.polyMeshFolder)
+            if overwrite:
+                # prepare the new mesh next to polyMesh and swap the folders
+                _t = os.path.join(self.constantFolder, '.polyMesh.tmp')
+                removetree(_t, wait=True)
+                if move:
+                    movetree(_s, _t)
+                else:
+                    linktree(_s, _t, hardlink=link)
+
+                # keep blockMeshDict for older versions of OpenFOAM
+                bmd = os.path.join(self.polyMeshFolder, 'blockMeshDict')
+                if os.path.isfile(bmd) and \
+                        not os.path.isfile(os.path.join(_t, 'blockMeshDict')):
+                    os.rename(bmd, os.path.join(_t, 'blockMeshDict'))
+
+                removetree(self.polyMeshFolder)
+                os.rename(_t, self.polyMeshFolder)
+            else:
+                # hardlinks are safe if the source will be removed
+                linktree(_s, self.polyMeshFolder, hardlink=move or link)
         except Exception as e:
             print("Failed to copy snappyHexMesh folder: {}".format(e))
+            return
+
+        if move:
+            # source folder has no polyMesh anymore and should be removed
+            # separately
+            removetree(os.path.dirname(_s))
+            self.removeSnappyHexMeshFolders()
 
     def renameSnappyHexMeshFolders(self, add=True):
         """Rename snappyHexMesh numerical folders to name.org  and vice versa.
@@ -529,19 +670,37 @@ class Case(object):
 
         for f in _folders:
             try:
-                rmtree(os.path.join(self.projectDir, f))
+                removetree(os.path.join(self.projectDir, f))
             except Exception as e:
                 print('Failed to remove {}:\n{}'.format(f, e))
 
-    def removeResultFolders(self):
-        """Remove results folder."""
+    def removeResultFolders(self, keepLatest=0):
+        """Remove results folder.
+
+        Args:
+            keepLatest: Number of the latest result folders to be kept
+                (default: 0). Use DiskBudget to compress older folders instead
+                of removing them.
+        """
         _folders = self.getResultFolders()
+        if keepLatest:
+            _folders = _folders[:-int(keepLatest)]
         for _f in _folders:
             try:
-                rmtree(os.path.join(self.projectDir, _f))
+                removetree(os.path.join(self.projectDir, _f))
             except Exception as e:
                 print('Failed to remove {}:\n{}'.format(_f, e))
 
+    def removeProcessorFolders(self):
+        """Remove processor folders of a decomposed case."""
+        state = self.decompositionState
+        for f in state.processorFolders:
+            try:
+                removetree(f)
+            except Exception as e:
+                print('Failed to remove {}:\n{}'.format(f, e))
+        state.reset()
+
     def removePostProcessingFolder(self):
         """Remove post postProcessing folder."""
         if not os.path.isdir(self.postProcessingFolder):
@@ -558,7 +717,12 @@ class Case(object):
             if _f != 'blockMeshDict':
                 _fp = os.path.join(self.polyMeshFolder, _f)
                 if os.path.isfile(_fp):
-                    os.remove(_fp)
+                    try:
+                        os.remove(_fp)
+                    except OSError:
+                        # read-only files on Windows
+                        os.chmod(_fp, 0o666)
+                        os.remove(_fp)
                 elif os.path.isdir(_fp):
                     rmtree(_fp)
 
@@ -624,6 +788,7 @@ class Case(object):
 
         # write bfgeometries to stl file. __geometries is geometries without
         # blockMesh geometry
+        self.__loadLazyStlFiles()
         stlStr = (geo.toSTL() for geo in self.__geometries)
         stlName = self.__originalName or self.projectName
         with open(os.path.join(self.triSurfaceFolder,
@@ -645,17 +810,25 @@ class Case(object):
         ur"""Run an OpenFOAM command for this case.
         This method creates a log and err file under logFolder for each command.
         The output will be logged as {cmd}.log and {cmd}.err.
+
+        If keepDecomposed is True parallel commands will not reconstruct the case
+        and processor folders will be reused by the next parallel commands.
+        decomposePar only runs if the mesh, decomposeParDict or 0 folder has
+        changed. Use reconstructPar to reconstruct the results.
+
         Args:
             cmd: OpenFOAM command.
             args: Command arguments.
             decomposeParDict: Optional input for decomposeParDict to run analysis
                 in parallel if desired.
             run: Run the command in shell.
-            wait: Wait until the command is over.
+            wait: Wait until the command is over. Use commandAsync to get a
+                CommandFuture for commands that run in the background.
         returns:
             If run is True returns a namedtuple for
                 (success, error, process, logfiles, errorfiles).
-                success: as a boolen.
+                success: as a boolen. A command is successful if error files
+                    are empty and the exit code is 0.
                 error: None in case of success otherwise the error message as
                     a string.
                 process: Popen process.
@@ -667,14 +840,41 @@ class Case(object):
                 logfiles: A tuple for log files.
                 errorfiles: A tuple for error files.
         """
+        # mesh commands always decompose and reconstruct the case. Custom run
+        # managers which don't support decompose and reconstruct always run
+        # parallel commands with decomposePar and reconstructPar.
+        if decomposeParDict and self.keepDecomposed and \
+                isinstance(cmd, str) and \
+                cmd not in ('blockMesh', 'snappyHexMesh') and \
+                self.__acceptsArguments(
+                    self.runmanager.run if run else self.runmanager.command,
+                    ('decompose', 'reconstruct')):
+            state = self.decompositionState
+            decompose = state.decomposeArgs(decomposeParDict.numberOfSubdomains)
+            kwargs = {'decompose': decompose or False, 'reconstruct': False}
+            if decompose and run:
+                state.save()
+        else:
+            kwargs = {}
+
         if not run:
-            cmdlog = self.runmanager.command(cmd, args, decomposeParDict)
+            cmdlog = self.runmanager.command(cmd, args, decomposeParDict,
+                                             **kwargs)
             return cmdlog
         else:
             log = namedtuple('log', 'success error process logfiles errorfiles')
 
-            p, logfiles, errfiles = self.runmanager.run(cmd, args,
-                                                        decomposeParDict, wait)
+            # LocalRunManager records each command itself. Record the others
+            # here as a single command. commandAsync records the commands that
+            # don't wait once they are finished.
+            record = wait and not getattr(self.runmanager, 'report', False)
+            if record:
+                size = self.__folderSize()
+                start = time.time()
+
+            # RunManager also returns the pid files of the commands
+            p, logfiles, errfiles = self.runmanager.run(
+                cmd, args, decomposeParDict, wait, **kwargs)[:3]
 
             logfiles = tuple(os.path.normpath(os.path.join(self.projectDir, f))
                              for f in logfiles)
@@ -682,32 +882,193 @@ class Case(object):
             errfiles = tuple(os.path.normpath(os.path.join(self.projectDir, f))
                              for f in errfiles)
 
+            if record:
+                self.__addCommandRecord(cmd, start, p.returncode, logfiles, size)
+
             # check error files and raise and error
             if wait:
                 self.runmanager.checkFileContents(logfiles, mute=False)
                 hascontent, content = self.runmanager.checkFileContents(errfiles)
+                if not hascontent and p.returncode:
+                    content = '{} failed with exit code {}.'.format(
+                        cmd, p.returncode)
 
-                return log(not hascontent, content, p, logfiles, errfiles)
+                return log(not hascontent and not p.returncode, content or None,
+                           p, logfiles, errfiles)
             else:
                 # return a namedtuple assuming that the command is running fine.
                 return log(True, None, p, logfiles, errfiles)
 
-    def blockMesh(self, args=None, wait=True, overwrite=True,):
+    def __folderSize(self):
+        """Size of case folder if the run manager measures bytes written."""
+        if getattr(self.runmanager, 'measureBytesWritten', False):
+            return foldersize(self.projectDir)
+
+    def __addCommandRecord(self, cmd, start, exitCode, logfiles, size=None):
+        """Add a command that is not recorded by the run manager to runReport."""
+        name = cmd if isinstance(cmd, str) else '+'.join(cmd)
+        self.runReport.addCommand(commandRecord(
+            name, name, start, time.time() - start, exitCode=exitCode,
+            bytesWritten=foldersize(self.projectDir) - size
+            if size is not None else None,
+            logfile=logfiles[-1] if logfiles else None))
+
+    @staticmethod
+    def __acceptsArguments(func, names):
+        """Check if a function accepts keyword arguments."""
+        try:
+            spec = inspect.getargspec(func)
+        except TypeError:
+            # not a python function
+            return False
+        return spec.keywords is not None or all(n in spec.args for n in names)
+
+    def commandAsync(self, cmd, args=None, decomposeParDict=None,
+                     callback=None):
+        """Run an OpenFOAM command for this case in the background.
+
+        Args:
+            cmd: OpenFOAM command.
+            args: Command arguments.
+            decomposeParDict: Optional input for decomposeParDict to run analysis
+                in parallel if desired.
+            callback: Optional function to be called with the future once the
+                command is finished.
+        Returns:
+            A CommandFuture. Use result, success, error, tail, cancel and
+            addDoneCallback to follow the command. Use waitAll and asCompleted
+            from commandfuture to wait for several commands.
+        """
+        rm = self.runmanager
+        # LocalRunManager records each command itself. Record the others once
+        # they are finished.
+        record = not getattr(rm, 'report', False)
+        if record:
+            size = self.__folderSize()
+            start = time.time()
+
+        log = self.command(cmd, args, decomposeParDict, run=True, wait=False)
+        if isinstance(rm, RunManager):
+            # commands in docker can only be stopped through the run manager.
+            # only stop this command and not the other commands of the case.
+            pidfiles = tuple(rm.pidFile(c) for c in
+                             ((cmd,) if isinstance(cmd, str) else cmd))
+
+            def canceller(force):
+                rm.terminate(force, pidfiles)
+        else:
+            canceller = None
+        name = cmd if isinstance(cmd, str) else '+'.join(cmd)
+        future = CommandFuture(name, log.process, log.logfiles, log.errorfiles,
+                               rm.checkFileContents, canceller)
+        if record:
+            future.addDoneCallback(lambda f: self.__addCommandRecord(
+                cmd, start, f.returncode, f.logfiles, size))
+        if callback:
+            future.addDoneCallback(callback)
+        return future
+
+    def reconstructPar(self, times='latestTime', fields=None,
+                       removeProcessorFolders=False, wait=True):
+        """Reconstruct the results of a decomposed case.
+
+        Use this method to reconstruct the results when keepDecomposed is True.
+
+        Args:
+            times: Time steps to reconstruct. Use latestTime for the last time
+                step, a time value or a list of time values. Use None to
+                reconstruct all the time steps (default: latestTime).
+            fields: An optional list of fields to reconstruct (e.g. ('U', 'p')).
+                By default all the fields will be reconstructed.
+            removeProcessorFolders: Remove processor folders after reconstructing
+                the case (default: False).
+            wait: Wait until command execution ends.
+        Returns:
+            namedtuple(success, error, process, logfiles, errorfiles).
+        """
+        args = []
+        if times == 'latestTime':
+            args.append('latestTime')
+        elif isinstance(times, (list, tuple)):
+            args.append("time '{}'".format(','.join(str(t) for t in times)))
+        elif times is not None:
+            args.append("time '{}'".format(times))
+
+        if fields:
+            args.append("fields '({})'".format(' '.join(fields)))
+
+        log = self.command('reconstructPar', args, decomposeParDict=None,
+                           wait=wait)
+        if wait and log.success and removeProcessorFolders:
+            self.removeProcessorFolders()
+        return log
+
+    def blockMesh(self, args=None, wait=True, overwrite=True, native=False,
+                  fileFormat=None):
         """Run blockMesh.
 
         Args:
             args: Command arguments.
             wait: Wait until command execution ends.
             overwrite: Overwrite current content of the folder.
+            native: Write the mesh in python instead of running blockMesh
+                (default: False). The mesh has the same ordering as the mesh
+                from blockMesh. args and wait will be ignored.
+            fileFormat: File format for native mesh (ascii / binary). By default
+                writeFormat from controlDict will be used.
         Returns:
             namedtuple(success, error, process, logfiles, errorfiles).
         """
         if overwrite:
             self.removePolyMeshContent()
 
+        if native:
+            return self.__nativeBlockMesh(fileFormat)
+
         return self.command('blockMesh', args, decomposeParDict=None,
                             wait=wait)
 
+    def __nativeBlockMesh(self, fileFormat=None):
+        """Write polyMesh for blockMeshDict and log the mesh size."""
+        log = namedtuple('log', 'success error process logfiles errorfiles')
+        logfiles = (os.path.join(self.logFolder, 'blockMesh.log'),)
+        errfiles = (os.path.join(self.logFolder, 'blockMesh.err'),)
+        if not os.path.isdir(self.logFolder):
+            os.makedirs(self.logFolder)
+
+        values = self.controlDict.values if hasattr(self, 'controlDict') else {}
+        fileFormat = fileFormat or values.get('writeFormat') or 'ascii'
+        precision = int(values.get('writePrecision') or 6)
+        start, cpu = time.time(), sum(os.times()[:2])
+        size = foldersize(self.polyMeshFolder)
+
+        def addRecord(exitCode):
+            self.runReport.addCommand(commandRecord(
+                'blockMesh', 'PolyMesh.save', start, time.time() - start,
+                sum(os.times()[:2]) - cpu, exitCode=exitCode,
+                bytesWritten=foldersize(self.polyMeshFolder) - size))
+
+        try:
+            mesh = PolyMesh.fromBlockMeshDict(self.blockMeshDict)
+            mesh.save(self.polyMeshFolder, fileFormat, precision)
+        except Exception as e:
+            error = 'Failed to write polyMesh:\n\t{}'.format(e)
+            with open(errfiles[0], 'wb') as outf:
+                outf.write(error)
+            open(logfiles[0], 'wb').close()
+            addRecord(1)
+            return log(False, error, None, logfiles, errfiles)
+
+        with open(logfiles[0], 'wb') as outf:
+            outf.write('Writing polyMesh for {}\n'.format(mesh))
+            for patch in mesh.boundary:
+                outf.write('    {} {} faces\n'.format(patch.name, patch.nFaces))
+            outf.write('End\n')
+        open(errfiles[0], 'wb').close()
+        addRecord(0)
+
+        return log(True, None, None, logfiles, errfiles)
+
     def surfaceFeatureExtract(self, args=None, wait=True):
         """Run surfaceFeatureExtract command.
 
@@ -721,6 +1082,42 @@ class Case(object):
         return self.command('surfaceFeatureExtract', args, decomposeParDict=None,
                             wait=wait)
 
+    def extractFeatureEdges(self, includedAngle=150, refinementLevel=None,
+                            save=True):
+        """Extract feature edges from geometries and write the .eMesh file.
+
+        This method replaces surfaceFeatureExtract and doesn't need OpenFOAM.
+        snappyHexMeshDict will be set to explicit feature edge refinement.
+
+        Args:
+            includedAngle: Maximum angle between two faces for the edge between
+                them to be a feature edge (default: 150).
+            refinementLevel: Refinement level for feature edges. By default
+                current level in snappyHexMeshDict will be used if it is
+                already set to explicit feature edge refinement otherwise 2.
+            save: Save snappyHexMeshDict to the case folder (default: True).
+        Returns:
+            A FeatureEdgeMesh.
+        """
+        assert hasattr(self, 'snappyHexMeshDict'), \
+            '{} has no snappyHexMeshDict.'.format(self)
+
+        stlName = self.__originalName or self.projectName
+        self.__loadLazyStlFiles()
+        fem = FeatureEdgeMesh.fromBFGeometries(self.__geometries, includedAngle)
+        if not os.path.isdir(self.triSurfaceFolder):
+            os.makedirs(self.triSurfaceFolder)
+        fem.save(self.triSurfaceFolder, stlName)
+
+        if refinementLevel or \
+                self.snappyHexMeshDict.isFeatureEdgeRefinementImplicit:
+            self.snappyHexMeshDict.setFeatureEdgeRefinementToExplicit(
+                stlName, refinementLevel or 2)
+            if save:
+                self.snappyHexMeshDict.save(self.projectDir)
+
+        return fem
+
     def snappyHexMesh(self, args=None, wait=True):
         """Run snappyHexMesh.
 
@@ -809,6 +1206,86 @@ class Case(object):
         else:
             return FoamFile.fromFile(p)
 
+    def __getattr__(self, name):
+        """Load foamfiles of a lazy case on the first access."""
+        # use __dict__ to avoid recursion before __init__ (e.g. in deepcopy)
+        lazyFiles = self.__dict__.get('_Case__lazyFiles')
+        if not lazyFiles or name not in lazyFiles:
+            raise AttributeError(
+                "'{}' object has no attribute '{}'".format(
+                    self.__class__.__name__, name))
+
+        ff = self.__loadLazyFile(name)
+        if not ff:
+            raise AttributeError('Failed to load {}.'.format(name))
+        return ff
+
+    def __loadLazyFile(self, name):
+        """Load a file of a lazy case and add it to the case."""
+        ff = self.__createFoamfileFromFile(self.__lazyFiles.pop(name))
+        if ff and ff.name == 'snappyHexMeshDict':
+            ff.projectName = self.projectName
+        self.addFoamFile(ff)
+        return ff
+
+    def __loadLazyFiles(self, location=None):
+        """Load the remaining files of a lazy case.
+
+        Args:
+            location: Only load the files in this folder (0, constant, system).
+                By default all the remaining files will be loaded.
+        """
+        for name, p in tuple(self.__lazyFiles.iteritems()):
+            if location and \
+                    os.path.split(os.path.dirname(p))[-1] != location:
+                continue
+            if name in self.__lazyFiles:
+                self.__loadLazyFile(name)
+
+    def __loadLazyStlFiles(self):
+        """Load geometries and refinement regions of a lazy case."""
+        if self.__lazyStlFiles is None:
+            return
+        stlFiles, self.__lazyStlFiles = self.__lazyStlFiles, None
+
+        sHMD = getattr(self, 'snappyHexMeshDict', None)
+        if not sHMD:
+            return
+
+        names = tuple(os.path.split(f)[-1][:-4] for f in stlFiles)
+        geometries = tuple(geo for f, n in zip(stlFiles, names)
+                           if n in sHMD.stlFileNames
+                           for geo in bfGeometryFromStlFile(f))
+        for geo in geometries:
+            geo.deferBoundaryCondition(self.__boundaryConditionLoader(geo.name))
+        self.__geometries = tuple(self.__geometries) + geometries
+
+        self.addRefinementRegions(
+            ref for f, n in zip(stlFiles, names)
+            if n in sHMD.refinementRegionNames
+            for ref in refinementRegionsFromStlFile(
+                f, sHMD.refinementRegionMode(n)))
+
+    def __boundaryConditionLoader(self, name):
+        """Get a function to create boundary condition from 0 folder files."""
+        def load():
+            bc = BoundaryCondition()
+            self.__updateBoundaryCondition(bc, name)
+            return bc
+        return load
+
+    def __updateBoundaryCondition(self, bc, name):
+        """Set the fields of a boundary condition from 0 folder files."""
+        for ff in self.getFoamFilesFromLocation('0'):
+            try:
+                f = ff.getBoundaryField(name)
+            except AttributeError as e:
+                if not ff.name.endswith('Conditions'):
+                    print(str(e))
+            else:
+                # set boundary condition for the field
+                setattr(bc, ff.name, Field.fromDict(f))
+
     @staticmethod
     def __checkInputGeometries(geos):
         for geo in geos:
@@ -0,0 +1,273 @@
+# coding=utf-8
+"""Futures for OpenFOAM commands that run in the background.
+
+A CommandFuture is returned by Case.commandAsync. It exposes completion, the
+error state, log tails, cancellation and callbacks on completion. A background
+thread waits for the process so there is no need to poll it. Use waitAll and
+asCompleted to run commands of several cases at the same time.
+
+Usage:
+    futures = [case.commandAsync('checkMesh') for case in cases]
+    for future in asCompleted(futures):
+        print future.name, future.success, future.error
+"""
+import os
+import time
+import threading
+from Queue import Queue, Empty
+from collections import namedtuple
+from copy import deepcopy
+
+from .utilities import tail
+
+
+class CommandFuture(object):
+    """A command that runs in the background.
+
+    Args:
+        name: Name of the command.
+        process: A process with Popen interface (e.g. Popen or LocalProcess).
+        logfiles: Full path to log files.
+        errorfiles: Full path to error files.
+        checkFileContents: A function that gets a list of files and returns
+            (hasContent, content) (e.g. runmanager.checkFileContents).
+        canceller: Optional function to cancel the command. It is called with
+            force as the only argument. By default the process is terminated.
+    """
+
+    def __init__(self, name, process, logfiles, errorfiles,
+                 checkFileContents=None, canceller=None):
+        """Init future and start watching the process."""
+        self.__name = name
+        self.__process = process
+        self.__logfiles = tuple(logfiles)
+        self.__errorfiles = tuple(errorfiles)
+        self.__checkFileContents = checkFileContents
+        self.__canceller = canceller
+        self.__cancelled = False
+        self.__result = None
+        self.__callbacks = []
+        self.__lock = threading.Lock()
+        self.__done = threading.Event()
+        self.__thread = threading.Thread(target=self.__watch)
+        self.__thread.daemon = True
+        self.__thread.start()
+
+    @property
+    def name(self):
+        """Command name."""
+        return self.__name
+
+    @property
+    def process(self):
+        """The process for the command."""
+        return self.__process
+
+    @property
+    def logfiles(self):
+        """Full path to log files."""
+        return self.__logfiles
+
+    @property
+    def errorfiles(self):
+        """Full path to error files."""
+        return self.__errorfiles
+
+    @property
+    def isDone(self):
+        """True if the command is finished."""
+        return self.__done.is_set()
+
+    @property
+    def isRunning(self):
+        """True if the command is still running."""
+        return not self.__done.is_set()
+
+    @property
+    def cancelled(self):
+        """True if the command is cancelled."""
+        return self.__cancelled
+
+    @property
+    def returncode(self):
+        """Exit code of the command or None if it is still running."""
+        return self.__result.process.returncode if self.__result else None
+
+    @property
+    def success(self):
+        """True if the command has finished successfully.
+
+        None if the command is still running.
+        """
+        return self.__result.success if self.__result else None
+
+    @property
+    def error(self):
+        """Error message if the command has failed.
+
+        None if the command is still running or has finished successfully.
+        """
+        return self.__result.error if self.__result else None
+
+    def result(self, timeout=None):
+        """Wait for the command and return the result.
+
+        Returns:
+            A namedtuple as (success, error, process, logfiles, errorfiles)
+            similar to Case.command. Returns None if timeout is reached before
+            the command is finished.
+        """
+        self.wait(timeout)
+        return self.__result
+
+    def wait(self, timeout=None):
+        """Wait for the command to finish. Return True if it is finished."""
+        end = time.time() + timeout if timeout is not None else None
+        # wait without timeout will block keyboard interrupt in python 2
+        while not self.__done.wait(1 if end is None
+                                   else max(min(end - time.time(), 1), 0)):
+            if end is not None and time.time() >= end:
+                break
+        return self.__done.is_set()
+
+    def cancel(self, force=False):
+        """Cancel the command.
+
+        Args:
+            force: Kill the command instead of terminating it (default: False).
+        Returns:
+            False if the command is already finished.
+        """
+        if self.__done.is_set():
+            return False
+
+        self.__cancelled = True
+        try:
+            if self.__canceller:
+                self.__canceller(force)
+            elif force:
+                self.__process.kill()
+            else:
+                self.__process.terminate()
+        except OSError:
+            # process is already finished
+            pass
+        return True
+
+    def addDoneCallback(self, callback):
+        """Add a function to be called with this future once it is finished.
+
+        Callbacks are called in a background thread. If the command is already
+        finished the callback is called immediately.
+        """
+        with self.__lock:
+            if not self.__done.is_set():
+                self.__callbacks.append(callback)
+                return
+        self.__call(callback)
+
+    def tail(self, lines=20):
+        """Get the last lines of the latest log file with content."""
+        for f in reversed(self.logfiles):
+            if os.path.isfile(f) and os.path.getsize(f):
+                return tail(f, lines)
+        return ''
+
+    def __watch(self):
+        """Wait for the process and set the result."""
+        log = namedtuple('log', 'success error process logfiles errorfiles')
+        try:
+            code = self.__process.wait()
+        except Exception as e:
+            code, content = 1, 'Failed to wait for {}:\n\t{}'.format(
+                self.name, e)
+        else:
+            content = None
+            if self.__checkFileContents:
+                hasContent, content = self.__checkFileContents(
+                    self.errorfiles, mute=True)
+                content = content if hasContent else None
+            if not content and code:
+                content = '{} {} with exit code {}.'.format(
+                    self.name, 'is cancelled' if self.__cancelled else 'failed',
+                    code)
+
+        self.__result = log(not content and not code, content or None,
+                            self.__process, self.logfiles, self.errorfiles)
+
+        with self.__lock:
+            self.__done.set()
+            callbacks, self.__callbacks = self.__callbacks, []
+
+        for callback in callbacks:
+            self.__call(callback)
+
+    def __call(self, callback):
+        try:
+            callback(self)
+        except Exception as e:
+            print('Callback for {} failed:\n\t{}'.format(self.name, e))
+
+    def __deepcopy__(self, memo):
+        # running processes can't be copied
+        return self
+
+    def duplicate(self):
+        """Return this object. Futures can't be copied."""
+        return deepcopy(self)
+
+    def ToString(self):
+        """Overwrite .NET ToString method."""
+        return self.__repr__()
+
+    def __repr__(self):
+        """Command future representation."""
+        if not self.isDone:
+            state = 'running'
+        elif self.cancelled:
+            state = 'cancelled'
+        else:
+            state = 'succeeded' if self.success else 'failed'
+        return 'CommandFuture::{}::{}'.format(self.name, state)
+
+
+def waitAll(futures, timeout=None):
+    """Wait for all the futures to finish.
+
+    Returns:
+        A tuple of (done, notDone) futures.
+    """
+    end = time.time() + timeout if timeout is not None else None
+    for f in futures:
+        f.wait(None if end is None else max(end - time.time(), 0))
+    done = tuple(f for f in futures if f.isDone)
+    return done, tuple(f for f in futures if not f.isDone)
+
+
+def asCompleted(futures, timeout=None):
+    """Yield futures as they finish.
+
+    Futures are collected through callbacks so there is no polling of the
+    processes.
+
+    Args:
+        futures: A list of CommandFutures.
+        timeout: Optional timeout in seconds for all the futures. Remaining
+            futures are not yielded once timeout is reached.
+    """
+    queue = Queue()
+    futures = tuple(futures)
+    for f in futures:
+        f.addDoneCallback(queue.put)
+
+    end = time.time() + timeout if timeout is not None else None
+    for i in xrange(len(futures)):
+        while True:
+            wait = 1 if end is None else min(end - time.time(), 1)
+            if wait <= 0:
+                return
+            try:
+                yield queue.get(timeout=wait)
+                break
+            except Empty:
+                continue
@@ -91,6 +91,19 @@ class ControlDict(FoamFile):
     def writeInterval(self, value=100):
         self.values['writeInterval'] = str(int(value))
 
+    @property
+    def purgeWrite(self):
+        """Number of time folders to be kept during the run (default: 0).
+
+        Older time folders will be removed by OpenFOAM. 0 keeps all the time
+        folders.
+        """
+        return self.values['purgeWrite']
+
+    @purgeWrite.setter
+    def purgeWrite(self, value=0):
+        self.values['purgeWrite'] = str(int(value))
+
     @property
     def writeCompression(self):
         """Write results as .zip files.
@@ -103,3 +116,32 @@ class ControlDict(FoamFile):
     @writeCompression.setter
     def writeCompression(self, value=True):
         self.values['writeCompression'] = self.convertBoolValue(value)
+
+    @property
+    def stopAt(self):
+        """Controls the end time of the run (default: endTime).
+
+        Valid values are endTime, writeNow, noWriteNow and nextWrite. Change
+        stopAt to writeNow during the run to write the current time step and
+        stop the solver if runTimeModifiable is on.
+        """
+        return self.values['stopAt']
+
+    @stopAt.setter
+    def stopAt(self, value='endTime'):
+        _valid = ('endTime', 'writeNow', 'noWriteNow', 'nextWrite')
+        assert value in _valid, \
+            'Invalid stopAt value: {}. Valid values are {}'.format(value, _valid)
+        self.values['stopAt'] = value
+
+    @property
+    def runTimeModifiable(self):
+        """Re-read the dictionaries if they are modified during the run.
+
+        (default: True)
+        """
+        return self.values['runTimeModifiable']
+
+    @runTimeModifiable.setter
+    def runTimeModifiable(self, value=True):
+        self.values['runTimeModifiable'] = self.convertBoolValue(value)
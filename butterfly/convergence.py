@@ -0,0 +1,395 @@
+# coding=utf-8
+"""Convergence analytics for OpenFOAM residuals.
+
+Use ConvergenceAnalyzer to check the residual stream of a running or finished
+solution and summarizeConvergence to get a quick overview of many solutions.
+"""
+from __future__ import division
+import os
+import math
+from collections import namedtuple, OrderedDict
+from copy import deepcopy
+
+from .parser import ResidualParser
+
+
+class ConvergenceAnalyzer(object):
+    """Convergence analyzer for residual values.
+
+    Residuals are analyzed in log10 space. Slopes are calculated as decades per
+    iteration using a least square fit over the last n iterations (window).
+
+    Args:
+        residuals: An OrderedDict of residuals as {timestep: {field: value}}.
+            Use ResidualParser.residuals to get the values from a log file.
+        executionTimes: An optional OrderedDict of ExecutionTime values in
+            seconds as {timestep: seconds}. It is used to calculate ETA.
+        residualControl: An optional dictionary of target residuals as
+            {field: value} (e.g. fvSolution.residualControl).
+        endTime: Optional endTime of the solution. Estimated iterations will be
+            capped by the remaining iterations if provided.
+        window: Number of iterations for rolling values (default: 50).
+        plateauTolerance: Maximum absolute slope in decades per iteration for
+            a field to be considered stalled (default: 1e-4).
+        oscillationThreshold: Minimum fraction of sign changes between
+            successive iterations in the window for a field to be considered
+            oscillating (default: 0.5).
+    """
+
+    STATUS = ('converged', 'converging', 'stalled', 'oscillating', 'diverging',
+              'unknown')
+
+    def __init__(self, residuals, executionTimes=None, residualControl=None,
+                 endTime=None, window=50, plateauTolerance=1e-4,
+                 oscillationThreshold=0.5):
+        """Init convergence analyzer."""
+        self.window = window
+        self.plateauTolerance = float(plateauTolerance)
+        self.oscillationThreshold = float(oscillationThreshold)
+        self.residualControl = residualControl
+        self.endTime = endTime
+        self.__executionTimes = executionTimes or OrderedDict()
+        self.__times = tuple(residuals.keys())
+        self.__series = self.__logSeries(residuals)
+
+    @classmethod
+    def fromLogFile(cls, filepath, residualControl=None, endTime=None,
+                    window=50, plateauTolerance=1e-4, oscillationThreshold=0.5):
+        """Create a convergence analyzer from an OpenFOAM log file."""
+        p = ResidualParser(filepath)
+        return cls(p.residuals, p.executionTimes, residualControl, endTime,
+                   window, plateauTolerance, oscillationThreshold)
+
+    @classmethod
+    def fromSolution(cls, solution, window=50, plateauTolerance=1e-4,
+                     oscillationThreshold=0.5):
+        """Create a convergence analyzer from a Butterfly solution."""
+        assert hasattr(solution, 'residualFile'), \
+            '{} is not a valid Solution.'.format(solution)
+
+        return cls.fromLogFile(
+            solution.residualFile, solution.residualControl,
+            solution.controlDict.endTime, window, plateauTolerance,
+            oscillationThreshold)
+
+    @property
+    def window(self):
+        """Number of iterations for rolling values."""
+        return self.__window
+
+    @window.setter
+    def window(self, w):
+        w = int(w or 50)
+        assert w > 1, 'Window should be larger than 1 not {}.'.format(w)
+        self.__window = w
+
+    @property
+    def residualControl(self):
+        """Target residuals as a dictionary."""
+        return self.__residualControl
+
+    @residualControl.setter
+    def residualControl(self, rc):
+        self.__residualControl = {}
+        if not rc:
+            return
+
+        for key, value in rc.iteritems():
+            # residualControl keys can be regular expressions like "(U|k|epsilon)"
+            keys = str(key).replace('"', '').replace('(', '').replace(')', '')
+            for k in keys.split('|'):
+                try:
+                    self.__residualControl[k.strip()] = float(value)
+                except (TypeError, ValueError):
+                    # None or invalid value
+                    continue
+
+    @property
+    def endTime(self):
+        """End time of the solution."""
+        return self.__endTime
+
+    @endTime.setter
+    def endTime(self, t):
+        try:
+            self.__endTime = float(t)
+        except (TypeError, ValueError):
+            self.__endTime = None
+
+    @property
+    def fields(self):
+        """List of fields in residuals."""
+        return tuple(self.__series.keys())
+
+    @property
+    def timesteps(self):
+        """List of timesteps in residuals."""
+        return self.__times
+
+    @property
+    def latestTime(self):
+        """Latest timestep."""
+        return self.__times[-1] if self.__times else 0
+
+    def target(self, field):
+        """Get target residual for a field from residualControl.
+
+        Component fields (e.g. Ux) will use the value for the vector (e.g. U)
+        if there is no value for the component.
+        """
+        if field in self.residualControl:
+            return self.residualControl[field]
+        elif field[:-1] in self.residualControl and field[-1] in 'xyz':
+            return self.residualControl[field[:-1]]
+
+    def latest(self, field):
+        """Latest residual value for a field."""
+        values = self.__series.get(field)
+        if not values:
+            return None
+        return 10 ** values[-1]
+
+    def slope(self, field, window=None):
+        """Rolling slope for a field in decades per iteration.
+
+        A negative value means residuals are dropping.
+        """
+        values = self.__series.get(field, ())[-(window or self.window):]
+        if len(values) < 2:
+            return None
+
+        n = len(values)
+        xMean = (n - 1) / 2.0
+        yMean = sum(values) / n
+        num = sum((x - xMean) * (y - yMean) for x, y in enumerate(values))
+        den = sum((x - xMean) ** 2 for x in xrange(n))
+        return num / den
+
+    @property
+    def slopes(self):
+        """Rolling slopes for all the fields as a dictionary."""
+        return OrderedDict((f, self.slope(f)) for f in self.fields)
+
+    def isConverged(self, field):
+        """Check if a field has reached residualControl target."""
+        target = self.target(field)
+        latest = self.latest(field)
+        if target is None or latest is None:
+            return False
+        return latest <= target
+
+    def isPlateau(self, field, window=None):
+        """Check if residuals for a field has stopped dropping."""
+        window = window or self.window
+        if len(self.__series.get(field, ())) < window:
+            # not enough values to decide
+            return False
+
+        s = self.slope(field, window)
+        return s is not None and abs(s) < self.plateauTolerance
+
+    def isOscillating(self, field, window=None):
+        """Check if residuals for a field is oscillating in the window."""
+        window = window or self.window
+        values = self.__series.get(field, ())[-window:]
+        if len(values) < window:
+            return False
+
+        diffs = tuple(v1 - v0 for v0, v1 in zip(values[:-1], values[1:])
+                      if abs(v1 - v0) > self.plateauTolerance)
+
+        if len(diffs) < 2:
+            return False
+
+        signChanges = sum(1 for d0, d1 in zip(diffs[:-1], diffs[1:])
+                          if d0 * d1 < 0)
+
+        return signChanges / (len(values) - 2) >= self.oscillationThreshold
+
+    def status(self, field):
+        """Get convergence status for a field.
+
+        Returns:
+            One of converged, converging, stalled, oscillating, diverging or
+            unknown.
+        """
+        if self.isConverged(field):
+            return 'converged'
+        elif self.isOscillating(field):
+            return 'oscillating'
+        elif self.isPlateau(field):
+            return 'stalled'
+
+        s = self.slope(field)
+        if s is None:
+            return 'unknown'
+        return 'converging' if s < 0 else 'diverging'
+
+    @property
+    def isStalled(self):
+        """Return True if any unconverged field is stalled or oscillating."""
+        return any(self.status(f) in ('stalled', 'oscillating')
+                   for f in self.fields if self.target(f) is not None)
+
+    @property
+    def isConvergedAll(self):
+        """Return True if all the fields with a target are converged."""
+        fields = tuple(f for f in self.fields if self.target(f) is not None)
+        return bool(fields) and all(self.isConverged(f) for f in fields)
+
+    def iterationsToTarget(self, field):
+        """Estimate number of iterations to reach residualControl target.
+
+        Returns:
+            0 if the field is already converged, None if target is not set or
+            residuals are not dropping, otherwise number of iterations as an
+            integer.
+        """
+        target = self.target(field)
+        if target is None or not self.__series.get(field):
+            return None
+
+        if self.isConverged(field):
+            return 0
+
+        s = self.slope(field)
+        if not s or s >= 0:
+            return None
+
+        return int(math.ceil(
+            (math.log10(target) - self.__series[field][-1]) / s))
+
+    @property
+    def remainingIterations(self):
+        """Number of iterations until endTime if endTime is set."""
+        if self.endTime is None or len(self.__times) < 2:
+            return None
+
+        times = self.__times[-self.window:]
+        delta = (float(times[-1]) - float(times[0])) / (len(times) - 1)
+        if delta <= 0:
+            return None
+        return max(0, int(math.ceil((self.endTime - float(times[-1])) / delta)))
+
+    @property
+    def secondsPerIteration(self):
+        """Average ExecutionTime per iteration over the window."""
+        et = self.__executionTimes.values()[-self.window:]
+        if len(et) < 2:
+            return None
+        return max(0, (et[-1] - et[0]) / (len(et) - 1))
+
+    @property
+    def iterationsToConvergence(self):
+        """Estimated iterations until all fields reach their targets.
+
+        The value will be capped by the remaining iterations to endTime. None
+        if the estimate is not available.
+        """
+        its = tuple(self.iterationsToTarget(f) for f in self.fields
+                    if self.target(f) is not None)
+        remaining = self.remainingIterations
+
+        if not its or None in its:
+            # at least one field will not reach the target
+            return remaining
+
+        it = max(its)
+        return it if remaining is None else min(it, remaining)
+
+    @property
+    def eta(self):
+        """Estimated time in seconds until the solution is over.
+
+        None if the estimate is not available.
+        """
+        spi = self.secondsPerIteration
+        its = self.iterationsToConvergence
+        if spi is None or its is None:
+            return None
+        return its * spi
+
+    def report(self, field):
+        """Get convergence report for a field as a namedtuple.
+
+        Returns:
+            (field, latest, target, slope, status, iterationsToTarget)
+        """
+        r = namedtuple('FieldConvergence',
+                       'field latest target slope status iterationsToTarget')
+        return r(field, self.latest(field), self.target(field),
+                 self.slope(field), self.status(field),
+                 self.iterationsToTarget(field))
+
+    @property
+    def reports(self):
+        """Get convergence report for all the fields."""
+        return tuple(self.report(f) for f in self.fields)
+
+    def __logSeries(self, residuals):
+        """Convert residuals to log10 series for each field."""
+        series = OrderedDict()
+        for values in residuals.itervalues():
+            for field, value in values.iteritems():
+                try:
+                    v = float(value)
+                except (TypeError, ValueError):
+                    continue
+                # avoid math domain error for 0 residuals
+                series.setdefault(field, []).append(
+                    math.log10(v) if v > 0 else -300)
+        return series
+
+    def duplicate(self):
+        """Return a copy of this object."""
+        return deepcopy(self)
+
+    def ToString(self):
+        """Overwrite .NET ToString method."""
+        return self.__repr__()
+
+    def __repr__(self):
+        """Convergence analyzer representation."""
+        return 'ConvergenceAnalyzer::{}::{}'.format(
+            self.latestTime,
+            '::'.join('{}: {}'.format(f, self.status(f)) for f in self.fields))
+
+
+def summarizeConvergence(solutions, window=50, plateauTolerance=1e-4,
+                         oscillationThreshold=0.5):
+    """Summarize convergence for several solutions.
+
+    Args:
+        solutions: A list of Butterfly solutions.
+        window: Number of iterations for rolling values (default: 50).
+        plateauTolerance: Maximum absolute slope in decades per iteration for
+            a field to be considered stalled (default: 1e-4).
+        oscillationThreshold: Minimum fraction of sign changes for a field to
+            be considered oscillating (default: 0.5).
+
+    Returns:
+        A tuple of namedtuples as (projectName, timestep, converged, stalled,
+        stalledFields, eta) for each solution.
+    """
+    s = namedtuple('SolutionConvergence',
+                   'projectName timestep converged stalled stalledFields eta')
+
+    summaries = []
+    for solution in solutions:
+        if not os.path.isfile(solution.residualFile):
+            # the solution hasn't started yet
+            summaries.append(s(solution.projectName, 0, False, False, (), None))
+            continue
+
+        ca = ConvergenceAnalyzer.fromSolution(
+            solution, window, plateauTolerance, oscillationThreshold)
+
+        stalledFields = tuple(f for f in ca.fields
+                              if ca.target(f) is not None and
+                              ca.status(f) in ('stalled', 'oscillating'))
+
+        summaries.append(s(solution.projectName, ca.latestTime,
+                           ca.isConvergedAll, bool(stalledFields),
+                           stalledFields, ca.eta))
+
+    return tuple(summaries)
@@ -4,7 +4,9 @@
 Decompose parameters for parallel runs.
 """
 from foamfile import FoamFile, foamFileFromFile
+from meshestimator import estimateCellCount
 from collections import OrderedDict
+import multiprocessing
 
 
 class DecomposeParDict(FoamFile):
@@ -64,9 +66,174 @@ class DecomposeParDict(FoamFile):
             numberOfSubdomainsXYZ[1] * numberOfSubdomainsXYZ[2]
 
         values = {'method': 'simple',
+                  'numberOfSubdomains': str(numberOfSubdomains),
                   'simpleCoeffs':
-                  {'numberOfSubdomains': str(numberOfSubdomains),
-                   'n': str(numberOfSubdomainsXYZ).replace(',', ' '),
+                  {'n': str(numberOfSubdomainsXYZ).replace(',', ' '),
                    'delta': str(delta)}}
 
         return cls(values=values)
+
+    @classmethod
+    def hierarchical(cls, numberOfSubdomainsXYZ=None, delta=0.001, order='xyz'):
+        """Hierarchical method.
+
+        Args:
+            numberOfSubdomainsXYZ: Number of subdomains in x, y, z as a tuple
+                (default: (2, 1, 1))
+            delta: Cell skew factor (default: 0.001).
+            order: Order of decomposition (default: xyz).
+        """
+        try:
+            numberOfSubdomainsXYZ = tuple(numberOfSubdomainsXYZ)
+        except:
+            numberOfSubdomainsXYZ = (2, 1, 1)
+
+        numberOfSubdomains = numberOfSubdomainsXYZ[0] * \
+            numberOfSubdomainsXYZ[1] * numberOfSubdomainsXYZ[2]
+
+        values = {'method': 'hierarchical',
+                  'numberOfSubdomains': str(numberOfSubdomains),
+                  'hierarchicalCoeffs':
+                  {'n': str(numberOfSubdomainsXYZ).replace(',', ' '),
+                   'delta': str(delta),
+                   'order': order}}
+
+        return cls(values=values)
+
+    # scotch subdomains are not perfect cubes. hierarchical will be used if the
+    # area between subdomains is less than this factor times the area for cubes.
+    SCOTCHFACTOR = 1.15
+
+    @classmethod
+    def auto(cls, case, maxCores=None, cellsPerCore=50000):
+        """Create a decomposeParDict based on number of cells in a case.
+
+        Number of cells is read from constant/polyMesh if the case is meshed
+        otherwise it will be estimated from blockMeshDict and snappyHexMeshDict.
+        Number of subdomains is number of cells divided by cellsPerCore and is
+        limited to maxCores. The domain is split to n subdomains in x, y and z
+        using hierarchical method if the area between the subdomains is not
+        larger than the expected area for scotch (SCOTCHFACTOR times the area
+        between cube subdomains). Otherwise scotch will be used. hierarchical
+        splits the domain along the world axes so scotch is always used for
+        blocks which are not aligned with the world axes (e.g. a wind tunnel
+        which is rotated to the wind direction).
+
+        Args:
+            case: A butterfly case.
+            maxCores: Maximum number of cores (default: number of cpus).
+            cellsPerCore: Target number of cells for each core (default: 50000).
+        Returns:
+            A DecomposeParDict or None if the case should run in serial.
+        """
+        maxCores = int(maxCores or multiprocessing.cpu_count())
+        cellCount = estimateCellCount(case)
+        n = int(round(cellCount / float(cellsPerCore)))
+        n = max(1, min(n, maxCores))
+        if n == 1:
+            return None
+
+        try:
+            bmd = case.blockMeshDict
+        except AttributeError:
+            return cls.scotch(n)
+
+        axes = cls.__worldAxes(bmd)
+        if not axes:
+            return cls.scotch(n)
+
+        # size and number of divisions along world x, y and z
+        size = [0, 0, 0]
+        nDivXYZ = [0, 0, 0]
+        for s, d, i in zip((bmd.width, bmd.length, bmd.height), bmd.nDivXYZ,
+                           axes):
+            size[i], nDivXYZ[i] = s, d
+
+        split, area = cls.__bestSplit(n, size, nDivXYZ)
+
+        if split and area <= cls.SCOTCHFACTOR * cls.__idealArea(n, size,
+                                                                 nDivXYZ):
+            return cls.hierarchical(split)
+        return cls.scotch(n)
+
+    @staticmethod
+    def __worldAxes(bmd, tolerance=1e-6):
+        """Get the world axis for width, length and height of a block.
+
+        Returns:
+            A tuple of indices for world axes (e.g. (1, 0, 2) if width of the
+            block is along y axis) or None if the block is not aligned with the
+            world axes.
+        """
+        vertices, order = bmd.vertices, bmd.verticesOrder
+        axes = []
+        for i in (1, 3, 4):
+            v = tuple(b - a for a, b in zip(vertices[order[0]],
+                                            vertices[order[i]]))
+            length = sum(c ** 2 for c in v) ** 0.5
+            if not length:
+                return None
+            axis = max(xrange(3), key=lambda c: abs(v[c]))
+            if abs(v[axis]) < length * (1 - tolerance):
+                return None
+            axes.append(axis)
+
+        return tuple(axes) if len(set(axes)) == 3 else None
+
+    @staticmethod
+    def __idealArea(n, size, nDivXYZ):
+        """Area between n subdomains if all the subdomains were cubes.
+
+        Dimensions which are smaller than the side of the cube are not split
+        (e.g. height of a wide wind tunnel or 2d cases).
+        """
+        sides = sorted(s for s, d in zip(size, nDivXYZ) if d > 1)
+        depth = 1
+        for s, d in zip(size, nDivXYZ):
+            if d <= 1:
+                depth *= s
+
+        while sides:
+            k = len(sides)
+            volume = reduce(lambda a, b: a * b, sides)
+            a = (volume / float(n)) ** (1.0 / k)
+            if sides[0] >= a or k == 1:
+                break
+            # too thin to be split
+            depth *= sides.pop(0)
+
+        if not sides:
+            return 0
+
+        # boundary of the domain and boundary of each cube
+        boundary = 2 * sum(volume / s for s in sides)
+        return (n * 2 * k * a ** (k - 1) - boundary) / 2.0 * depth
+
+    @staticmethod
+    def __bestSplit(n, size, nDivXYZ):
+        """Find (nx, ny, nz) with the smallest area between subdomains.
+
+        Returns:
+            (split, area). split is None if n can't be split with the number of
+            divisions in blockMeshDict.
+        """
+        best, bestArea = None, None
+        for nx in xrange(1, n + 1):
+            if n % nx:
+                continue
+            for ny in xrange(1, n // nx + 1):
+                if (n // nx) % ny:
+                    continue
+                nz = n // nx // ny
+                if nx > nDivXYZ[0] or ny > nDivXYZ[1] or nz > nDivXYZ[2]:
+                    continue
+                area = (nx - 1) * size[1] * size[2] + \
+                    (ny - 1) * size[0] * size[2] + \
+                    (nz - 1) * size[0] * size[1]
+                # use aspect ratio of subdomains for splits with the same area
+                sub = sorted(s / d for s, d in zip(size, (nx, ny, nz)))
+                key = (round(area, 6), sub[-1] / sub[0] if sub[0] else 0)
+                if bestArea is None or key < bestArea:
+                    best, bestArea = (nx, ny, nz), key
+
+        return best, bestArea[0] if bestArea else None
@@ -0,0 +1,175 @@
+# coding=utf-8
+"""Decomposition state for parallel runs that keep processor folders.
+
+DecompositionState keeps track of the inputs of the last decomposePar for a case
+so the processor folders can be reused between commands. decomposePar is only
+executed if the mesh, decomposeParDict or the files in 0 folder have changed.
+
+Usage:
+    state = DecompositionState(case.projectDir)
+    args = state.decomposeArgs(numberOfSubdomains)
+    # None: processor folders are up to date, ('fields',): only 0 folder has
+    # changed, ('force',): decompose the case again.
+"""
+import os
+import json
+import hashlib
+from glob import glob
+from copy import deepcopy
+
+
+class DecompositionState(object):
+    """Decomposition state for a case folder.
+
+    Hashes for the mesh, decomposeParDict and 0 folder are saved to
+    log/decomposition.json. The mesh hash is calculated from name, size and
+    modification time of the files in constant/polyMesh so it is independent of
+    the size of the mesh. Hashes for decomposeParDict and 0 folder are calculated
+    from the content of the files.
+
+    Args:
+        projectDir: Full path to case folder.
+    """
+
+    STATEFILE = 'decomposition.json'
+
+    def __init__(self, projectDir):
+        """Init decomposition state."""
+        self.projectDir = projectDir
+
+    @property
+    def projectDir(self):
+        """Full path to case folder."""
+        return self.__projectDir
+
+    @projectDir.setter
+    def projectDir(self, p):
+        self.__projectDir = os.path.normpath(p)
+
+    @property
+    def stateFile(self):
+        """Full path to state file."""
+        return os.path.join(self.projectDir, 'log', self.STATEFILE)
+
+    @property
+    def processorFolders(self):
+        """Processor folders in case folder."""
+        return tuple(sorted(
+            f for f in glob(os.path.join(self.projectDir, 'processor*'))
+            if os.path.isdir(f)))
+
+    @property
+    def state(self):
+        """Saved hashes as a dictionary."""
+        try:
+            with open(self.stateFile, 'rb') as inf:
+                return json.load(inf)
+        except (IOError, ValueError):
+            return {}
+
+    def hashes(self):
+        """Calculate current hashes as a dictionary.
+
+        Keys are mesh, decomposeParDict and fields.
+        """
+        polyMesh = os.path.join(self.projectDir, 'constant', 'polyMesh')
+        return {
+            'mesh': self.__hash(self.__files(polyMesh), content=False),
+            'decomposeParDict': self.__hash(
+                (os.path.join(self.projectDir, 'system', 'decomposeParDict'),)),
+            'fields': self.__hash(self.__files(os.path.join(self.projectDir, '0')))
+        }
+
+    def isDecomposed(self, numberOfSubdomains):
+        """Check if the case is decomposed for numberOfSubdomains.
+
+        The case is decomposed if there are processor folders for all the
+        subdomains and the last decomposePar has finished successfully.
+        """
+        if len(self.processorFolders) != int(numberOfSubdomains):
+            return False
+
+        log = os.path.join(self.projectDir, 'log', 'decomposePar.log')
+        err = os.path.join(self.projectDir, 'log', 'decomposePar.err')
+        try:
+            with open(log, 'rb') as inf:
+                lines = inf.read().split()
+        except IOError:
+            return False
+
+        if os.path.isfile(err) and os.path.getsize(err):
+            return False
+
+        return 'End' in lines[-10:]
+
+    def decomposeArgs(self, numberOfSubdomains):
+        """Get arguments for decomposePar.
+
+        Returns:
+            None if processor folders are up to date, ('fields',) if only the
+            files in 0 folder have changed and ('force',) otherwise.
+        """
+        state = self.state
+        if not state or not self.isDecomposed(numberOfSubdomains):
+            return ('force',)
+
+        current = self.hashes()
+        if current['mesh'] != state.get('mesh') or \
+                current['decomposeParDict'] != state.get('decomposeParDict'):
+            return ('force',)
+        elif current['fields'] != state.get('fields'):
+            return ('fields',)
+        else:
+            return None
+
+    def save(self):
+        """Save current hashes to state file.
+
+        Call this method before running decomposePar. The state will only be
+        used if decomposePar finishes successfully.
+        """
+        logFolder = os.path.dirname(self.stateFile)
+        if not os.path.isdir(logFolder):
+            os.makedirs(logFolder)
+
+        with open(self.stateFile, 'wb') as outf:
+            json.dump(self.hashes(), outf, indent=4)
+
+    def reset(self):
+        """Remove the saved state. Next run will decompose the case again."""
+        if os.path.isfile(self.stateFile):
+            os.remove(self.stateFile)
+
+    @staticmethod
+    def __files(folder):
+        files = []
+        for root, dirs, fs in os.walk(folder):
+            files.extend(os.path.join(root, f) for f in fs)
+        return sorted(files)
+
+    def __hash(self, files, content=True):
+        h = hashlib.sha1()
+        for f in files:
+            h.update(os.path.relpath(f, self.projectDir).replace('\\', '/'))
+            if not os.path.isfile(f):
+                h.update('<missing>')
+            elif not content:
+                st = os.stat(f)
+                h.update('{}:{}:{}'.format(st.st_size, st.st_mtime, st.st_ino))
+            else:
+                with open(f, 'rb') as inf:
+                    for chunk in iter(lambda: inf.read(1048576), ''):
+                        h.update(chunk)
+        return h.hexdigest()
+
+    def duplicate(self):
+        """Return a copy of this object."""
+        return deepcopy(self)
+
+    def ToString(self):
+        """Overwrite .NET ToString method."""
+        return self.__repr__()
+
+    def __repr__(self):
+        """Decomposition state representation."""
+        return 'DecompositionState::{}'.format(self.projectDir)
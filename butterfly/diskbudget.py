@@ -0,0 +1,349 @@
+# coding=utf-8
+"""Disk budget for case folders.
+
+DiskBudget keeps the latest time folders of a case, compresses or removes the
+older ones, removes intermediate snappyHexMesh stages and enforces a quota in
+bytes for each case and for a batch of cases. Use estimate before the run to
+check how much space the run will write.
+
+Usage:
+    budget = DiskBudget(keepLatest=2, compression='gz', quota=2 * 1024 ** 3)
+    budget.check(case)  # raises ValueError if the run won't fit in the quota
+    # run the case
+    budget.apply(case)
+"""
+from __future__ import division
+import os
+import gzip
+import shutil
+from collections import namedtuple
+from copy import deepcopy
+
+from .meshestimator import estimateCellCount
+from .timeindex import parseTime
+from .utilities import foldersize, removetree
+
+
+class DiskBudget(object):
+    """Disk budget policy for case folders.
+
+    Args:
+        keepLatest: Number of the latest time folders to be kept as they are
+            (default: 2).
+        compression: Compression for older time folders. Use gz to gzip the
+            files in older folders, openfoam to set writeCompression in
+            controlDict so OpenFOAM writes compressed files or None to remove
+            older folders. If None, purgeWrite is set in controlDict so the
+            folders are also removed during the run (default: gz).
+        removeSnappyHexMeshStages: Remove intermediate snappyHexMesh folders
+            and only keep the latest stage (default: True).
+        quota: Maximum size of each case folder in bytes (default: None).
+        batchQuota: Maximum size of all the case folders in a batch in bytes
+            (default: None).
+    """
+
+    COMPRESSIONS = ('gz', 'openfoam', None)
+
+    # approximate size of gzipped ascii fields compared to the original files
+    COMPRESSIONRATIO = 0.3
+
+    # number of components for field classes
+    COMPONENTS = {'volScalarField': 1, 'volVectorField': 3,
+                  'volSymmTensorField': 6, 'volTensorField': 9}
+
+    def __init__(self, keepLatest=2, compression='gz',
+                 removeSnappyHexMeshStages=True, quota=None, batchQuota=None):
+        """Init disk budget."""
+        self.keepLatest = keepLatest
+        self.compression = compression
+        self.removeSnappyHexMeshStages = removeSnappyHexMeshStages
+        self.quota = quota
+        self.batchQuota = batchQuota
+
+    @property
+    def keepLatest(self):
+        """Number of the latest time folders to be kept."""
+        return self.__keepLatest
+
+    @keepLatest.setter
+    def keepLatest(self, n):
+        n = int(n)
+        assert n > 0, 'keepLatest should be larger than 0 not {}.'.format(n)
+        self.__keepLatest = n
+
+    @property
+    def compression(self):
+        """Compression for older time folders (gz, openfoam or None)."""
+        return self.__compression
+
+    @compression.setter
+    def compression(self, c):
+        assert c in self.COMPRESSIONS, \
+            'Invalid compression: {}. Valid values are {}.'.format(
+                c, self.COMPRESSIONS)
+        self.__compression = c
+
+    def updateControlDict(self, controlDict):
+        """Update purgeWrite and writeCompression in controlDict.
+
+        Returns:
+            True if controlDict has changed.
+        """
+        values = dict(controlDict.values)
+        if self.compression is None:
+            controlDict.purgeWrite = self.keepLatest
+        elif self.compression == 'openfoam':
+            controlDict.writeCompression = True
+        return values != controlDict.values
+
+    def estimate(self, case, cellCount=None):
+        """Estimate the size of the results that a run will write.
+
+        Each field is estimated from number of cells and number of components.
+        phi is added for the faces. Ascii values are estimated as writePrecision
+        + 6 characters and binary values as 8 bytes.
+
+        Args:
+            case: A butterfly case.
+            cellCount: Optional number of cells. By default it will be read
+                from polyMesh or estimated from meshing parameters.
+        Returns:
+            A namedtuple as (cellCount, writes, bytesPerWrite, total, retained).
+            total is the size of all the time folders and retained is the size
+            of the time folders that will be kept based on this budget.
+        """
+        e = namedtuple('DiskEstimate',
+                       'cellCount writes bytesPerWrite total retained')
+        cellCount = cellCount or estimateCellCount(case)
+        cd = case.controlDict
+        values = cd.values
+
+        if values.get('writeFormat') == 'binary':
+            valueSize = 8
+        else:
+            valueSize = int(values.get('writePrecision') or 6) + 6
+
+        components = sum(self.COMPONENTS.get(ff.cls, 1)
+                         for ff in case.getFoamFilesFromLocation('0'))
+        # phi is written for about 3 faces per cell
+        components += 3
+        bytesPerWrite = int(cellCount * components * valueSize)
+
+        writes = self.__writes(values)
+        total = writes * bytesPerWrite
+        kept = min(writes, self.keepLatest)
+        if self.compression == 'openfoam':
+            retained = total * self.COMPRESSIONRATIO
+        elif self.compression == 'gz':
+            retained = (kept + (writes - kept) * self.COMPRESSIONRATIO) * \
+                bytesPerWrite
+        else:
+            retained = kept * bytesPerWrite
+
+        return e(cellCount, writes, bytesPerWrite, total, int(retained))
+
+    def check(self, case, cellCount=None):
+        """Check if the results of a run fit in the quota before the run.
+
+        Raises ValueError if the current size of the case and the estimated
+        size of the results exceed the quota.
+
+        Returns:
+            The estimate. See estimate.
+        """
+        estimate = self.estimate(case, cellCount)
+        if self.quota:
+            size = foldersize(case.projectDir) + estimate.retained
+            if size > self.quota:
+                raise ValueError(
+                    '{} will need about {:.1f} MB which exceeds the quota of '
+                    '{:.1f} MB. Increase the quota or writeInterval or reduce '
+                    'keepLatest.'.format(case.projectName, size / 1024 ** 2,
+                                         self.quota / 1024 ** 2))
+        return estimate
+
+    def checkCases(self, cases):
+        """Check if the results of a batch of cases fit in the quotas.
+
+        Returns:
+            A list of estimates for cases.
+        """
+        estimates = [self.check(case) for case in cases]
+        if self.batchQuota:
+            size = sum(foldersize(case.projectDir) + e.retained
+                       for case, e in zip(cases, estimates))
+            if size > self.batchQuota:
+                raise ValueError(
+                    'Cases will need about {:.1f} MB which exceeds the batch '
+                    'quota of {:.1f} MB.'.format(size / 1024 ** 2,
+                                                 self.batchQuota / 1024 ** 2))
+        return estimates
+
+    def apply(self, case):
+        """Apply the budget to a case folder.
+
+        Intermediate snappyHexMesh folders are removed, older time folders are
+        compressed or removed and if the case is still larger than the quota
+        the oldest time folders are removed. The latest time folders are never
+        removed.
+
+        Returns:
+            A namedtuple as (before, after, compressed, removed). before and
+            after are the size of the case in bytes.
+        """
+        u = namedtuple('DiskUsage', 'before after compressed removed')
+        before = foldersize(case.projectDir)
+        removed = []
+        compressed = []
+
+        if self.removeSnappyHexMeshStages:
+            for f in self.__snappyHexMeshStages(case)[:-1]:
+                removetree(os.path.join(case.projectDir, f), wait=True)
+                removed.append(f)
+
+        older = self.olderFolders(case)
+        for f in older:
+            fp = os.path.join(case.projectDir, f)
+            if self.compression == 'gz':
+                if self.gzipFolder(fp):
+                    compressed.append(f)
+            elif self.compression is None:
+                removetree(fp, wait=True)
+                removed.append(f)
+
+        size = foldersize(case.projectDir)
+        if self.quota and size > self.quota:
+            for f in self.olderFolders(case):
+                size -= self.__remove(os.path.join(case.projectDir, f))
+                removed.append(f)
+                if size <= self.quota:
+                    break
+            else:
+                print('{} is still larger than the quota: {:.1f} MB > {:.1f} '
+                      'MB.'.format(case.projectName, size / 1024 ** 2,
+                                   self.quota / 1024 ** 2))
+
+        return u(before, size, tuple(compressed), tuple(removed))
+
+    def applyCases(self, cases):
+        """Apply the budget to a batch of cases.
+
+        The budget is applied to each case and if the cases are still larger
+        than batchQuota the oldest time folders of all the cases are removed
+        based on modification time.
+
+        Returns:
+            A list of DiskUsage for cases. See apply.
+        """
+        usages = [self.apply(case) for case in cases]
+        if not self.batchQuota:
+            return usages
+
+        size = sum(u.after for u in usages)
+        if size <= self.batchQuota:
+            return usages
+
+        folders = sorted(
+            (os.path.getmtime(os.path.join(case.projectDir, f)), count, f)
+            for count, case in enumerate(cases)
+            for f in self.olderFolders(case))
+
+        after = [u.after for u in usages]
+        removed = [list(u.removed) for u in usages]
+        for mtime, count, f in folders:
+            s = self.__remove(os.path.join(cases[count].projectDir, f))
+            size -= s
+            after[count] -= s
+            removed[count].append(f)
+            if size <= self.batchQuota:
+                break
+        else:
+            print('Cases are still larger than the batch quota: {:.1f} MB > '
+                  '{:.1f} MB.'.format(size / 1024 ** 2,
+                                      self.batchQuota / 1024 ** 2))
+
+        return [u._replace(after=a, removed=tuple(r))
+                for u, a, r in zip(usages, after, removed)]
+
+    def olderFolders(self, case):
+        """Time folders of a case except the latest keepLatest folders."""
+        return case.getResultFolders()[:-self.keepLatest]
+
+    @staticmethod
+    def gzipFolder(folder):
+        """Gzip all the files in a folder and remove the original files.
+
+        OpenFOAM reads gzipped files with .gz extension.
+
+        Returns:
+            Number of compressed files.
+        """
+        count = 0
+        for root, dirs, files in os.walk(folder):
+            for f in files:
+                if f.endswith('.gz'):
+                    continue
+                fp = os.path.join(root, f)
+                with open(fp, 'rb') as inf:
+                    outf = gzip.open(fp + '.gz', 'wb')
+                    try:
+                        shutil.copyfileobj(inf, outf)
+                    finally:
+                        outf.close()
+                os.remove(fp)
+                count += 1
+        return count
+
+    @staticmethod
+    def __writes(values):
+        """Number of writes based on controlDict values."""
+        try:
+            start = float(values.get('startTime') or 0)
+            end = float(values.get('endTime') or 0)
+            interval = float(values.get('writeInterval') or 1)
+            deltaT = float(values.get('deltaT') or 1)
+        except (TypeError, ValueError):
+            return 0
+
+        if values.get('writeControl', 'timeStep') == 'timeStep':
+            interval *= deltaT
+
+        if interval <= 0 or end <= start:
+            return 0
+        return int((end - start) / interval + 1e-6)
+
+    @staticmethod
+    def __snappyHexMeshStages(case):
+        """snappyHexMesh folders including the renamed ones sorted by time."""
+        folders = []
+        for name in os.listdir(case.projectDir):
+            if not os.path.isdir(os.path.join(case.projectDir, name, 'polyMesh')):
+                continue
+            try:
+                t = parseTime(name[:-4] if name.endswith('.org') else name)
+            except ValueError:
+                continue
+            if t != 0:
+                folders.append((t, name))
+        return [name for t, name in sorted(folders)]
+
+    @staticmethod
+    def __remove(folder):
+        """Remove a folder and return its size."""
+        size = foldersize(folder)
+        removetree(folder, wait=True)
+        return size
+
+    def duplicate(self):
+        """Return a copy of this object."""
+        return deepcopy(self)
+
+    def ToString(self):
+        """Overwrite .NET ToString method."""
+        return self.__repr__()
+
+    def __repr__(self):
+        """Disk budget representation."""
+        return 'DiskBudget::keep {}::{}::quota {}'.format(
+            self.keepLatest, self.compression or 'remove',
+            '{:.1f} MB'.format(self.quota / 1024 ** 2) if self.quota else None)
@@ -0,0 +1,187 @@
+# coding=utf-8
+"""Shape preserving downsampling for long series such as residuals.
+
+Use MinMaxDownsampler for series that grow over time. It keeps min and max of
+each bucket and only updates the last bucket once new values are added. Use lttb
+for a one-off downsampling of a complete series.
+"""
+from __future__ import division
+import math
+from copy import deepcopy
+
+
+class MinMaxDownsampler(object):
+    """Incremental min-max bucketing.
+
+    The series is split into at most width buckets with equal number of values.
+    For each bucket the minimum and maximum values are kept which guarantees
+    that peaks are not lost in the plot. Bucket size doubles once the number of
+    buckets gets larger than width and pairs of buckets merge together. Merging
+    min-max buckets is exact so the values never need to be visited again.
+
+    Args:
+        width: Target width in pixels. Output will have at most 2 * width points.
+    """
+
+    def __init__(self, width):
+        """Init min-max downsampler."""
+        self.__width = max(1, int(width))
+        self.__bucketSize = 1
+        # each bucket is [minIndex, minValue, maxIndex, maxValue, count]
+        self.__buckets = []
+        self.__count = 0
+
+    @property
+    def width(self):
+        """Target width in pixels."""
+        return self.__width
+
+    @property
+    def count(self):
+        """Number of values added to downsampler."""
+        return self.__count
+
+    @property
+    def bucketSize(self):
+        """Current number of values in each bucket."""
+        return self.__bucketSize
+
+    def extend(self, values):
+        """Add new values to the end of series."""
+        for v in values:
+            self.append(v)
+
+    def append(self, value):
+        """Add a new value to the end of series."""
+        i = self.__count
+        self.__count += 1
+
+        if self.__buckets and self.__buckets[-1][4] < self.__bucketSize:
+            # update the tail bucket
+            b = self.__buckets[-1]
+            if value < b[1]:
+                b[0], b[1] = i, value
+            if value > b[3]:
+                b[2], b[3] = i, value
+            b[4] += 1
+            return
+
+        self.__buckets.append([i, value, i, value, 1])
+
+        if len(self.__buckets) > self.__width:
+            self.__merge()
+
+    def __merge(self):
+        """Merge pairs of buckets and double the bucket size."""
+        merged = []
+        for b0, b1 in zip(self.__buckets[::2], self.__buckets[1::2]):
+            minb = b0 if b0[1] <= b1[1] else b1
+            maxb = b0 if b0[3] >= b1[3] else b1
+            merged.append([minb[0], minb[1], maxb[2], maxb[3], b0[4] + b1[4]])
+
+        if len(self.__buckets) % 2:
+            # the last bucket is not full yet
+            merged.append(self.__buckets[-1])
+
+        self.__buckets = merged
+        self.__bucketSize *= 2
+
+    @property
+    def indices(self):
+        """Indices of selected values in the original series."""
+        ind = []
+        for minI, minV, maxI, maxV, c in self.__buckets:
+            if minI == maxI:
+                ind.append(minI)
+            elif minI < maxI:
+                ind.extend((minI, maxI))
+            else:
+                ind.extend((maxI, minI))
+        return ind
+
+    @property
+    def values(self):
+        """Selected values as a list of (index, value)."""
+        points = []
+        for minI, minV, maxI, maxV, c in self.__buckets:
+            if minI == maxI:
+                points.append((minI, minV))
+            elif minI < maxI:
+                points.extend(((minI, minV), (maxI, maxV)))
+            else:
+                points.extend(((maxI, maxV), (minI, minV)))
+        return points
+
+    def duplicate(self):
+        """Return a copy of this object."""
+        return deepcopy(self)
+
+    def ToString(self):
+        """Overwrite .NET ToString method."""
+        return self.__repr__()
+
+    def __repr__(self):
+        """Downsampler representation."""
+        return 'MinMaxDownsampler::{} values::{} buckets'.format(
+            self.count, len(self.__buckets))
+
+
+def minMax(values, width):
+    """Downsample values using min-max bucketing.
+
+    Args:
+        values: A list of numerical values.
+        width: Target width in pixels.
+    Returns:
+        A list of (index, value) for selected values.
+    """
+    ds = MinMaxDownsampler(width)
+    ds.extend(values)
+    return ds.values
+
+
+def lttb(values, threshold):
+    """Largest-Triangle-Three-Buckets downsampling.
+
+    Read more at: http://hdl.handle.net/1946/15343
+
+    Args:
+        values: A list of (x, y) values.
+        threshold: Number of points in output.
+    Returns:
+        A list of indices for selected values.
+    """
+    n = len(values)
+    threshold = int(threshold)
+    if threshold >= n or threshold < 3:
+        return range(n)
+
+    every = (n - 2) / (threshold - 2)
+    ind = [0]
+    a = 0
+    for i in xrange(threshold - 2):
+        # average point in the next bucket
+        avgStart = int(math.floor((i + 1) * every)) + 1
+        avgEnd = min(int(math.floor((i + 2) * every)) + 1, n)
+        avgLength = avgEnd - avgStart
+        avgX = sum(values[j][0] for j in xrange(avgStart, avgEnd)) / avgLength
+        avgY = sum(values[j][1] for j in xrange(avgStart, avgEnd)) / avgLength
+
+        # find the point in current bucket with the largest triangle
+        rangeStart = int(math.floor(i * every)) + 1
+        rangeEnd = int(math.floor((i + 1) * every)) + 1
+        ax, ay = values[a]
+        maxArea = -1
+        nextA = rangeStart
+        for j in xrange(rangeStart, rangeEnd):
+            area = abs((ax - avgX) * (values[j][1] - ay) -
+                       (ax - values[j][0]) * (avgY - ay))
+            if area > maxArea:
+                maxArea = area
+                nextA = j
+
+        ind.append(nextA)
+        a = nextA
+
+    ind.append(n - 1)
+    return ind
@@ -0,0 +1,202 @@
+# coding=utf-8
+"""Extract feature edges from butterfly geometries.
+
+Use FeatureEdgeMesh to write the .eMesh file for explicit feature snapping in
+snappyHexMesh without running surfaceFeatureExtract in OpenFOAM.
+
+Usage:
+    fem = FeatureEdgeMesh.fromBFGeometries(geometries, includedAngle=150)
+    fem.save(case.triSurfaceFolder, case.projectName)
+"""
+import os
+import math
+from collections import namedtuple
+from copy import deepcopy
+
+from .version import Header
+
+
+class FeatureEdgeMesh(object):
+    """Feature edges as a list of points and edges.
+
+    Args:
+        points: A list of (x, y, z) for points.
+        edges: A list of (i, j) indices for points of each edge.
+    """
+
+    def __init__(self, points, edges):
+        """Init feature edge mesh."""
+        self.__points = tuple(tuple(p) for p in points)
+        self.__edges = tuple(tuple(e) for e in edges)
+        self.__counts = None
+
+    @classmethod
+    def fromBFGeometries(cls, geometries, includedAngle=150, boundary=True,
+                         nonManifold=True, regions=True, tolerance=1e-6):
+        """Extract feature edges from butterfly geometries.
+
+        Vertices of all the geometries are merged so edges between geometries
+        are found. An edge is a feature edge if the angle between its faces is
+        less than includedAngle. Boundary edges (with only one face),
+        non-manifold edges (with more than two faces) and edges between
+        different geometries can also be added.
+
+        Args:
+            geometries: A list of butterfly geometries.
+            includedAngle: Maximum angle between two faces for the edge between
+                them to be a feature edge. 0 selects no edges and 180 selects
+                all the edges (default: 150).
+            boundary: Add boundary edges (default: True).
+            nonManifold: Add non-manifold edges (default: True).
+            regions: Add edges between different geometries (default: True).
+            tolerance: Distance tolerance to merge vertices (default: 1e-6).
+        """
+        # merge vertices
+        inv = 1.0 / tolerance
+        pointIndex = {}
+        points = []
+        faces = []
+        faceGeometry = []
+        for geoCount, geo in enumerate(geometries):
+            remap = []
+            for v in geo.vertices:
+                key = (int(round(v[0] * inv)), int(round(v[1] * inv)),
+                       int(round(v[2] * inv)))
+                index = pointIndex.get(key)
+                if index is None:
+                    index = pointIndex[key] = len(points)
+                    points.append(tuple(v))
+                remap.append(index)
+            for f in geo.faceIndices:
+                face = tuple(remap[i] for i in f)
+                if len(set(face)) == len(face):
+                    # ignore degenerated faces
+                    faces.append(face)
+                    faceGeometry.append(geoCount)
+
+        # first and second face for each edge as {(i, j): face index} with
+        # i < j. Edges with more than two faces are non-manifold.
+        first = {}
+        second = {}
+        nonManifoldEdges = set()
+        for count, face in enumerate(faces):
+            for i, j in zip(face, face[1:] + face[:1]):
+                key = (i, j) if i < j else (j, i)
+                if key not in first:
+                    first[key] = count
+                elif key not in second:
+                    second[key] = count
+                else:
+                    nonManifoldEdges.add(key)
+
+        # cos of the angle between normals for a feature edge
+        minCos = math.cos(math.radians(180 - includedAngle))
+
+        normals = []
+        for face in faces:
+            p0, p1, p2 = points[face[0]], points[face[1]], points[face[2]]
+            ux, uy, uz = p1[0] - p0[0], p1[1] - p0[1], p1[2] - p0[2]
+            vx, vy, vz = p2[0] - p0[0], p2[1] - p0[1], p2[2] - p0[2]
+            nx, ny, nz = uy * vz - uz * vy, uz * vx - ux * vz, ux * vy - uy * vx
+            l = math.sqrt(nx * nx + ny * ny + nz * nz) or 1
+            normals.append((nx / l, ny / l, nz / l))
+
+        kinds = {'feature': 0, 'boundary': 0, 'nonManifold': 0, 'region': 0}
+        edges = []
+        if nonManifold:
+            edges.extend(nonManifoldEdges)
+            kinds['nonManifold'] = len(nonManifoldEdges)
+
+        for edge, f0 in first.iteritems():
+            f1 = second.get(edge)
+            if f1 is None:
+                if boundary:
+                    kinds['boundary'] += 1
+                    edges.append(edge)
+                continue
+            if edge in nonManifoldEdges:
+                continue
+            if regions and faceGeometry[f0] != faceGeometry[f1]:
+                kinds['region'] += 1
+                edges.append(edge)
+                continue
+            n1, n2 = normals[f0], normals[f1]
+            if n1[0] * n2[0] + n1[1] * n2[1] + n1[2] * n2[2] < minCos:
+                kinds['feature'] += 1
+                edges.append(edge)
+
+        edges.sort()
+
+        # only keep the points which are used by feature edges
+        used = sorted(set(i for e in edges for i in e))
+        renumber = dict((i, count) for count, i in enumerate(used))
+        fem = cls((points[i] for i in used),
+                  ((renumber[i], renumber[j]) for i, j in edges))
+        fem.__counts = kinds
+        return fem
+
+    @property
+    def points(self):
+        """Points."""
+        return self.__points
+
+    @property
+    def edges(self):
+        """Edges as (i, j) indices of points."""
+        return self.__edges
+
+    @property
+    def counts(self):
+        """Number of edges for each kind.
+
+        A namedtuple as (feature, boundary, nonManifold, region). Values are
+        None if the edges are not extracted from geometries.
+        """
+        c = namedtuple('Counts', 'feature boundary nonManifold region')
+        if not self.__counts:
+            return c(None, None, None, None)
+        return c(self.__counts['feature'], self.__counts['boundary'],
+                 self.__counts['nonManifold'], self.__counts['region'])
+
+    def toOpenFOAM(self, name='featureEdges'):
+        """Get featureEdgeMesh as an OpenFOAM string."""
+        header = Header.header() + \
+            "FoamFile\n{\n" \
+            "\tversion\t\t2.0;\n" \
+            "\tformat\t\tascii;\n" \
+            "\tclass\t\tfeatureEdgeMesh;\n" \
+            "\tlocation\t\"constant/triSurface\";\n" \
+            "\tobject\t\t%s.eMesh;\n" \
+            "}\n" % name
+
+        points = '\n'.join('({} {} {})'.format(*p) for p in self.points)
+        edges = '\n'.join('({} {})'.format(*e) for e in self.edges)
+
+        return '{}\n// points:\n\n{}\n(\n{}\n)\n\n\n' \
+            '// edges:\n\n{}\n(\n{}\n)\n'.format(
+                header, len(self.points), points, len(self.edges), edges)
+
+    def save(self, folder, name):
+        """Save feature edges to folder as name.eMesh.
+
+        Returns:
+            Full path to eMesh file.
+        """
+        name = name[:-6] if name.endswith('.eMesh') else name
+        fp = os.path.join(folder, '{}.eMesh'.format(name))
+        with open(fp, 'wb') as outf:
+            outf.write(self.toOpenFOAM(name))
+        return fp
+
+    def duplicate(self):
+        """Return a copy of this object."""
+        return deepcopy(self)
+
+    def ToString(self):
+        """Overwrite .NET ToString method."""
+        return self.__repr__()
+
+    def __repr__(self):
+        """Feature edge mesh representation."""
+        return 'FeatureEdgeMesh::{} points::{} edges'.format(
+            len(self.points), len(self.edges))
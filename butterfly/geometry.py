@@ -195,6 +195,9 @@ class BFGeometry(_BFMesh):
     @property
     def boundaryCondition(self):
         """Boundary condition."""
+        if self.__bcLoader:
+            loader, self.__bcLoader = self.__bcLoader, None
+            self.boundaryCondition = loader()
         return self.__bc
 
     @boundaryCondition.setter
@@ -206,6 +209,17 @@ class BFGeometry(_BFMesh):
             '{} is not a Butterfly boundary condition.'.format(bc)
 
         self.__bc = bc
+        self.__bcLoader = None
+
+    def deferBoundaryCondition(self, loader):
+        """Create boundary condition on the first access.
+
+        Args:
+            loader: A function with no arguments that returns the boundary
+                condition (e.g. from the files in 0 folder of a case).
+        """
+        assert callable(loader), '{} is not callable.'.format(loader)
+        self.__bcLoader = loader
 
 
 class BFBlockGeometry(BFGeometry):
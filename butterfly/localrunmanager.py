@@ -0,0 +1,511 @@
+# coding=utf-8
+"""Local run manager for butterfly.
+
+Use LocalRunManager on systems with a native OpenFOAM installation (e.g. linux
+compute nodes). Commands are executed directly in the case folder with no shell
+and no docker. OpenFOAM executables should be available in PATH which is
+usually the case once OpenFOAM's etc/bashrc is sourced.
+"""
+import os
+import sys
+import time
+import errno
+import shlex
+import signal
+import threading
+from glob import glob
+from shutil import rmtree
+from subprocess import Popen
+from collections import namedtuple
+from copy import deepcopy
+
+from .runreport import RunReport, commandRecord
+from .utilities import foldersize
+
+# start a new session and execute the command in the same process so pid,
+# exit code and resource usage belong to the command
+SETSID = """import os, sys
+os.setsid()
+try:
+    os.execvp(sys.argv[1], sys.argv[1:])
+except OSError as e:
+    sys.stderr.write('Failed to execute %s:\\n\\t%s\\n' % (sys.argv[1], e))
+    os._exit(127)
+"""
+
+
+class LocalProcess(object):
+    """A sequence of commands that run one after another in a background thread.
+
+    The interface is similar to subprocess.Popen (poll, wait, returncode,
+    terminate and kill) so it can be used in place of a Popen process. The
+    sequence stops at the first command with a nonzero exit code.
+
+    Args:
+        steps: A list of (argv, logfile, errfile). argv is a list of arguments
+            or a python callable which returns an exit code.
+        cwd: Working directory.
+        env: An optional dictionary of environment variables.
+        report: An optional RunReport. Each command will be added to the report
+            with wall time, CPU time, peak memory and exit code.
+        measureBytesWritten: Also record bytes written to cwd. The size of cwd
+            is calculated before and after each command (default: False).
+    """
+
+    def __init__(self, steps, cwd, env=None, report=None,
+                 measureBytesWritten=False):
+        """Init and start the process."""
+        self.__steps = tuple(steps)
+        self.__cwd = cwd
+        self.__env = env
+        self.__report = report
+        self.__measureBytesWritten = measureBytesWritten
+        self.__records = []
+        self.__returncodes = []
+        self.__current = None
+        self.__cancelled = False
+        self.__lock = threading.Lock()
+        self.__done = threading.Event()
+        self.__thread = threading.Thread(target=self.__run)
+        self.__thread.daemon = True
+        self.__thread.start()
+
+    @property
+    def returncode(self):
+        """Exit code of the sequence or None if it is still running.
+
+        The value is the first nonzero exit code or 0 if all the commands have
+        succeeded.
+        """
+        if not self.__done.is_set():
+            return None
+
+        for code in self.__returncodes:
+            if code:
+                return code
+
+        if len(self.__returncodes) < len(self.__steps):
+            # cancelled before running all the commands
+            return -signal.SIGTERM
+        return 0
+
+    @property
+    def returncodes(self):
+        """Exit codes for the commands that have been executed."""
+        return tuple(self.__returncodes)
+
+    @property
+    def records(self):
+        """CommandRecords for the commands that have been executed."""
+        return tuple(self.__records)
+
+    @property
+    def pid(self):
+        """Process id for the current running command."""
+        p = self.__current
+        return p.pid if p else None
+
+    def poll(self):
+        """Check if the process has finished. Return returncode."""
+        return self.returncode
+
+    def wait(self, timeout=None):
+        """Wait for the process to finish. Return returncode.
+
+        Returns None if timeout is reached before the process is finished.
+        """
+        # wait without timeout will block keyboard interrupt in python 2
+        while not self.__done.wait(timeout or 1):
+            if timeout:
+                break
+        return self.returncode
+
+    def communicate(self):
+        """Wait for the process to finish. Outputs are already written to files."""
+        self.wait()
+        return None, None
+
+    def terminate(self):
+        """Terminate the running command and cancel the rest of the sequence."""
+        self.__signal(signal.SIGTERM)
+
+    def kill(self):
+        """Kill the running command and cancel the rest of the sequence."""
+        self.__signal(getattr(signal, 'SIGKILL', signal.SIGTERM))
+
+    def __signal(self, sig):
+        with self.__lock:
+            self.__cancelled = True
+            p = self.__current
+            # don't poll the process. It is reaped by the running thread.
+            if not p or p.returncode is not None:
+                return
+            try:
+                if hasattr(os, 'killpg'):
+                    # kill the whole group to include mpirun's children
+                    os.killpg(p.pid, sig)
+                else:
+                    p.terminate()
+            except OSError:
+                # the command hasn't started its session yet or it is
+                # already finished
+                try:
+                    os.kill(p.pid, sig)
+                except OSError:
+                    pass
+
+    def __run(self):
+        try:
+            for argv, logfile, errfile in self.__steps:
+                if self.__cancelled:
+                    break
+                size = foldersize(self.__cwd) \
+                    if self.__measureBytesWritten else None
+                start = time.time()
+                if callable(argv):
+                    code, usage = argv(), None
+                else:
+                    code, usage = self.__execute(argv, logfile, errfile)
+                self.__returncodes.append(code)
+                self.__record(argv, logfile, start, code, usage, size)
+                if code:
+                    break
+        finally:
+            self.__current = None
+            self.__done.set()
+
+    def __execute(self, argv, logfile, errfile):
+        """Execute a command and stream outputs to log and err files.
+
+        Outputs are redirected to files at OS level so there is no buffer in
+        memory regardless of the size of the outputs.
+        """
+        with open(logfile, 'wb') as log, open(errfile, 'wb') as err:
+            with self.__lock:
+                if self.__cancelled:
+                    return -signal.SIGTERM, None
+                try:
+                    self.__current = Popen(
+                        self.__sessionArgv(argv), cwd=self.__cwd,
+                        env=self.__env, stdout=log, stderr=err,
+                        close_fds=os.name != 'nt')
+                except OSError as e:
+                    # executable not found
+                    err.write('Failed to execute {}:\n\t{}\n'.format(argv[0], e))
+                    return 127, None
+            return self.__wait(self.__current)
+
+    @staticmethod
+    def __sessionArgv(argv):
+        """Get argv to start the command in a new session.
+
+        A new session lets terminate kill the command with all its children
+        (e.g. mpirun and its ranks). preexec_fn is not thread-safe in python 2
+        and commands are started from a background thread, so a small python
+        script calls setsid and replaces itself with the command.
+        """
+        if not hasattr(os, 'setsid') or not sys.executable:
+            return argv
+        return [sys.executable, '-S', '-E', '-c', SETSID] + list(argv)
+
+    @staticmethod
+    def __wait(p):
+        """Wait for a Popen process. Return (returncode, resource usage).
+
+        os.wait4 is used where available to get the resource usage of the
+        command and its children (e.g. mpirun and its ranks).
+        """
+        if not hasattr(os, 'wait4'):
+            return p.wait(), None
+
+        while True:
+            try:
+                pid, status, usage = os.wait4(p.pid, 0)
+                break
+            except OSError as e:
+                if e.errno == errno.EINTR:
+                    continue
+                # process is already reaped
+                return p.wait(), None
+
+        if os.WIFSIGNALED(status):
+            p.returncode = -os.WTERMSIG(status)
+        else:
+            p.returncode = os.WEXITSTATUS(status)
+        return p.returncode, usage
+
+    def __record(self, argv, logfile, start, code, usage, size):
+        """Record a command and add it to the report."""
+        if callable(argv):
+            name, command = 'rm', getattr(argv, '__name__', 'python')
+        else:
+            name = os.path.splitext(os.path.basename(logfile))[0]
+            command = ' '.join(argv)
+
+        if usage:
+            cpuTime = usage.ru_utime + usage.ru_stime
+            # ru_maxrss is in bytes on mac and kilobytes on other systems
+            maxRss = usage.ru_maxrss * (1 if sys.platform == 'darwin' else 1024)
+        else:
+            cpuTime = maxRss = None
+
+        written = foldersize(self.__cwd) - size if size is not None else None
+
+        record = commandRecord(name, command, start, time.time() - start,
+                               cpuTime, maxRss, code, written,
+                               None if callable(argv) else logfile)
+        self.__records.append(record)
+        if self.__report:
+            try:
+                self.__report.addCommand(record)
+            except Exception as e:
+                print('Failed to update run report:\n\t{}'.format(e))
+
+    def ToString(self):
+        """Overwrite .NET ToString method."""
+        return self.__repr__()
+
+    def __repr__(self):
+        """Local process representation."""
+        return 'LocalProcess::{}::{}'.format(
+            '>'.join(os.path.splitext(os.path.basename(s[1]))[0]
+                     for s in self.__steps),
+            'running' if self.returncode is None else self.returncode)
+
+
+class LocalRunManager(object):
+    """RunManager to run OpenFOAM commands on a native OpenFOAM installation.
+
+    Args:
+        projectName: A string for project name.
+        projectDir: Full path to case folder.
+        env: An optional dictionary of environment variables for commands.
+            Default is the environment of the current process.
+        report: Record the commands in log/runReport.json. See RunReport
+            (default: True).
+        measureBytesWritten: Record bytes written to the case folder for each
+            command. This walks the whole case folder before and after each
+            command which can be slow for large cases (default: False).
+    """
+
+    def __init__(self, projectName, projectDir, env=None, report=True,
+                 measureBytesWritten=False):
+        """Init local run manager."""
+        self.__projectName = projectName
+        self.projectDir = projectDir
+        self.env = env
+        self.report = report
+        self.measureBytesWritten = measureBytesWritten
+        self.logFolder = './log'
+        self.errFolder = './log'
+        self.__processes = []
+
+    @property
+    def projectDir(self):
+        """Full path to case folder."""
+        return self.__projectDir
+
+    @projectDir.setter
+    def projectDir(self, p):
+        self.__projectDir = os.path.normpath(p)
+
+    def command(self, cmd, args=None, decomposeParDict=None, includeHeader=True,
+                decompose=True, reconstruct=True):
+        """
+        Get command lines for an OpenFOAM command in parallel or serial.
+
+        Args:
+            cmd: An OpenFOAM command or a list of commands.
+            args: List of optional arguments for command. e.g. ('c', 'latestTime')
+            decomposeParDict: decomposeParDict for parallel runs (default: None).
+            includeHeader: Not used. It is here to match RunManager.command.
+            decompose: Run decomposePar before a parallel command. Use a list
+                of arguments (e.g. ('fields',)) to run decomposePar with
+                arguments or False to use current processor folders
+                (default: True).
+            reconstruct: Reconstruct the case and remove processor folders
+                after a parallel command (default: True).
+        Returns:
+            (cmd, logfiles, errorfiles)
+            cmd: A tuple of arguments for each command. Python steps such as
+                removing processor folders are None.
+        """
+        res = namedtuple('log', 'cmd logfiles errorfiles')
+        steps = self.__steps(cmd, args, decomposeParDict, decompose,
+                             reconstruct)
+        return res(tuple(None if callable(s[0]) else s[0] for s in steps),
+                   tuple(s[1] for s in steps), tuple(s[2] for s in steps))
+
+    def __steps(self, cmd, args=None, decomposeParDict=None, decompose=True,
+                reconstruct=True):
+        """Get a list of (argv, logfile, errfile) for command."""
+        if isinstance(cmd, (list, tuple)):
+            # a list of commands
+            steps = []
+            for count, c in enumerate(cmd):
+                try:
+                    arg = args[count]
+                except (IndexError, TypeError):
+                    arg = None
+                dpd = None if c == 'blockMesh' else decomposeParDict
+                steps.extend(self.__steps(c, arg, dpd, decompose, reconstruct))
+                if dpd and not reconstruct:
+                    # processor folders are kept for the next commands
+                    decompose = False
+            return steps
+
+        # ('c', 'time 0.1') > ['-c', '-time', '0.1']
+        arguments = self.__arguments(args)
+
+        if not decomposeParDict:
+            # run in serial
+            return [([cmd] + arguments,) + self.__logfiles(cmd)]
+
+        n = decomposeParDict.numberOfSubdomains
+        reconstructCmd = 'reconstructParMesh' if cmd == 'snappyHexMesh' \
+            else 'reconstructPar'
+        reconstructArgs = ['-constant'] if cmd == 'snappyHexMesh' else []
+
+        steps = []
+        if decompose:
+            decomposeArgs = self.__arguments(
+                decompose if isinstance(decompose, (list, tuple)) else None)
+            steps.append((['decomposePar'] + decomposeArgs,) +
+                         self.__logfiles('decomposePar'))
+
+        steps.append(
+            (['mpirun', '-np', str(n), cmd] + arguments + ['-parallel'],) +
+            self.__logfiles(cmd))
+
+        if reconstruct:
+            steps.extend((
+                ([reconstructCmd] + reconstructArgs,) +
+                self.__logfiles(reconstructCmd),
+                (self.__removeProcessorFolders,) + self.__logfiles('rm')
+            ))
+
+        return steps
+
+    @staticmethod
+    def __arguments(args):
+        """Convert arguments to argv.
+
+        e.g. ('latestTime', "fields '(U p)'") > ['-latestTime', '-fields', '(U p)']
+        """
+        return [a for arg in (args or ()) for a in shlex.split('-{}'.format(arg))]
+
+    def __logfiles(self, name):
+        return ('{}/{}.log'.format(self.logFolder, name),
+                '{}/{}.err'.format(self.errFolder, name))
+
+    def __removeProcessorFolders(self):
+        for f in glob(os.path.join(self.projectDir, 'processor*')):
+            rmtree(f, ignore_errors=True)
+        return 0
+
+    def run(self, command, args=None, decomposeParDict=None, wait=True,
+            decompose=True, reconstruct=True):
+        """Run OpenFOAM command.
+
+        See command for decompose and reconstruct.
+
+        Returns:
+            (process, logfiles, errorfiles)
+            process: A LocalProcess. Use process.returncode to get the exit code.
+        """
+        log = namedtuple('log', 'process logfiles errorfiles')
+        steps = self.__steps(command, args, decomposeParDict, decompose,
+                             reconstruct)
+
+        logFolder = os.path.join(self.projectDir, self.logFolder)
+        if not os.path.isdir(logFolder):
+            os.makedirs(logFolder)
+
+        # use full path for log files so the process doesn't depend on cwd
+        steps = tuple(
+            (argv,
+             os.path.normpath(os.path.join(self.projectDir, logfile)),
+             os.path.normpath(os.path.join(self.projectDir, errfile)))
+            for argv, logfile, errfile in steps)
+
+        # clean up log files from previous runs. This also makes sure that all
+        # the files exist if the sequence stops early.
+        for argv, logfile, errfile in steps:
+            for f in (logfile, errfile):
+                open(f, 'wb').close()
+
+        p = LocalProcess(steps, self.projectDir, self.env,
+                         RunReport(self.projectDir) if self.report else None,
+                         self.measureBytesWritten)
+        self.__processes = [pr for pr in self.__processes
+                            if pr.poll() is None] + [p]
+
+        if wait:
+            p.wait()
+
+        return log(p, tuple(s[1] for s in steps), tuple(s[2] for s in steps))
+
+    def terminate(self, force=False):
+        """Terminate all the running processes for this project.
+
+        Each command runs in its own process group and the signal is only sent
+        to the process groups of this project.
+
+        Args:
+            force: Send SIGKILL instead of SIGTERM (default: False).
+        """
+        for p in self.__processes:
+            if p.poll() is None:
+                if force:
+                    p.kill()
+                else:
+                    p.terminate()
+
+    def checkFileContents(self, files, mute=False):
+        """Check files for content and print them out if any.
+
+        args:
+            files: A list of ASCII files.
+
+        returns:
+            (hasContent, content)
+            hasContent: A boolean that shows if there is any contents.
+            content: Files content if any
+        """
+        def readFile(f):
+            try:
+                with open(f, 'rb') as log:
+                    return log.read().strip()
+            except Exception as e:
+                err = 'Failed to read {}:\n\t{}'.format(f, e)
+                print(err)
+                return ''
+
+        _lines = '\n'.join(tuple(readFile(f) for f in files)).strip()
+
+        if len(_lines) > 0:
+            if not mute:
+                print(_lines)
+            return True, _lines
+        else:
+            return False, _lines
+
+    def duplicate(self):
+        """Return a copy of this object.
+
+        Running processes are not copied.
+        """
+        return LocalRunManager(self.__projectName, self.projectDir,
+                               deepcopy(self.env), self.report,
+                               self.measureBytesWritten)
+
+    def __deepcopy__(self, memo):
+        return self.duplicate()
+
+    def ToString(self):
+        """Overwrite .NET ToString method."""
+        return self.__repr__()
+
+    def __repr__(self):
+        """Run manager representation."""
+        return 'LocalRunManager::{}'.format(self.__projectName)
@@ -0,0 +1,315 @@
+# coding=utf-8
+"""Validate and find locationInMesh for snappyHexMesh.
+
+locationInMesh should be inside the blockMesh domain, outside all the closed
+geometries and not on the faces of blockMesh cells or the faces of the refined
+cells. A point is inside a closed geometry if vertical rays in both directions
+cross the geometry an odd number of times.
+
+Usage:
+    point = findLocationInMesh(blockMeshDict, geometries, blockMeshDict.center)
+"""
+import math
+from array import array
+from bisect import bisect_right
+from collections import namedtuple
+from copy import deepcopy
+
+from .polymesh import lineDivide
+import vectormath
+
+
+class SolidIndex(object):
+    """Triangles of geometries in a 2d grid for point in solid tests.
+
+    Rays are vertical so only the triangles that overlap with the point in
+    plan need to be tested. Triangles are binned in a grid of cells in XY
+    plane once and each test only checks the triangles in one cell.
+
+    Args:
+        geometries: A list of butterfly geometries. Geometries should be closed
+            to enclose a volume. Open geometries are ignored by the test as
+            rays in two directions don't agree for them.
+        trianglesPerCell: Average number of triangles in each cell of the grid
+            (default: 16).
+    """
+
+    def __init__(self, geometries, trianglesPerCell=16):
+        """Init solid index."""
+        geometries = tuple(geometries)
+        self.__names = tuple(geo.name for geo in geometries)
+        self.__vertices = tuple(
+            tuple((float(x), float(y), float(z)) for x, y, z in geo.vertices)
+            for geo in geometries)
+        # geometry and vertex indices for each triangle
+        self.__triangles = array('i')
+        self.__cells = {}
+
+        count = sum(len(f) - 2 for geo in geometries for f in geo.faceIndices)
+        if not count:
+            self.__origin = (0, 0)
+            self.__size = 1.0
+            return
+
+        minX = min(pt[0] for v in self.__vertices for pt in v)
+        minY = min(pt[1] for v in self.__vertices for pt in v)
+        maxX = max(pt[0] for v in self.__vertices for pt in v)
+        maxY = max(pt[1] for v in self.__vertices for pt in v)
+        area = max(maxX - minX, 1e-9) * max(maxY - minY, 1e-9)
+        size = math.sqrt(area * trianglesPerCell / count)
+        self.__origin = (minX, minY)
+        self.__size = size
+
+        cells = self.__cells
+        triangles = self.__triangles
+        count = 0
+        for geo, (g, v) in enumerate(zip(geometries, self.__vertices)):
+            # cell of each vertex
+            kx = tuple(int((pt[0] - minX) / size) for pt in v)
+            ky = tuple(int((pt[1] - minY) / size) for pt in v)
+            for f in g.faceIndices:
+                a = f[0]
+                for n in xrange(1, len(f) - 1):
+                    b, c = f[n], f[n + 1]
+                    triangles.extend((geo, a, b, c))
+                    xa, xb, xc = kx[a], kx[b], kx[c]
+                    ya, yb, yc = ky[a], ky[b], ky[c]
+                    if xa == xb == xc and ya == yb == yc:
+                        # most triangles are in a single cell
+                        try:
+                            cells[(xa, ya)].append(count)
+                        except KeyError:
+                            cells[(xa, ya)] = [count]
+                    else:
+                        for i in xrange(min(xa, xb, xc), max(xa, xb, xc) + 1):
+                            for j in xrange(min(ya, yb, yc),
+                                            max(ya, yb, yc) + 1):
+                                try:
+                                    cells[(i, j)].append(count)
+                                except KeyError:
+                                    cells[(i, j)] = [count]
+                    count += 1
+
+    @property
+    def triangleCount(self):
+        """Number of triangles."""
+        return len(self.__triangles) // 4
+
+    def containingGeometries(self, point):
+        """Get names of the geometries that contain the point.
+
+        Returns:
+            A tuple of names or None if the point is too close to an edge or a
+            vertex in plan to be tested. Move the point slightly and try again.
+        """
+        x, y, z = point[0], point[1], point[2]
+        key = (int(math.floor((x - self.__origin[0]) / self.__size)),
+               int(math.floor((y - self.__origin[1]) / self.__size)))
+        tol = 1e-9
+        up = {}
+        down = {}
+        for count in self.__cells.get(key, ()):
+            geo, i0, i1, i2 = self.__triangles[4 * count:4 * count + 4]
+            v = self.__vertices[geo]
+            (x0, y0, z0), (x1, y1, z1), (x2, y2, z2) = v[i0], v[i1], v[i2]
+            det = (x1 - x0) * (y2 - y0) - (x2 - x0) * (y1 - y0)
+            if det == 0:
+                # vertical triangle
+                continue
+            a = ((x1 - x) * (y2 - y) - (x2 - x) * (y1 - y)) / det
+            b = ((x2 - x) * (y0 - y) - (x0 - x) * (y2 - y)) / det
+            c = 1 - a - b
+            if a < -tol or b < -tol or c < -tol:
+                continue
+            if a < tol or b < tol or c < tol:
+                # ray crosses an edge or a vertex
+                return None
+            zt = a * z0 + b * z1 + c * z2
+            if zt > z:
+                up[geo] = up.get(geo, 0) + 1
+            else:
+                down[geo] = down.get(geo, 0) + 1
+
+        return tuple(self.__names[geo] for geo in sorted(up)
+                     if up[geo] % 2 and down.get(geo, 0) % 2)
+
+    def isInside(self, point):
+        """Check if the point is inside any of the closed geometries.
+
+        Points that are on an edge in plan are moved slightly for the test.
+        """
+        names = self.containingGeometries(point)
+        shift = self.__size * 1e-6
+        count = 0
+        while names is None and count < 10:
+            count += 1
+            names = self.containingGeometries(
+                (point[0] + shift * count * 0.7548776662,
+                 point[1] + shift * count * 0.5698402910, point[2]))
+        return bool(names)
+
+    def duplicate(self):
+        """Return a copy of this object."""
+        return deepcopy(self)
+
+    def ToString(self):
+        """Overwrite .NET ToString method."""
+        return self.__repr__()
+
+    def __repr__(self):
+        """Solid index representation."""
+        return 'SolidIndex::{} triangles::{} cells'.format(
+            self.triangleCount, len(self.__cells))
+
+
+class _BlockGrid(object):
+    """Divisions of blockMeshDict in local coordinates of the block."""
+
+    def __init__(self, blockMeshDict):
+        v = blockMeshDict.vertices
+        o = blockMeshDict.verticesOrder
+        self.origin = v[o[0]]
+        self.axes = tuple(
+            vectormath.normalize(vectormath.subtract(v[o[i]], self.origin))
+            for i in (1, 3, 4))
+        self.size = (blockMeshDict.width, blockMeshDict.length,
+                     blockMeshDict.height)
+
+        divisions = getattr(blockMeshDict, 'divisions', None)
+        if not divisions:
+            g = blockMeshDict.grading
+            divisions = tuple(
+                lineDivide(grading, n) for grading, n in
+                zip((g.xGrading, g.yGrading, g.zGrading), blockMeshDict.nDivXYZ))
+
+        self.nodes = tuple(tuple(d * s for d in div)
+                           for div, s in zip(divisions, self.size))
+
+    def toLocal(self, point):
+        d = vectormath.subtract(point, self.origin)
+        return tuple(vectormath.dotProduct(d, axis) for axis in self.axes)
+
+    def toWorld(self, local):
+        return tuple(o + sum(local[i] * self.axes[i][c] for i in xrange(3))
+                     for c, o in enumerate(self.origin))
+
+    def cellIndex(self, local):
+        """Index of the cell that contains a point in local coordinates."""
+        return tuple(min(max(bisect_right(n, c) - 1, 0), len(n) - 2)
+                     for n, c in zip(self.nodes, local))
+
+    def cellFraction(self, local):
+        """Position of the point in the cell as a fraction between 0 and 1."""
+        index = self.cellIndex(local)
+        return tuple((c - n[i]) / (n[i + 1] - n[i])
+                     for c, n, i in zip(local, self.nodes, index))
+
+
+def validateLocationInMesh(point, blockMeshDict, geometries=None,
+                           solidIndex=None, maxLevel=10, tolerance=1e-3):
+    """Check if a point is a valid locationInMesh.
+
+    Args:
+        point: Point as (x, y, z).
+        blockMeshDict: A butterfly BlockMeshDict.
+        geometries: A list of butterfly geometries. Not needed if solidIndex is
+            provided.
+        solidIndex: Optional SolidIndex for geometries.
+        maxLevel: Maximum refinement level to check the faces of refined cells
+            (default: 10).
+        tolerance: Minimum distance to the faces of the cells as a fraction of
+            cell size at each refinement level (default: 1e-3).
+    Returns:
+        A namedtuple as (isValid, outsideDomain, insideGeometry, onCellFace).
+    """
+    v = namedtuple('LocationInMesh',
+                   'isValid outsideDomain insideGeometry onCellFace')
+    point = tuple(float(c) for c in point)
+    grid = _BlockGrid(blockMeshDict)
+    local = grid.toLocal(point)
+
+    outside = any(c <= 0 or c >= s for c, s in zip(local, grid.size))
+    onFace = not outside and _isOnCellFace(grid.cellFraction(local), maxLevel,
+                                           tolerance)
+
+    if solidIndex is None:
+        solidIndex = SolidIndex(geometries or ())
+    inside = solidIndex.isInside(point)
+
+    return v(not (outside or inside or onFace), outside, inside, onFace)
+
+
+def findLocationInMesh(blockMeshDict, geometries, point=None, maxLevel=10,
+                       maxCandidates=100000):
+    """Find a valid locationInMesh close to a point.
+
+    If the point is valid it will be returned. Otherwise candidate points in
+    blockMesh cells around the point are tested from the closest to the
+    farthest. Candidates are placed at a fixed non-dyadic fraction of the cells
+    so they are not on the faces of blockMesh cells or refined cells.
+
+    Args:
+        blockMeshDict: A butterfly BlockMeshDict.
+        geometries: A list of butterfly geometries.
+        point: Start point (default: center of blockMeshDict).
+        maxLevel: Maximum refinement level to check the faces of refined cells
+            (default: 10).
+        maxCandidates: Maximum number of candidate points (default: 100000).
+    Returns:
+        A valid point as (x, y, z).
+    """
+    point = tuple(float(c) for c in (point or blockMeshDict.center))
+    index = SolidIndex(geometries)
+    if validateLocationInMesh(point, blockMeshDict, solidIndex=index,
+                              maxLevel=maxLevel).isValid:
+        return point
+
+    grid = _BlockGrid(blockMeshDict)
+    local = grid.toLocal(point)
+    start = grid.cellIndex(local)
+    counts = tuple(len(n) - 1 for n in grid.nodes)
+    # a fraction which is not close to i / 2 ** level for any level
+    fraction = 0.4142135624
+
+    def candidate(ijk):
+        return tuple(n[i] + fraction * (n[i + 1] - n[i])
+                     for n, i in zip(grid.nodes, ijk))
+
+    tested = 0
+    for r in xrange(max(counts)):
+        shell = []
+        ranges = tuple(xrange(max(0, s - r), min(c, s + r + 1))
+                       for s, c in zip(start, counts))
+        for i in ranges[0]:
+            for j in ranges[1]:
+                for k in ranges[2]:
+                    if max(abs(i - start[0]), abs(j - start[1]),
+                           abs(k - start[2])) != r:
+                        continue
+                    c = candidate((i, j, k))
+                    shell.append(
+                        (sum((a - b) ** 2 for a, b in zip(c, local)), c))
+
+        for d, c in sorted(shell):
+            world = grid.toWorld(c)
+            if not index.isInside(world):
+                return world
+            tested += 1
+            if tested >= maxCandidates:
+                break
+        if tested >= maxCandidates:
+            break
+
+    raise ValueError(
+        'Failed to find a valid locationInMesh around {} after testing {} '
+        'points.'.format(point, tested))
+
+
+def _isOnCellFace(fractions, maxLevel, tolerance):
+    """Check if a point in a cell is on the faces of the refined cells."""
+    for f in fractions:
+        for level in xrange(maxLevel + 1):
+            s = f * 2 ** level
+            if abs(s - round(s)) < tolerance:
+                return True
+    return False
@@ -0,0 +1,334 @@
+# coding=utf-8
+"""Content-addressed cache for OpenFOAM meshes.
+
+Cases with the same geometry, blockMeshDict and snappyHexMeshDict generate the
+same mesh. MeshCache stores the final polyMesh of a case under a hash of these
+inputs so other cases (e.g. other wind directions) can reuse it instead of
+meshing again. MeshingParameters are included in the hash through
+blockMeshDict and snappyHexMeshDict.
+
+Usage:
+    cache = MeshCache()
+    cache.getOrCreate(case)  # restores the mesh or meshes and stores the case
+
+    # inspect the cache from command line
+    python -m butterfly.meshcache list
+"""
+import os
+import re
+import json
+import time
+import shutil
+import hashlib
+from collections import namedtuple
+from copy import deepcopy
+
+
+class MeshCache(object):
+    """Content-addressed mesh cache.
+
+    Entries are evicted based on last access time once the total size of the
+    cache exceeds maxSize.
+
+    Meshes are copied to the case on restore. OpenFOAM utilities such as
+    renumberMesh -overwrite and createPatch -overwrite edit polyMesh files in
+    place which would change a cached mesh if the files were shared.
+
+    Args:
+        folder: Cache folder (default: ~/butterfly/.meshcache).
+        maxSize: Maximum size of the cache in bytes (default: 10 GB).
+    """
+
+    METAFILE = 'meta.json'
+
+    def __init__(self, folder=None, maxSize=10 * 1024 ** 3):
+        """Init mesh cache."""
+        self.folder = folder or os.path.join(os.path.expanduser('~'),
+                                             'butterfly', '.meshcache')
+        self.maxSize = int(maxSize)
+
+    @property
+    def folder(self):
+        """Cache folder."""
+        return self.__folder
+
+    @folder.setter
+    def folder(self, f):
+        self.__folder = os.path.normpath(f)
+        if not os.path.isdir(self.__folder):
+            os.makedirs(self.__folder)
+
+    @property
+    def entries(self):
+        """Cached meshes sorted by last access time (most recent first).
+
+        Each entry is a namedtuple of (key, size, created, lastAccess,
+        projectName).
+        """
+        e = namedtuple('CacheEntry', 'key size created lastAccess projectName')
+        entries = []
+        for key in os.listdir(self.folder):
+            meta = None if key.endswith('.tmp') else self.__readMeta(key)
+            if not meta:
+                continue
+            entries.append(e(key, meta['size'], meta['created'],
+                             meta['lastAccess'], meta.get('projectName')))
+
+        return tuple(sorted(entries, key=lambda en: -en.lastAccess))
+
+    @property
+    def size(self):
+        """Total size of cached meshes in bytes."""
+        return sum(en.size for en in self.entries)
+
+    def key(self, case):
+        """Calculate cache key for a case.
+
+        The case should be saved before calculating the key. Key is calculated
+        from the files on disk: blockMeshDict, snappyHexMeshDict,
+        surfaceFeatureExtractDict, decomposeParDict for parallel meshing and
+        the stl files in constant/triSurface. Case name is ignored.
+        """
+        stlName = case.snappyHexMeshDict.projectName \
+            if hasattr(case, 'snappyHexMeshDict') else case.projectName
+        pattern = re.compile(r'\b{}\b'.format(re.escape(stlName)))
+
+        files = [
+            os.path.join(case.systemFolder, 'blockMeshDict'),
+            os.path.join(case.polyMeshFolder, 'blockMeshDict'),
+            os.path.join(case.systemFolder, 'snappyHexMeshDict'),
+            os.path.join(case.systemFolder, 'surfaceFeatureExtractDict')
+        ]
+        if case.decomposeParDict:
+            # parallel meshing doesn't generate the same mesh as serial meshing
+            files.append(os.path.join(case.systemFolder, 'decomposeParDict'))
+
+        if os.path.isdir(case.triSurfaceFolder):
+            files.extend(os.path.join(case.triSurfaceFolder, f)
+                         for f in sorted(os.listdir(case.triSurfaceFolder))
+                         if f.lower().endswith('.stl'))
+
+        h = hashlib.sha1()
+        for f in files:
+            if not os.path.isfile(f):
+                continue
+            name = os.path.relpath(f, case.projectDir).replace('\\', '/')
+            h.update(pattern.sub('<case>', name))
+            with open(f, 'rb') as inf:
+                content = inf.read()
+            if not f.lower().endswith('.stl'):
+                # dictionaries refer to stl file by case name
+                content = pattern.sub('<case>', content)
+            h.update(content)
+
+        return h.hexdigest()
+
+    def __contains__(self, key):
+        """Check if a key is in cache."""
+        return self.__readMeta(key) is not None
+
+    def restore(self, case, key=None):
+        """Restore cached mesh for a case to constant/polyMesh.
+
+        Args:
+            case: A butterfly case.
+            key: Optional cache key. Key will be calculated if not provided.
+        Returns:
+            True if the mesh is restored from cache otherwise False.
+        """
+        key = key or self.key(case)
+        meta = self.__readMeta(key)
+        if not meta:
+            return False
+
+        source = os.path.join(self.folder, key, 'polyMesh')
+        if os.path.isdir(case.polyMeshFolder):
+            case.removePolyMeshContent()
+        self.__copyTree(source, case.polyMeshFolder)
+
+        meta['lastAccess'] = time.time()
+        self.__writeMeta(key, meta)
+        print('Restored mesh for {} from cache: {}'.format(case.projectName, key))
+        return True
+
+    def store(self, case, key=None):
+        """Store constant/polyMesh of a case in the cache.
+
+        Args:
+            case: A butterfly case. Mesh should already be copied to
+                constant/polyMesh (e.g. using case.copySnappyHexMesh).
+            key: Optional cache key. Key will be calculated if not provided.
+        Returns:
+            Cache key.
+        """
+        key = key or self.key(case)
+        if key in self:
+            return key
+
+        assert os.path.isfile(os.path.join(case.polyMeshFolder, 'owner')), \
+            'Failed to find mesh in {}.'.format(case.polyMeshFolder)
+
+        # copy to a temp folder and rename it once the copy is finished so
+        # an incomplete entry is never used.
+        temp = os.path.join(self.folder, '{}.{}.tmp'.format(key, os.getpid()))
+        target = os.path.join(temp, 'polyMesh')
+        try:
+            self.__copyTree(case.polyMeshFolder, target,
+                            ignore=('blockMeshDict',))
+            size = sum(os.path.getsize(os.path.join(root, f))
+                       for root, dirs, files in os.walk(target) for f in files)
+            now = time.time()
+            meta = {'size': size, 'created': now, 'lastAccess': now,
+                    'projectName': case.projectName}
+            with open(os.path.join(temp, self.METAFILE), 'wb') as outf:
+                json.dump(meta, outf, indent=4)
+
+            os.rename(temp, os.path.join(self.folder, key))
+        except OSError:
+            # another process has stored the same mesh
+            if key not in self:
+                raise
+        finally:
+            self.__remove(temp)
+
+        self.evict()
+        return key
+
+    def getOrCreate(self, case, meshFunc=None):
+        """Restore mesh for a case from cache or mesh the case and store it.
+
+        Args:
+            case: A saved butterfly case.
+            meshFunc: An optional function to mesh the case. By default the case
+                will be meshed using blockMesh, snappyHexMesh and
+                copySnappyHexMesh.
+        Returns:
+            True if the mesh is restored from cache and False if case is meshed.
+        """
+        key = self.key(case)
+        if self.restore(case, key):
+            return True
+
+        if meshFunc:
+            meshFunc()
+        else:
+            for func in (case.blockMesh, case.snappyHexMesh):
+                log = func()
+                assert log.success, log.error
+            case.copySnappyHexMesh()
+
+        self.store(case, key)
+        return False
+
+    def evict(self, maxSize=None):
+        """Remove least recently used entries until size is less than maxSize.
+
+        Returns:
+            A list of removed keys.
+        """
+        maxSize = self.maxSize if maxSize is None else maxSize
+        entries = list(self.entries)
+        size = sum(en.size for en in entries)
+        removed = []
+        while entries and size > maxSize:
+            en = entries.pop()
+            self.remove(en.key)
+            size -= en.size
+            removed.append(en.key)
+        return removed
+
+    def remove(self, key):
+        """Remove an entry from cache."""
+        self.__remove(os.path.join(self.folder, key))
+
+    def clear(self):
+        """Remove all the entries from cache."""
+        for key in os.listdir(self.folder):
+            self.remove(key)
+
+    def __readMeta(self, key):
+        try:
+            with open(os.path.join(self.folder, key, self.METAFILE), 'rb') as inf:
+                return json.load(inf)
+        except (IOError, ValueError):
+            return None
+
+    def __writeMeta(self, key, meta):
+        with open(os.path.join(self.folder, key, self.METAFILE), 'wb') as outf:
+            json.dump(meta, outf, indent=4)
+
+    @staticmethod
+    def __copyTree(source, target, ignore=()):
+        """Copy files from source to target.
+
+        File permissions are not copied so the files are always writable.
+        """
+        if not os.path.isdir(target):
+            os.makedirs(target)
+        for f in os.listdir(source):
+            if f in ignore:
+                continue
+            s = os.path.join(source, f)
+            t = os.path.join(target, f)
+            if os.path.isdir(s):
+                MeshCache.__copyTree(s, t)
+                continue
+            if os.path.isfile(t):
+                # a file from another mesh or a hardlink to another file
+                os.remove(t)
+            with open(s, 'rb') as inf, open(t, 'wb') as outf:
+                shutil.copyfileobj(inf, outf, 16 * 1024 ** 2)
+
+    @staticmethod
+    def __remove(path):
+        def onerror(func, p, excinfo):
+            # read-only files on Windows from older versions of the cache
+            os.chmod(p, 0o666)
+            func(p)
+
+        if os.path.isdir(path):
+            shutil.rmtree(path, onerror=onerror)
+
+    def duplicate(self):
+        """Return a copy of this object."""
+        return deepcopy(self)
+
+    def ToString(self):
+        """Overwrite .NET ToString method."""
+        return self.__repr__()
+
+    def __repr__(self):
+        """Mesh cache representation."""
+        return 'MeshCache::{}::{} entries'.format(self.folder, len(self.entries))
+
+
+def main(args=None):
+    """Inspect mesh cache from command line."""
+    import argparse
+    parser = argparse.ArgumentParser(
+        prog='python -m butterfly.meshcache', description=__doc__.split('\n')[0])
+    parser.add_argument('command', choices=('list', 'size', 'evict', 'clear'))
+    parser.add_argument('--folder', help='Cache folder.')
+    parser.add_argument('--maxSize', type=float,
+                        help='Maximum size in MB for evict.')
+    args = parser.parse_args(args)
+
+    cache = MeshCache(args.folder)
+    if args.command == 'list':
+        for en in cache.entries:
+            print('{}  {:>10.1f} MB  {}  {}'.format(
+                en.key, en.size / 1048576.0,
+                time.strftime('%Y-%m-%d %H:%M', time.localtime(en.lastAccess)),
+                en.projectName))
+    elif args.command == 'size':
+        print('{:.1f} MB'.format(cache.size / 1048576.0))
+    elif args.command == 'evict':
+        maxSize = None if args.maxSize is None else int(args.maxSize * 1048576)
+        for key in cache.evict(maxSize):
+            print('removed {}'.format(key))
+    elif args.command == 'clear':
+        cache.clear()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,378 @@
+# coding=utf-8
+"""Estimate number of cells and memory for a case before meshing.
+
+The estimate is based on blockMeshDict divisions, refinement levels of the
+geometries in snappyHexMeshDict, refinement regions and nCellsBetweenLevels. If
+the case is already meshed the number of cells will be read from the header of
+constant/polyMesh/owner.
+
+The estimate and the memory for each cell have not been calibrated against
+meshed cases yet. Use them to compare alternatives and to catch meshes that
+are an order of magnitude too large rather than as exact numbers.
+
+Usage:
+    cellCount = estimateCellCount(case)
+
+    # what-if queries
+    estimator = CellCountEstimator.fromCase(case)
+    print estimator.cellCount, estimator.memory
+    print estimator.whatIf(cellSizeXYZ=(1, 1, 1), refLevels=(2, 2)).cellCount
+"""
+from __future__ import division
+import os
+import re
+import gzip
+from collections import namedtuple
+from copy import deepcopy
+
+import vectormath as vm
+
+
+def meshArea(mesh):
+    """Calculate surface area of a butterfly mesh (e.g. BFGeometry)."""
+    v = mesh.vertices
+    return sum(
+        vm.length(vm.crossProduct(vm.subtract(v[f[1]], v[f[0]]),
+                                  vm.subtract(v[f[2]], v[f[0]]), norm=False)) / 2
+        for f in mesh.faceIndices)
+
+
+def meshVolume(mesh):
+    """Calculate enclosed volume of a butterfly mesh.
+
+    The result is only meaningful for closed meshes. Open meshes return a small
+    or random value which is clipped by the caller.
+    """
+    v = mesh.vertices
+    vol = sum(vm.dotProduct(v[f[0]], vm.crossProduct(v[f[1]], v[f[2]], norm=False))
+              for f in mesh.faceIndices) / 6.0
+    return abs(vol)
+
+
+def cellCountFromPolyMesh(polyMeshFolder):
+    """Read number of cells from owner file in a polyMesh folder.
+
+    OpenFOAM writes the number of cells to the note in the header of owner file.
+
+    Returns:
+        Number of cells or None if owner file doesn't exist or doesn't have the
+        note.
+    """
+    pattern = re.compile(r'nCells\s*:\s*(\d+)')
+    for name, opener in (('owner', open), ('owner.gz', gzip.open)):
+        fp = os.path.join(polyMeshFolder, name)
+        if not os.path.isfile(fp):
+            continue
+        inf = opener(fp, 'rb')
+        try:
+            # note is in the first few lines of the header
+            for count, line in enumerate(inf):
+                match = pattern.search(line)
+                if match:
+                    return int(match.group(1))
+                if count > 30:
+                    break
+        finally:
+            inf.close()
+
+    return None
+
+
+class CellCountEstimator(object):
+    """Estimate number of cells and memory footprint for a mesh.
+
+    Each refinement level halves the cell size. Geometries are refined to the
+    minimum level of their refLevels and the average of minimum and maximum
+    levels is used if resolveFeatureAngle is less than 180 degrees. Each level
+    keeps nCellsBetweenLevels cells between itself and the next level. The
+    volume for each level is calculated from the area of the geometries and
+    the volume of refinement regions. Overlaps between refinement regions are
+    not considered so the estimate is an upper bound for overlapping regions.
+
+    Area and volume of the geometries are calculated once so what-if queries
+    are fast enough to be used interactively.
+
+    Args:
+        blockMeshDict: A butterfly BlockMeshDict.
+        geometries: A list of butterfly geometries.
+        refinementRegions: A list of butterfly refinement regions.
+        nCellsBetweenLevels: Number of cells between levels (default: 3).
+        resolveFeatureAngle: resolveFeatureAngle in snappyHexMeshDict
+            (default: 180).
+        maxGlobalCells: maxGlobalCells in snappyHexMeshDict (default: 2000000).
+    """
+
+    # rough memory use for each cell in bytes. These values are not calibrated
+    # against measured runs yet.
+    SOLVERBYTESPERCELL = 1000
+    SNAPPYHEXMESHBYTESPERCELL = 2000
+
+    def __init__(self, blockMeshDict, geometries, refinementRegions=None,
+                 nCellsBetweenLevels=3, resolveFeatureAngle=180,
+                 maxGlobalCells=2000000):
+        """Init estimator."""
+        assert hasattr(blockMeshDict, 'nDivXYZ'), \
+            '{} is not a BlockMeshDict.'.format(blockMeshDict)
+        self.__scale = float(blockMeshDict.convertToMeters)
+        self.__size = tuple(v * self.__scale for v in (
+            blockMeshDict.width, blockMeshDict.length, blockMeshDict.height))
+        self.nDivXYZ = blockMeshDict.nDivXYZ
+        self.nCellsBetweenLevels = nCellsBetweenLevels
+        self.resolveFeatureAngle = resolveFeatureAngle
+        self.maxGlobalCells = int(maxGlobalCells)
+
+        # {name: [area, volume, refLevels]}
+        self.__surfaces = {}
+        for geo in geometries:
+            if hasattr(geo, 'isBFBlockGeometry'):
+                continue
+            self.__surfaces[geo.name] = [
+                meshArea(geo) * self.__scale ** 2,
+                meshVolume(geo) * self.__scale ** 3,
+                tuple(geo.boundaryCondition.refLevels)]
+
+        # {name: [area, volume, mode, levels]}
+        self.__regions = {}
+        for region in refinementRegions or ():
+            mode = region.refinementMode
+            self.__regions[region.name] = [
+                meshArea(region) * self.__scale ** 2,
+                meshVolume(region) * self.__scale ** 3,
+                mode.__class__.__name__.lower(), mode.levels]
+
+    @classmethod
+    def fromCase(cls, case):
+        """Create an estimator from a butterfly case."""
+        assert hasattr(case, 'blockMeshDict'), \
+            '{} has no blockMeshDict to estimate the number of cells.'.format(case)
+
+        if not hasattr(case, 'snappyHexMeshDict'):
+            return cls(case.blockMeshDict, ())
+
+        # faces of blockMesh are not refined
+        boundary = set(geo.name for geo in case.blockMeshDict.geometry)
+        geometries = tuple(geo for geo in case.geometries
+                           if geo.name not in boundary)
+
+        shmd = case.snappyHexMeshDict
+        cmc = shmd.values['castellatedMeshControls']
+        return cls(case.blockMeshDict, geometries, case.refinementRegions,
+                   int(shmd.nCellsBetweenLevels),
+                   float(cmc.get('resolveFeatureAngle', 180)),
+                   int(cmc.get('maxGlobalCells', 2000000)))
+
+    @property
+    def nDivXYZ(self):
+        """Number of divisions in blockMeshDict as (x, y, z)."""
+        return self.__nDivXYZ
+
+    @nDivXYZ.setter
+    def nDivXYZ(self, d):
+        self.__nDivXYZ = tuple(max(1, int(v)) for v in d)
+
+    @property
+    def nCellsBetweenLevels(self):
+        """Number of cells between levels."""
+        return self.__nCellsBetweenLevels
+
+    @nCellsBetweenLevels.setter
+    def nCellsBetweenLevels(self, n):
+        self.__nCellsBetweenLevels = max(1, int(n))
+
+    @property
+    def domainVolume(self):
+        """Volume of blockMesh in cubic meters."""
+        return self.__size[0] * self.__size[1] * self.__size[2]
+
+    @property
+    def baseCellCount(self):
+        """Number of cells in blockMesh."""
+        return self.nDivXYZ[0] * self.nDivXYZ[1] * self.nDivXYZ[2]
+
+    @property
+    def baseCellSize(self):
+        """Edge of a cube with the same volume as blockMesh cells."""
+        return (self.domainVolume / self.baseCellCount) ** (1 / 3.0)
+
+    @property
+    def surfaces(self):
+        """Geometry names and their refinement levels as a dictionary."""
+        return dict((k, v[2]) for k, v in self.__surfaces.iteritems())
+
+    @property
+    def regions(self):
+        """Refinement region names and their levels as a dictionary."""
+        return dict((k, v[3]) for k, v in self.__regions.iteritems())
+
+    @property
+    def levels(self):
+        """Estimated cells for each refinement level.
+
+        A tuple of namedtuples as (level, cellSize, volume, cellCount).
+        """
+        lev = namedtuple('Level', 'level cellSize volume cellCount')
+        if not self.domainVolume:
+            return ()
+
+        h0 = self.baseCellSize
+        nBetween = self.nCellsBetweenLevels
+        useMax = self.resolveFeatureAngle < 180
+
+        # collect (level, area, volume) for each source of refinement
+        sources = []
+        solidVolume = 0
+        for area, vol, refLevels in self.__surfaces.itervalues():
+            minL, maxL = refLevels
+            level = (minL + maxL) / 2.0 if useMax else minL
+            solidVolume += vol
+            sources.append((level, area, 0))
+
+        for area, vol, mode, levels in self.__regions.itervalues():
+            if mode == 'inside':
+                sources.append((levels[0][1], area, vol))
+            elif mode == 'outside':
+                sources.append((levels[0][1], area,
+                                max(0, self.domainVolume - vol)))
+            else:
+                # distance: levels are sorted by distance. The closest level is
+                # the finest one.
+                for dist, level in levels:
+                    sources.append((level, 0, vol + area * dist * self.__scale))
+
+        # volume which is refined to level l or higher for each level
+        maxLevel = int(max([s[0] for s in sources] or [0]) + 0.5)
+        fluidVolume = max(0, self.domainVolume - solidVolume)
+        volumes = []
+        for l in xrange(maxLevel + 1):
+            vol = 0
+            for level, area, v in sources:
+                if level < l:
+                    continue
+                vol += v
+                # surface band of level and transition bands to finer levels
+                for k in xrange(l, int(level + 0.5) + 1):
+                    vol += area * nBetween * h0 / 2 ** k
+            volumes.append(min(fluidVolume, vol) if l else fluidVolume)
+        volumes.append(0)
+
+        res = []
+        for l in xrange(maxLevel + 1):
+            size = h0 / 2 ** l
+            vol = max(0, volumes[l] - volumes[l + 1])
+            res.append(lev(l, size, vol, int(vol / size ** 3)))
+
+        return tuple(res)
+
+    @property
+    def cellCount(self):
+        """Estimated number of cells."""
+        levels = self.levels
+        if not levels:
+            return self.baseCellCount
+        return sum(l.cellCount for l in levels)
+
+    @property
+    def memory(self):
+        """Estimated memory in bytes as a namedtuple (solver, snappyHexMesh)."""
+        mem = namedtuple('Memory', 'solver snappyHexMesh')
+        count = self.cellCount
+        return mem(count * self.SOLVERBYTESPERCELL,
+                   count * self.SNAPPYHEXMESHBYTESPERCELL)
+
+    def exceedsMaxGlobalCells(self, maxGlobalCells=None):
+        """Check if estimated number of cells is more than maxGlobalCells.
+
+        snappyHexMesh stops refining once it reaches maxGlobalCells.
+
+        Args:
+            maxGlobalCells: Optional value to overwrite maxGlobalCells from
+                snappyHexMeshDict.
+        """
+        maxGlobalCells = maxGlobalCells or self.maxGlobalCells
+        return self.cellCount > int(maxGlobalCells)
+
+    def whatIf(self, nDivXYZ=None, cellSizeXYZ=None, refLevels=None,
+               regionLevels=None, nCellsBetweenLevels=None,
+               meshingParameters=None):
+        """Get a new estimator with different meshing inputs.
+
+        This object will not be changed.
+
+        Args:
+            nDivXYZ: Number of divisions in blockMeshDict as (x, y, z).
+            cellSizeXYZ: Cell size in blockMeshDict as (x, y, z).
+            refLevels: (min, max) levels for all the geometries or a dictionary
+                of {geometry name: (min, max)}.
+            regionLevels: A dictionary of {region name: levels}. levels is a
+                level for inside and outside regions and a list of
+                (distance, level) for distance regions.
+            nCellsBetweenLevels: Number of cells between levels.
+            meshingParameters: MeshingParameters. cellSizeXYZ will be used.
+        Returns:
+            A new CellCountEstimator.
+        """
+        est = self.duplicate()
+        if meshingParameters and meshingParameters.cellSizeXYZ:
+            cellSizeXYZ = cellSizeXYZ or meshingParameters.cellSizeXYZ
+
+        if nDivXYZ:
+            est.nDivXYZ = nDivXYZ
+        elif cellSizeXYZ:
+            est.nDivXYZ = tuple(
+                int(round(s / (c * self.__scale))) if d > 1 else 1
+                for s, c, d in zip(self.__size, cellSizeXYZ, self.nDivXYZ))
+
+        if nCellsBetweenLevels:
+            est.nCellsBetweenLevels = nCellsBetweenLevels
+
+        surfaces = est.__surfaces
+        if isinstance(refLevels, dict):
+            for name, lev in refLevels.iteritems():
+                assert name in surfaces, 'Failed to find {}.'.format(name)
+                surfaces[name][2] = tuple(int(v) for v in lev)
+        elif refLevels:
+            for s in surfaces.itervalues():
+                s[2] = tuple(int(v) for v in refLevels)
+
+        regions = est.__regions
+        for name, lev in (regionLevels or {}).iteritems():
+            assert name in regions, 'Failed to find {}.'.format(name)
+            if regions[name][2] == 'distance':
+                regions[name][3] = tuple(sorted(tuple(l) for l in lev))
+            else:
+                regions[name][3] = ((1e15, int(lev)),)
+
+        return est
+
+    def duplicate(self):
+        """Return a copy of this object."""
+        return deepcopy(self)
+
+    def ToString(self):
+        """Overwrite .NET ToString method."""
+        return self.__repr__()
+
+    def __repr__(self):
+        """Estimator representation."""
+        return 'CellCountEstimator::{} cells::{:.1f} GB'.format(
+            self.cellCount, self.memory.solver / 1024.0 ** 3)
+
+
+def estimateCellCount(case, usePolyMesh=True):
+    """Estimate number of cells for a case.
+
+    See CellCountEstimator for details.
+
+    Args:
+        case: A butterfly case.
+        usePolyMesh: Read number of cells from constant/polyMesh if the case
+            is already meshed (default: True).
+    Returns:
+        Estimated number of cells as an integer.
+    """
+    if usePolyMesh:
+        count = cellCountFromPolyMesh(case.polyMeshFolder)
+        if count:
+            return count
+
+    return CellCountEstimator.fromCase(case).cellCount
@@ -19,10 +19,14 @@ class MeshingParameters(object):
             value updates locationInMesh in snappyHexMeshDict.
         globRefineLevel: A tuple of (min, max) values for global refinment. This
             value updates globalRefinementLevel in snappyHexMeshDict.
+        findLocationInMesh: Search for a locationInMesh outside the geometries
+            if locationInMesh is not provided (default: False). A provided
+            locationInMesh is never moved and is only checked. Geometries
+            with IndoorWallBoundaryCondition are not considered as solids.
     """
 
     def __init__(self, cellSizeXYZ=None, grading=None, locationInMesh=None,
-                 globRefineLevel=None):
+                 globRefineLevel=None, findLocationInMesh=False):
         """Init meshing parameters."""
         # blockMeshDict
         self.cellSizeXYZ = None if not cellSizeXYZ else tuple(cellSizeXYZ)
@@ -30,6 +34,7 @@ class MeshingParameters(object):
         self.locationInMesh = locationInMesh  # snappyHexMeshDict
         # snappyHexMeshDict
         self.globRefineLevel = None if not globRefineLevel else tuple(globRefineLevel)
+        self.findLocationInMesh = findLocationInMesh
 
     @property
     def isMeshingParameters(self):
@@ -1,7 +1,12 @@
 """OpenFOAM/c++ dictionary parser."""
+import os
 import re
+import math
 from collections import OrderedDict
 
+from .timeindex import parseTime
+from .downsample import MinMaxDownsampler, minMax, lttb
+
 
 class CppDictParser(object):
     """Parse OpenFOAM dictionary to Python dictionary.
@@ -103,33 +108,80 @@ class ResidualParser(object):
         parser: If ture Parser will start parsing the values once initiated.
     """
 
+    # number of bytes at the start of the file that are used to find out if
+    # the log file is replaced. OpenFOAM writes date, time and PID in header.
+    HEADSIZE = 1024
+
     def __init__(self, filepath, parse=True):
         """Init residual parser."""
         self.filepath = filepath
-        self.__residuals = OrderedDict()
+        self.__reset()
         if parse:
             self.parse()
 
+    def __reset(self):
+        self.__residuals = OrderedDict()
+        self.__executionTimes = OrderedDict()
+        self.__times = []
+        self.__offset = 0
+        self.__fileId = None
+        self.__head = ''
+        self.__downsamplers = {}
+        self.timestep = None
+        self.quantities = []
+
     def parse(self):
         """Parse the log file."""
-        # open the file
-        # try to find the first line with Time =
-        # send the file to a recursive residualParser
+        self.__reset()
+        self.update()
+
+    def update(self):
+        """Parse new lines that are added to the log file since the last parse.
+
+        Use this method to follow a running solution without parsing the whole
+        file every time. If the log file is rewritten (e.g. the solution is
+        rerun) the values are removed and the new file is parsed from the start.
+        """
         try:
             with open(self.filepath, 'rb') as f:
-                for line in f:
-                    if line.startswith('Time ='):
-                        self.timestep = self.__getTime(line)
-                        self.__residuals[self.timestep] = {}
-                        self.__parseResiduals(f)
+                stat = os.fstat(f.fileno())
+                fileId = self.__getFileId(stat)
+                head = f.read(self.HEADSIZE)
+                if self.__isReplaced(stat.st_size, fileId, head):
+                    self.__reset()
+                self.__fileId, self.__head = fileId, head
+                f.seek(self.__offset)
+                for line in iter(f.readline, ''):
+                    if not line.endswith('\n'):
+                        # the line is not complete yet
+                        break
+                    self.__offset += len(line)
+                    self.__parseLine(line)
         except Exception as e:
-            raise 'Failed to parse {}:\n\t{}'.format(self.filepath, e)
+            raise ValueError('Failed to parse {}:\n\t{}'.format(self.filepath, e))
+
+    def __isReplaced(self, size, fileId, head):
+        """Check if the file is replaced or truncated since the last update."""
+        if not self.__offset:
+            return False
+        return size < self.__offset or fileId != self.__fileId or \
+            head[:len(self.__head)] != self.__head
+
+    @staticmethod
+    def __getFileId(stat):
+        # inode is not available on Windows. ctime is the creation time.
+        return stat.st_ctime if os.name == 'nt' else (stat.st_dev, stat.st_ino)
 
     @property
     def residuals(self):
         """Get residuals as a dictionary."""
         return self.__residuals
 
+    @property
+    def executionTimes(self):
+        """Get ExecutionTime in seconds for each timestep as a dictionary."""
+        return self.__executionTimes
+
     @property
     def timeRange(self):
         """Get time range as a tuple."""
@@ -157,23 +209,109 @@ class ResidualParser(object):
             except IndexError as e:
                 raise ValueError('Failed to read timeRange:\n{}'.format(e))
 
-            return (self.__residuals[int(t)][quantity] for t in xrange(t0, t1))
+            return (v[quantity] for t, v in self.__residuals.iteritems()
+                    if t0 <= t < t1)
+
+    def getDownsampledResiduals(self, quantity, width=500, timeRange=None,
+                                method=0):
+        """Get residuals for a quantity downsampled for plotting.
+
+        Downsampling is done on log10 of residuals so the shape of the curve is
+        preserved in a logarithmic chart. For method 0 the buckets are cached
+        and calling update and this method again only updates the last bucket.
+
+        Args:
+            quantity: Residual field (e.g. Ux, p).
+            width: Target width of the chart in pixels (default: 500).
+            timeRange: Optional time range as (t0, t1).
+            method: 0: min-max bucketing, 1: Largest-Triangle-Three-Buckets
+                (default: 0).
+        Returns:
+            A list of (timestep, residual) values.
+        """
+        if quantity not in self.quantities:
+            print 'Invalid quantity [{}]. Try from the list below:\n{}' \
+                .format(quantity, self.quantities)
+            return ()
+
+        # the latest timestep can be incomplete
+        completed = len(self.__times) - 1
+        latest = self.__times[-1] if self.__times else None
+
+        if method == 0 and not timeRange:
+            key = (quantity, int(width))
+            if key not in self.__downsamplers:
+                # [downsampler, timesteps in downsampler, parsed timesteps]
+                self.__downsamplers[key] = [MinMaxDownsampler(width), [], 0]
+            cache = self.__downsamplers[key]
+            ds, times = cache[0], cache[1]
+            # only add new timesteps to the downsampler
+            for t in self.__times[cache[2]:completed]:
+                if quantity in self.__residuals[t]:
+                    times.append(t)
+                    ds.append(self.__logResidual(self.__residuals[t][quantity]))
+            cache[2] = max(cache[2], completed)
+            ind = ds.indices
+        else:
+            times = tuple(t for t in self.__times[:completed]
+                          if quantity in self.__residuals[t])
+            if timeRange:
+                t0, t1 = timeRange[0], timeRange[1]
+                times = tuple(t for t in times if t0 <= t < t1)
+                if latest is not None and not t0 <= latest < t1:
+                    latest = None
+
+            values = tuple(self.__logResidual(self.__residuals[t][quantity])
+                           for t in times)
+            if method == 0:
+                ind = tuple(i for i, v in minMax(values, width))
+            else:
+                ind = lttb(tuple(enumerate(values)), width)
+
+        points = [(times[i], float(self.__residuals[times[i]][quantity]))
+                  for i in ind]
+
+        if latest is not None and quantity in self.__residuals[latest]:
+            points.append((latest, float(self.__residuals[latest][quantity])))
+
+        return points
+
+    @staticmethod
+    def __logResidual(value):
+        v = float(value)
+        # avoid math domain error for 0 residuals
+        return math.log10(v) if v > 0 else -300
 
     @staticmethod
     def __getTime(line):
-        return int(line.split('Time =')[-1])
-
-    def __parseResiduals(self, f):
-        for line in f:
-            if not line.startswith('Time ='):
-                try:
-                    # quantity, Initial residual, Final residual, No Iterations
-                    q, ir, fr, ni = line.split(':  Solving for ')[1].split(',')
-                    self.__residuals[self.timestep][q] = ir.split('= ')[-1]
-                except IndexError:
-                    pass
-            else:
-                self.timestep = self.__getTime(line)
-                self.__residuals[self.timestep] = {}
+        return parseTime(line.split('Time =')[-1])
+
+    @staticmethod
+    def __getExecutionTime(line):
+        # ExecutionTime = 12.34 s  ClockTime = 13 s
+        return float(line.split('ExecutionTime =')[-1].split()[0])
 
-        self.quantities = self.__residuals[self.timestep].keys()
+    def __parseLine(self, line):
+        if line.startswith('Time ='):
+            self.timestep = self.__getTime(line)
+            self.__residuals[self.timestep] = {}
+            self.__times.append(self.timestep)
+        elif self.timestep is None:
+            # header of the log file
+            return
+        elif line.startswith('ExecutionTime ='):
+            try:
+                self.__executionTimes[self.timestep] = \
+                    self.__getExecutionTime(line)
+            except ValueError:
+                pass
+        else:
+            try:
+                # quantity, Initial residual, Final residual, No Iterations
+                q, ir, fr, ni = line.split(':  Solving for ')[1].split(',')
+                self.__residuals[self.timestep][q] = ir.split('= ')[-1]
+            except (IndexError, ValueError):
+                pass
+            else:
+                if q not in self.quantities:
+                    self.quantities.append(q)
@@ -0,0 +1,488 @@
+# coding=utf-8
+"""Make-style pipeline for meshing and solving a case.
+
+A Pipeline is a collection of steps with dependencies (a directed acyclic
+graph). Each step declares its inputs (files or folders in the case folder) and
+outputs. A step will be skipped if the hash of its inputs and the hash of the
+upstream steps matches the last successful run and its outputs exist. An
+upstream step will also run again before a step that is not up to date if its
+outputs are changed since its last run (e.g. snappyHexMesh needs the mesh from
+blockMesh which is replaced by copySnappyHexMesh).
+
+Usage:
+    pipeline = Pipeline.fromSolution(solution)
+    reports = pipeline.run()
+    # change fvSchemes and run again. Only solve will be executed.
+    reports = pipeline.run()
+"""
+import os
+import json
+import time
+import hashlib
+from glob import glob
+from collections import namedtuple, OrderedDict
+from copy import deepcopy
+
+
+class Step(object):
+    """A step in the pipeline.
+
+    Args:
+        name: Step name as a string with no whitespace.
+        func: A function with no arguments to execute the step. The step is
+            successful if the function returns True, None or an object with
+            a success attribute which is True (e.g. outputs of Case.command).
+        inputs: A list of relative paths to files or folders in the case folder
+            that the step reads. Glob patterns (e.g. constant/triSurface/*.stl)
+            are supported.
+        outputs: A list of relative paths to files or folders in the case folder
+            that the step writes. The step will run again if any of the outputs
+            is missing.
+        dependsOn: A list of names for upstream steps.
+        statInputs: A list of relative paths to large inputs (e.g.
+            constant/polyMesh). Files are hashed by name, size, modification
+            time and inode instead of their content.
+    """
+
+    def __init__(self, name, func, inputs=None, outputs=None, dependsOn=None,
+                 statInputs=None):
+        """Init step."""
+        assert callable(func), '{} is not a function.'.format(func)
+        self.name = name
+        self.func = func
+        self.inputs = tuple(inputs or ())
+        self.outputs = tuple(outputs or ())
+        self.dependsOn = tuple(dependsOn or ())
+        self.statInputs = tuple(statInputs or ())
+
+    @property
+    def isStep(self):
+        """Return True."""
+        return True
+
+    def hash(self, projectDir, upstreamHashes=None):
+        """Calculate hash for the inputs of this step.
+
+        Args:
+            projectDir: Full path to case folder.
+            upstreamHashes: A list of hashes for upstream steps.
+        """
+        h = hashlib.sha1()
+        h.update(self.name)
+        for uh in upstreamHashes or ():
+            h.update(uh)
+
+        for f in self.__files(projectDir, self.inputs):
+            h.update(os.path.relpath(f, projectDir).replace('\\', '/'))
+            if not os.path.isfile(f):
+                h.update('<missing>')
+                continue
+            with open(f, 'rb') as inf:
+                for chunk in iter(lambda: inf.read(1048576), ''):
+                    h.update(chunk)
+
+        self.__statHash(h, projectDir, self.statInputs)
+        return h.hexdigest()
+
+    def outputsHash(self, projectDir):
+        """Calculate hash for the outputs of this step.
+
+        The hash is calculated from name, size, modification time and inode of
+        the files so it is independent of the size of the outputs.
+        """
+        h = hashlib.sha1()
+        self.__statHash(h, projectDir, self.outputs)
+        return h.hexdigest()
+
+    def outputsExist(self, projectDir):
+        """Check if all the outputs exist."""
+        return all(os.path.exists(os.path.join(projectDir, p))
+                   for p in self.outputs)
+
+    def execute(self):
+        """Execute the step and return True if it is successful."""
+        res = self.func()
+        if res is None:
+            return True
+        elif hasattr(res, 'success'):
+            return res.success
+        return bool(res)
+
+    def __statHash(self, h, projectDir, paths):
+        """Update hash with name, size, modification time and inode."""
+        for f in self.__files(projectDir, paths):
+            h.update(os.path.relpath(f, projectDir).replace('\\', '/'))
+            try:
+                st = os.stat(f)
+            except OSError:
+                h.update('<missing>')
+            else:
+                h.update('{}:{}:{}'.format(st.st_size, st.st_mtime, st.st_ino))
+
+    @staticmethod
+    def __files(projectDir, paths):
+        """Get sorted list of files for a list of paths."""
+        files = []
+        for p in paths:
+            fp = os.path.join(projectDir, p)
+            paths = glob(fp) if any(c in p for c in '*?[') else (fp,)
+            for path in paths:
+                if os.path.isdir(path):
+                    for root, dirs, fs in os.walk(path):
+                        files.extend(os.path.join(root, f) for f in fs)
+                else:
+                    # file or missing file
+                    files.append(path)
+
+        return sorted(set(os.path.normpath(f) for f in files))
+
+    def duplicate(self):
+        """Return a copy of this object."""
+        return deepcopy(self)
+
+    def ToString(self):
+        """Overwrite .NET ToString method."""
+        return self.__repr__()
+
+    def __repr__(self):
+        """Step representation."""
+        return 'Step::{}'.format(self.name)
+
+
+class Pipeline(object):
+    """A pipeline of steps with up-to-date checks.
+
+    State of the last successful run for each step is saved to
+    log/pipeline.json and the timing report for the last run is written to
+    log/pipeline.log.
+
+    Args:
+        projectDir: Full path to case folder.
+        steps: A list of steps.
+    """
+
+    STATEFILE = 'pipeline.json'
+    REPORTFILE = 'pipeline.log'
+
+    def __init__(self, projectDir, steps=None):
+        """Init pipeline."""
+        self.projectDir = projectDir
+        self.__steps = OrderedDict()
+        self.__reports = ()
+        for step in steps or ():
+            self.addStep(step)
+
+    @classmethod
+    def fromCase(cls, case):
+        """Create a meshing pipeline for a case.
+
+        Steps are blockMesh, surfaceFeatureExtract (if the case has a
+        surfaceFeatureExtractDict), snappyHexMesh, copySnappyHexMesh and
+        checkMesh. Save the case before running the pipeline.
+        """
+        return cls(case.projectDir, cls.__meshingSteps(case))
+
+    @classmethod
+    def fromSolution(cls, solution):
+        """Create a meshing and solve pipeline for a solution.
+
+        Steps are the meshing steps from fromCase and solve which runs the
+        recipe's application and waits for it to finish.
+        """
+        case = solution.case
+
+        def solve():
+            case.renameSnappyHexMeshFolders()
+            return case.command(solution.recipe.application,
+                                decomposeParDict=solution.decomposeParDict,
+                                wait=True)
+
+        # mesh is hashed by stat. Other folders in constant (e.g. triSurface)
+        # are inputs of the meshing steps.
+        steps = cls.__meshingSteps(case) + (
+            Step('solve', solve,
+                 ('0', 'system', os.path.join('constant', '*Properties'),
+                  os.path.join('constant', 'g')),
+                 (os.path.join('log', solution.recipe.logFile),),
+                 ('checkMesh',), (os.path.join('constant', 'polyMesh'),)),)
+
+        return cls(case.projectDir, steps)
+
+    @staticmethod
+    def __meshingSteps(case):
+        """Default meshing steps for a case."""
+        stl = os.path.join('constant', 'triSurface', '*.stl')
+        polyMesh = os.path.join('constant', 'polyMesh')
+
+        steps = [
+            Step('blockMesh', case.blockMesh,
+                 (os.path.join('system', 'blockMeshDict'),
+                  os.path.join(polyMesh, 'blockMeshDict')),
+                 (os.path.join(polyMesh, 'points'),))
+        ]
+
+        snappyDependsOn = ['blockMesh']
+        if hasattr(case, 'surfaceFeatureExtractDict'):
+            steps.append(
+                Step('surfaceFeatureExtract', case.surfaceFeatureExtract,
+                     (os.path.join('system', 'surfaceFeatureExtractDict'), stl)))
+            snappyDependsOn.append('surfaceFeatureExtract')
+
+        steps.extend((
+            Step('snappyHexMesh', case.snappyHexMesh,
+                 (os.path.join('system', 'snappyHexMeshDict'),
+                  os.path.join('system', 'decomposeParDict'), stl,
+                  os.path.join('constant', 'triSurface', '*.eMesh')),
+                 dependsOn=snappyDependsOn),
+            Step('copySnappyHexMesh', case.copySnappyHexMesh,
+                 outputs=(os.path.join(polyMesh, 'owner'),),
+                 dependsOn=('snappyHexMesh',)),
+            Step('checkMesh', case.checkMesh, None,
+                 (os.path.join('log', 'checkMesh.log'),),
+                 ('copySnappyHexMesh',), (polyMesh,))
+        ))
+
+        return tuple(steps)
+
+    @property
+    def projectDir(self):
+        """Full path to case folder."""
+        return self.__projectDir
+
+    @projectDir.setter
+    def projectDir(self, p):
+        self.__projectDir = os.path.normpath(p)
+
+    @property
+    def stateFile(self):
+        """Full path to state file."""
+        return os.path.join(self.projectDir, 'log', self.STATEFILE)
+
+    @property
+    def reportFile(self):
+        """Full path to report file."""
+        return os.path.join(self.projectDir, 'log', self.REPORTFILE)
+
+    @property
+    def steps(self):
+        """Steps sorted by dependencies."""
+        ordered = []
+        visiting = set()
+
+        def visit(name):
+            if name in ordered:
+                return
+            assert name not in visiting, \
+                'Circular dependency in pipeline for {}.'.format(name)
+            try:
+                step = self.__steps[name]
+            except KeyError:
+                raise ValueError('Failed to find step: {}.'.format(name))
+            visiting.add(name)
+            for dep in step.dependsOn:
+                visit(dep)
+            visiting.remove(name)
+            ordered.append(name)
+
+        for name in self.__steps:
+            visit(name)
+
+        return tuple(self.__steps[name] for name in ordered)
+
+    @property
+    def state(self):
+        """State of the last successful run for each step as a dictionary."""
+        try:
+            with open(self.stateFile, 'rb') as inf:
+                return json.load(inf)
+        except (IOError, ValueError):
+            return {}
+
+    @property
+    def reports(self):
+        """Reports for the last run."""
+        return self.__reports
+
+    def addStep(self, step):
+        """Add a step to the pipeline. Step with the same name will be replaced."""
+        assert hasattr(step, 'isStep'), '{} is not a Step.'.format(step)
+        self.__steps[step.name] = step
+
+    def getStep(self, name):
+        """Get a step by name."""
+        return self.__steps[name]
+
+    def isUpToDate(self, name):
+        """Check if a step and all its upstream steps are up to date.
+
+        A step is not up to date if it will run on the next call to run.
+        """
+        if name not in self.__steps:
+            raise ValueError('Failed to find step: {}.'.format(name))
+        return name not in self.__outdated(self.steps, self.state)
+
+    def run(self, force=False, until=None):
+        """Run the pipeline.
+
+        Steps will be skipped if they are up to date. Pipeline stops at the
+        first failed step.
+
+        Args:
+            force: Set to True to run all the steps (default: False).
+            until: Optional name of the last step to run.
+        Returns:
+            A tuple of namedtuples as (name, status, seconds) for each step.
+            status is one of success, skipped, failed or notExecuted.
+        """
+        r = namedtuple('StepReport', 'name status seconds')
+        reports = []
+        hashes = {}
+        executed = set()
+        failed = False
+        state = self.state
+        logFolder = os.path.dirname(self.stateFile)
+        if not os.path.isdir(logFolder):
+            os.makedirs(logFolder)
+
+        steps = self.steps
+        if until:
+            # only run until and its upstream steps
+            required = set()
+
+            def collect(name):
+                required.add(name)
+                for d in self.__steps[name].dependsOn:
+                    collect(d)
+
+            collect(until)
+            steps = tuple(s for s in steps if s.name in required)
+
+        outdated = None if force else self.__outdated(steps, state)
+
+        for step in steps:
+            if failed:
+                reports.append(r(step.name, 'notExecuted', 0))
+                continue
+
+            # hash is calculated after running the upstream steps
+            hashes[step.name] = step.hash(
+                self.projectDir, (hashes[d] for d in step.dependsOn))
+
+            if not force and step.name not in outdated and \
+                    not any(d in executed for d in step.dependsOn):
+                reports.append(r(step.name, 'skipped', 0))
+                continue
+
+            print('Running {}...'.format(step.name))
+            st = time.time()
+            try:
+                success = step.execute()
+            except Exception as e:
+                print('{} failed:\n\t{}'.format(step.name, e))
+                success = False
+            duration = time.time() - st
+
+            executed.add(step.name)
+            if success:
+                state[step.name] = {
+                    'hash': hashes[step.name],
+                    'outputs': step.outputsHash(self.projectDir),
+                    'time': time.time(), 'seconds': duration}
+            else:
+                state.pop(step.name, None)
+                failed = True
+
+            self.__saveState(state)
+            reports.append(r(step.name, 'success' if success else 'failed',
+                             duration))
+
+        self.__reports = tuple(reports)
+        self.writeReport()
+        return self.__reports
+
+    def reset(self, name=None):
+        """Remove saved state for a step or all the steps.
+
+        The step(s) will run on the next call to run.
+        """
+        if not name:
+            self.__saveState({})
+            return
+        state = self.state
+        state.pop(name, None)
+        self.__saveState(state)
+
+    def writeReport(self):
+        """Write timing report for the last run to log/pipeline.log."""
+        if not self.reports:
+            return
+
+        lines = ['{:<24}{:<14}{:>12}'.format('step', 'status', 'seconds')]
+        lines.extend('{:<24}{:<14}{:>12.2f}'.format(*rep)
+                     for rep in self.reports)
+        lines.append('{:<38}{:>12.2f}'.format(
+            'total', sum(rep.seconds for rep in self.reports)))
+
+        with open(self.reportFile, 'wb') as outf:
+            outf.write('\n'.join(lines) + '\n')
+
+    def __isStepUpToDate(self, step, h, state):
+        try:
+            return state[step.name]['hash'] == h and \
+                step.outputsExist(self.projectDir)
+        except (KeyError, TypeError):
+            return False
+
+    def __outputsChanged(self, step, state):
+        """Check if outputs of a step are changed since its last run."""
+        try:
+            h = state[step.name]['outputs']
+        except (KeyError, TypeError):
+            # state from an older version
+            return False
+        return h != step.outputsHash(self.projectDir)
+
+    def __outdated(self, steps, state):
+        """Get names of the steps that should run.
+
+        A step should run if it is not up to date or one of its upstream steps
+        should run. An upstream step should also run before a step that is not
+        up to date if its outputs are changed since its last run.
+        """
+        hashes = {}
+        outdated = set()
+        for step in steps:
+            hashes[step.name] = step.hash(
+                self.projectDir, (hashes[d] for d in step.dependsOn))
+            if not self.__isStepUpToDate(step, hashes[step.name], state):
+                outdated.add(step.name)
+
+        changed = True
+        while changed:
+            changed = False
+            for step in steps:
+                if step.name in outdated:
+                    continue
+                if any(d in outdated for d in step.dependsOn) or \
+                        (any(step.name in s.dependsOn for s in steps
+                             if s.name in outdated) and
+                         self.__outputsChanged(step, state)):
+                    outdated.add(step.name)
+                    changed = True
+        return outdated
+
+    def __saveState(self, state):
+        with open(self.stateFile, 'wb') as outf:
+            json.dump(state, outf, indent=4)
+
+    def duplicate(self):
+        """Return a copy of this object."""
+        return deepcopy(self)
+
+    def ToString(self):
+        """Overwrite .NET ToString method."""
+        return self.__repr__()
+
+    def __repr__(self):
+        """Pipeline representation."""
+        return 'Pipeline::{}'.format('>'.join(s.name for s in self.steps))
@@ -0,0 +1,490 @@
+# coding=utf-8
+"""Write polyMesh for a single block blockMeshDict without running blockMesh.
+
+PolyMesh generates points, faces, owner, neighbour and boundary for the hex
+block in a butterfly BlockMeshDict. Points, cells, faces and patches follow the
+same ordering as OpenFOAM's blockMesh so the mesh can be used as the background
+mesh for snappyHexMesh.
+
+Usage:
+    mesh = PolyMesh.fromBlockMeshDict(case.blockMeshDict)
+    mesh.save(case.polyMeshFolder, fileFormat='binary')
+"""
+import os
+import sys
+from array import array
+from collections import namedtuple
+from copy import deepcopy
+
+from .version import Header
+
+# faces of hex block in the same order as OpenFOAM (x-min, x-max, y-min, y-max,
+# z-min, z-max) as indices of block vertices.
+BLOCKFACES = ((0, 4, 7, 3), (1, 2, 6, 5), (0, 1, 5, 4), (3, 7, 6, 2),
+              (0, 3, 2, 1), (4, 5, 6, 7))
+
+
+def lineDivide(grading, nDiv):
+    """Calculate normalized position of points along an edge of the block.
+
+    This function follows OpenFOAM's lineDivide for straight edges.
+
+    Args:
+        grading: A Grading or a MultiGrading.
+        nDiv: Number of divisions.
+    Returns:
+        A list of nDiv + 1 values between 0 and 1.
+    """
+    nDiv = int(nDiv)
+    assert nDiv > 0, 'Number of divisions should be larger than 0.'
+    if hasattr(grading, 'gradings'):
+        sections = [(g.percentageLength, g.percentageCells, g.expansionRatio)
+                    for g in grading.gradings]
+    else:
+        sections = [(1, 1, getattr(grading, 'expansionRatio', grading))]
+
+    totalLength = float(sum(s[0] for s in sections))
+    totalCells = float(sum(s[1] for s in sections))
+
+    divisions = [0.0]
+    secStart = 0.0
+    count = 0
+    for sectionCount, (length, cells, expRatio) in enumerate(sections):
+        blockFrac = length / totalLength
+        if sectionCount == len(sections) - 1:
+            secnDiv = nDiv - count
+        else:
+            secnDiv = int(cells / totalCells * nDiv + 0.5)
+
+        expRatio = float(expRatio or 1)
+        if expRatio == 1 or secnDiv < 2:
+            divisions.extend(secStart + blockFrac * (i + 1.0) / secnDiv
+                             for i in xrange(secnDiv))
+        else:
+            # geometric expansion factor from the expansion ratio
+            expFact = expRatio ** (1.0 / (secnDiv - 1))
+            divisions.extend(
+                secStart + blockFrac * (1.0 - expFact ** (i + 1)) /
+                (1.0 - expFact ** secnDiv) for i in xrange(secnDiv))
+
+        count += secnDiv
+        secStart = divisions[-1]
+
+    divisions[-1] = 1.0
+    return divisions
+
+
+class PolyMesh(object):
+    """OpenFOAM polyMesh for a single hex block.
+
+    Args:
+        vertices: 8 vertices of the block in blockMesh order.
+        nDivXYZ: Number of divisions in (x, y, z).
+        grading: A SimpleGrading (default: uniform).
+        patches: A list of (name, type, blockFaces) where blockFaces is a list of
+            indices between 0 and 5 for x-min, x-max, y-min, y-max, z-min and
+            z-max faces of the block. Block faces that are not assigned to any
+            patch will be added to defaultFaces patch.
+        convertToMeters: Scaling factor for the vertex coordinates (default: 1).
+        divisions: Optional normalized position of points along x, y and z
+            axis. Use this input for a structured grid of several blocks (e.g.
+            MultiBlockMeshDict). nDivXYZ and grading will be ignored.
+    """
+
+    def __init__(self, vertices, nDivXYZ, grading=None, patches=None,
+                 convertToMeters=1, divisions=None):
+        """Init polyMesh."""
+        assert len(vertices) == 8, \
+            'Length of vertices should be 8 not {}.'.format(len(vertices))
+        self.__vertices = tuple(tuple(float(c) * convertToMeters for c in v)
+                                for v in vertices)
+        self.__divisions = divisions
+        if divisions:
+            nDivXYZ = tuple(len(d) - 1 for d in divisions)
+        self.__nDivXYZ = tuple(int(n) for n in nDivXYZ)
+        assert min(self.__nDivXYZ) > 0, \
+            'Invalid number of divisions: {}'.format(self.__nDivXYZ)
+
+        v0, v1, v3, v4 = (self.__vertices[i] for i in (0, 1, 3, 4))
+        a, b, c = (tuple(p - o for p, o in zip(v, v0)) for v in (v1, v3, v4))
+        volume = a[0] * (b[1] * c[2] - b[2] * c[1]) - \
+            a[1] * (b[0] * c[2] - b[2] * c[0]) + \
+            a[2] * (b[0] * c[1] - b[1] * c[0])
+        if volume <= 0:
+            raise ValueError('Block is inside-out: {}'.format(self.__vertices))
+
+        self.__grading = grading
+        self.__patches = self.__checkPatches(patches or ())
+
+        self.__points = self.__calculatePoints()
+        self.__faces, self.__owner, self.__neighbour, self.__boundary = \
+            self.__calculateFaces()
+
+    @classmethod
+    def fromBlockMeshDict(cls, blockMeshDict):
+        """Create polyMesh from a butterfly BlockMeshDict.
+
+        For a MultiBlockMeshDict the blocks are written as a single structured
+        grid. Cells are ordered for the whole grid and not block by block as
+        in blockMesh.
+        """
+        order = blockMeshDict.verticesOrder
+        vertices = tuple(blockMeshDict.vertices[i] for i in order)
+        blockFaces = tuple(frozenset(order[i] for i in f) for f in BLOCKFACES)
+
+        patches = []
+        for name, attr in blockMeshDict.boundary.iteritems():
+            faces = attr['faces']
+            if faces and not hasattr(faces[0], '__iter__'):
+                faces = (faces,)
+            try:
+                indices = tuple(blockFaces.index(frozenset(f)) for f in faces)
+            except ValueError:
+                raise ValueError(
+                    'One of the faces in {} is not a face of the block.'.format(
+                        name))
+            patches.append((name, attr['type'], indices))
+
+        return cls(vertices, blockMeshDict.nDivXYZ, blockMeshDict.grading,
+                   patches, blockMeshDict.convertToMeters,
+                   getattr(blockMeshDict, 'divisions', None))
+
+    @property
+    def nDivXYZ(self):
+        """Number of divisions in (x, y, z)."""
+        return self.__nDivXYZ
+
+    @property
+    def nPoints(self):
+        """Number of points."""
+        return len(self.__points) // 3
+
+    @property
+    def nCells(self):
+        """Number of cells."""
+        x, y, z = self.nDivXYZ
+        return x * y * z
+
+    @property
+    def nFaces(self):
+        """Number of faces."""
+        return len(self.__owner)
+
+    @property
+    def nInternalFaces(self):
+        """Number of internal faces."""
+        return len(self.__neighbour)
+
+    @property
+    def points(self):
+        """Points as a tuple of (x, y, z)."""
+        p = self.__points
+        return tuple((p[i], p[i + 1], p[i + 2]) for i in xrange(0, len(p), 3))
+
+    @property
+    def faces(self):
+        """Faces as a tuple of 4 point indices."""
+        f = self.__faces
+        return tuple((f[i], f[i + 1], f[i + 2], f[i + 3])
+                     for i in xrange(0, len(f), 4))
+
+    @property
+    def owner(self):
+        """Owner cell for each face."""
+        return tuple(self.__owner)
+
+    @property
+    def neighbour(self):
+        """Neighbour cell for each internal face."""
+        return tuple(self.__neighbour)
+
+    @property
+    def boundary(self):
+        """Patches as a tuple of namedtuples (name, type, nFaces, startFace)."""
+        return self.__boundary
+
+    @staticmethod
+    def __checkPatches(patches):
+        used = {}
+        checked = []
+        for name, patchType, blockFaces in patches:
+            for f in blockFaces:
+                assert 0 <= f < 6, 'Invalid block face index: {}'.format(f)
+                if f in used:
+                    raise ValueError(
+                        'Block face {} is used in both {} and {}.'.format(
+                            f, used[f], name))
+                used[f] = name
+            checked.append((str(name), str(patchType), tuple(blockFaces)))
+
+        unused = tuple(f for f in xrange(6) if f not in used)
+        if unused:
+            checked.append(('defaultFaces', 'empty', unused))
+        return tuple(checked)
+
+    def __calculatePoints(self):
+        """Calculate points with x changing fastest, then y and z."""
+        nx, ny, nz = self.nDivXYZ
+        if self.__divisions:
+            lx, ly, lz = self.__divisions
+        elif self.__grading:
+            lx = lineDivide(self.__grading.xGrading, nx)
+            ly = lineDivide(self.__grading.yGrading, ny)
+            lz = lineDivide(self.__grading.zGrading, nz)
+        else:
+            lx, ly, lz = (lineDivide(1, n) for n in self.nDivXYZ)
+
+        v = self.__vertices
+
+        def bilinear(p0, p1, p2, p3, s, t):
+            # p0 at (0, 0), p1 at (1, 0), p2 at (1, 1) and p3 at (0, 1)
+            return tuple(
+                (1 - s) * (1 - t) * a + s * (1 - t) * b + s * t * c +
+                (1 - s) * t * d for a, b, c, d in zip(p0, p1, p2, p3))
+
+        points = array('d')
+        for tz in lz:
+            for ty in ly:
+                # points on x-min and x-max faces of the block
+                x0, y0, z0 = bilinear(v[0], v[3], v[7], v[4], ty, tz)
+                x1, y1, z1 = bilinear(v[1], v[2], v[6], v[5], ty, tz)
+                dx, dy, dz = x1 - x0, y1 - y0, z1 - z0
+                for tx in lx:
+                    points.extend((x0 + tx * dx, y0 + tx * dy, z0 + tx * dz))
+
+        return points
+
+    def __calculateFaces(self):
+        """Calculate faces, owner, neighbour and boundary patches.
+
+        Internal faces are sorted by owner and then by neighbour. Boundary faces
+        are grouped by patch in the order of patches.
+        """
+        nx, ny, nz = self.nDivXYZ
+        dy = nx + 1
+        dz = (nx + 1) * (ny + 1)
+        cy = nx
+        cz = nx * ny
+
+        faces = array('i')
+        owner = array('i')
+        neighbour = array('i')
+
+        # internal faces
+        for k in xrange(nz):
+            for j in xrange(ny):
+                base = j * dy + k * dz
+                cell = j * cy + k * cz
+                hasY = j < ny - 1
+                hasZ = k < nz - 1
+                for i in xrange(nx):
+                    a = base + i
+                    c = cell + i
+                    if i < nx - 1:
+                        faces.extend((a + 1, a + 1 + dy, a + 1 + dy + dz,
+                                      a + 1 + dz))
+                        owner.append(c)
+                        neighbour.append(c + 1)
+                    if hasY:
+                        faces.extend((a + dy, a + dy + dz, a + 1 + dy + dz,
+                                      a + 1 + dy))
+                        owner.append(c)
+                        neighbour.append(c + cy)
+                    if hasZ:
+                        faces.extend((a + dz, a + 1 + dz, a + 1 + dy + dz,
+                                      a + dy + dz))
+                        owner.append(c)
+                        neighbour.append(c + cz)
+
+        # boundary faces
+        p = namedtuple('Patch', 'name type nFaces startFace')
+        boundary = []
+        for name, patchType, blockFaces in self.__patches:
+            startFace = len(owner)
+            for f in blockFaces:
+                self.__blockFace(f, faces, owner)
+            boundary.append(p(name, patchType, len(owner) - startFace,
+                              startFace))
+
+        return faces, owner, neighbour, tuple(boundary)
+
+    def __blockFace(self, faceIndex, faces, owner):
+        """Add faces of one of the block faces in blockMesh order."""
+        nx, ny, nz = self.nDivXYZ
+        dy = nx + 1
+        dz = (nx + 1) * (ny + 1)
+
+        if faceIndex == 0:  # x-min
+            for k in xrange(nz):
+                for j in xrange(ny):
+                    a = j * dy + k * dz
+                    faces.extend((a, a + dz, a + dy + dz, a + dy))
+                    owner.append(nx * (j + ny * k))
+        elif faceIndex == 1:  # x-max
+            for k in xrange(nz):
+                for j in xrange(ny):
+                    a = nx + j * dy + k * dz
+                    faces.extend((a, a + dy, a + dy + dz, a + dz))
+                    owner.append(nx - 1 + nx * (j + ny * k))
+        elif faceIndex == 2:  # y-min
+            for i in xrange(nx):
+                for k in xrange(nz):
+                    a = i + k * dz
+                    faces.extend((a, a + 1, a + 1 + dz, a + dz))
+                    owner.append(i + nx * ny * k)
+        elif faceIndex == 3:  # y-max
+            for i in xrange(nx):
+                for k in xrange(nz):
+                    a = i + ny * dy + k * dz
+                    faces.extend((a, a + dz, a + 1 + dz, a + 1))
+                    owner.append(i + nx * (ny - 1 + ny * k))
+        elif faceIndex == 4:  # z-min
+            for i in xrange(nx):
+                for j in xrange(ny):
+                    a = i + j * dy
+                    faces.extend((a, a + dy, a + 1 + dy, a + 1))
+                    owner.append(i + nx * j)
+        else:  # z-max
+            for i in xrange(nx):
+                for j in xrange(ny):
+                    a = i + j * dy + nz * dz
+                    faces.extend((a, a + 1, a + 1 + dy, a + dy))
+                    owner.append(i + nx * (j + ny * (nz - 1)))
+
+    @staticmethod
+    def __header(cls, obj, fileFormat='ascii', note=None):
+        return Header.header() + \
+            'FoamFile\n{\n' \
+            '    version     2.0;\n' \
+            '    format      %s;\n' \
+            '%s' \
+            '    class       %s;\n' \
+            '%s' \
+            '    location    "constant/polyMesh";\n' \
+            '    object      %s;\n' \
+            '}\n' \
+            '// * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * * //' \
+            '\n\n' % (
+                fileFormat,
+                '    arch        "LSB;label=32;scalar=64";\n'
+                if fileFormat == 'binary' else '',
+                cls, '    note        "%s";\n' % note if note else '', obj)
+
+    @staticmethod
+    def __writeBinary(outf, values, size=1):
+        """Write an array as an OpenFOAM binary list.
+
+        size is the number of values for each item (e.g. 3 for vectors).
+        """
+        if sys.byteorder != 'little':
+            values = array(values.typecode, values)
+            values.byteswap()
+        outf.write('{}\n('.format(len(values) // size))
+        values.tofile(outf)
+        outf.write(')\n')
+
+    @staticmethod
+    def __writeAscii(outf, values, pattern='%s\n', size=1, chunkSize=10000):
+        """Write values as an OpenFOAM ascii list."""
+        outf.write('{}\n(\n'.format(len(values) // size))
+        step = size * chunkSize
+        for start in xrange(0, len(values), step):
+            chunk = values[start:start + step]
+            outf.write(pattern * (len(chunk) // size) % tuple(chunk))
+        outf.write(')\n')
+
+    def save(self, folder, fileFormat='ascii', precision=6):
+        """Write points, faces, owner, neighbour and boundary to folder.
+
+        Args:
+            folder: Full path to polyMesh folder.
+            fileFormat: ascii or binary (default: ascii). boundary is always
+                written in ascii.
+            precision: Number of significant digits for points in ascii format
+                (default: 6).
+        Returns:
+            A list of full path to files.
+        """
+        assert fileFormat in ('ascii', 'binary'), \
+            'fileFormat should be ascii or binary not {}.'.format(fileFormat)
+        if not os.path.isdir(folder):
+            os.makedirs(folder)
+
+        binary = fileFormat == 'binary'
+        note = 'nPoints:{}  nCells:{}  nFaces:{}  nInternalFaces:{}'.format(
+            self.nPoints, self.nCells, self.nFaces, self.nInternalFaces)
+        files = []
+
+        fp = os.path.join(folder, 'points')
+        with open(fp, 'wb') as outf:
+            outf.write(self.__header('vectorField', 'points', fileFormat))
+            if binary:
+                self.__writeBinary(outf, self.__points, 3)
+            else:
+                p = '%.{0}g'.format(int(precision))
+                self.__writeAscii(outf, self.__points,
+                                  '({0} {0} {0})\n'.format(p), 3)
+        files.append(fp)
+
+        fp = os.path.join(folder, 'faces')
+        with open(fp, 'wb') as outf:
+            if binary:
+                outf.write(self.__header('faceCompactList', 'faces', fileFormat))
+                # faceCompactList is written as offsets and point indices
+                offsets = array('i', xrange(0, len(self.__faces) + 1, 4))
+                self.__writeBinary(outf, offsets)
+                outf.write('\n')
+                self.__writeBinary(outf, self.__faces)
+            else:
+                outf.write(self.__header('faceList', 'faces', fileFormat))
+                self.__writeAscii(outf, self.__faces, '4(%d %d %d %d)\n', 4)
+        files.append(fp)
+
+        for name, values in (('owner', self.__owner),
+                             ('neighbour', self.__neighbour)):
+            fp = os.path.join(folder, name)
+            with open(fp, 'wb') as outf:
+                outf.write(self.__header('labelList', name, fileFormat, note))
+                if binary:
+                    self.__writeBinary(outf, values)
+                else:
+                    self.__writeAscii(outf, values, '%d\n')
+            files.append(fp)
+
+        fp = os.path.join(folder, 'boundary')
+        with open(fp, 'wb') as outf:
+            outf.write(self.__header('polyBoundaryMesh', 'boundary'))
+            outf.write(self.boundaryToOpenFOAM())
+        files.append(fp)
+
+        return files
+
+    def boundaryToOpenFOAM(self):
+        """Get content of boundary file as a string."""
+        patches = []
+        for patch in self.boundary:
+            group = '        inGroups        1({});\n'.format(patch.type) \
+                if patch.type != 'patch' else ''
+            patches.append(
+                '    {}\n    {{\n'
+                '        type            {};\n'
+                '{}'
+                '        nFaces          {};\n'
+                '        startFace       {};\n'
+                '    }}\n'.format(patch.name, patch.type, group, patch.nFaces,
+                                  patch.startFace))
+
+        return '{}\n(\n{})\n'.format(len(patches), ''.join(patches))
+
+    def duplicate(self):
+        """Return a copy of this object."""
+        return deepcopy(self)
+
+    def ToString(self):
+        """Overwrite .NET ToString method."""
+        return self.__repr__()
+
+    def __repr__(self):
+        """PolyMesh representation."""
+        return 'PolyMesh::{} points::{} cells::{} faces'.format(
+            self.nPoints, self.nCells, self.nFaces)
@@ -0,0 +1,251 @@
+# coding=utf-8
+"""Early stopping for steady runs based on probe values.
+
+ProbeMonitor follows the probe files of a running solution and checks the
+relative change of selected fields at selected probes over a sliding window.
+Probe values often stabilize long before residuals meet residualControl targets.
+
+Usage:
+    solution.probeMonitor = ProbeMonitor(case.probesFolder, fields=('U',),
+                                         window=50, tolerance=0.01,
+                                         startTime=100)
+    solution.run()
+"""
+from __future__ import division
+import os
+import math
+from collections import deque, namedtuple, OrderedDict
+from copy import deepcopy
+
+from .timeindex import TimeIndex, parseTime
+
+
+class ProbeMonitor(object):
+    """Monitor probe values of a running solution.
+
+    The change of a quantity over the window is (max - min) / |mean|. Vector
+    values (e.g. U) are converted to their magnitude. Probe values are stable
+    once the change for all the selected quantities is less than tolerance.
+
+    Args:
+        probesFolder: Full path to probes folder (e.g. case.probesFolder).
+        fields: A list of fields to be monitored (default: ('U',)).
+        probes: Optional list of probe indices to be monitored. By default all
+            the probes will be monitored.
+        window: Number of samples in the sliding window (default: 50).
+        tolerance: Maximum relative change over the window for a quantity to be
+            stable (default: 0.01).
+        startTime: Values are not stable before this time. Use it to skip the
+            first iterations of the solution (default: 0).
+        minValue: Minimum value for |mean| to avoid dividing by values close to
+            zero (default: 1e-6).
+        interval: Seconds between the checks when used by a Solution
+            (default: 5).
+    """
+
+    def __init__(self, probesFolder, fields=('U',), probes=None, window=50,
+                 tolerance=0.01, startTime=0, minValue=1e-6, interval=5):
+        """Init probe monitor."""
+        self.probesFolder = probesFolder
+        self.__fields = (fields,) if isinstance(fields, str) else tuple(fields)
+        assert self.__fields, 'At least one field should be monitored.'
+        self.__probes = tuple(int(p) for p in probes) if probes else None
+        self.window = window
+        self.tolerance = float(tolerance)
+        self.startTime = startTime
+        self.minValue = float(minValue)
+        self.interval = interval
+
+    @property
+    def fields(self):
+        """Monitored fields."""
+        return self.__fields
+
+    @property
+    def probes(self):
+        """Indices of monitored probes. None means all the probes."""
+        return self.__probes
+
+    @property
+    def window(self):
+        """Number of samples in the sliding window.
+
+        Changing the window resets the loaded values.
+        """
+        return self.__window
+
+    @window.setter
+    def window(self, w):
+        w = int(w or 50)
+        assert w > 1, 'Window should be larger than 1 not {}.'.format(w)
+        self.__window = w
+        self.reset()
+
+    @property
+    def latestTime(self):
+        """Latest time for the values in the window."""
+        times = [v[-1][0] for v in self.__values.itervalues() if v]
+        return min(times) if times else None
+
+    @property
+    def criteria(self):
+        """Stop criteria as a dictionary."""
+        return OrderedDict((
+            ('fields', self.fields),
+            ('probes', self.probes),
+            ('window', self.window),
+            ('tolerance', self.tolerance),
+            ('startTime', self.startTime)))
+
+    def reset(self, skipExisting=False):
+        """Remove loaded values. Values will be loaded again from the files.
+
+        Args:
+            skipExisting: Only load the lines that are added to the probe files
+                after reset. Use it when a solution starts so the values of the
+                previous runs are not loaded (default: False).
+        """
+        self.__offsets = {}
+        self.__values = OrderedDict((f, deque(maxlen=self.window))
+                                    for f in self.fields)
+        if not skipExisting or not os.path.isdir(self.probesFolder):
+            return
+
+        for folder in os.listdir(self.probesFolder):
+            for field in self.fields:
+                fp = os.path.join(self.probesFolder, folder, field)
+                if os.path.isfile(fp):
+                    self.__offsets[fp] = os.path.getsize(fp)
+
+    def update(self):
+        """Load new values from probe files.
+
+        Only the lines which are added since the last update are read. Values
+        are read from the latest probes folder which changes once the solution
+        is restarted from a later time.
+
+        Returns:
+            The number of new samples.
+        """
+        if not os.path.isdir(self.probesFolder):
+            return 0
+
+        folder = TimeIndex(self.probesFolder).latestName
+        if not folder:
+            return 0
+
+        count = 0
+        for field in self.fields:
+            fp = os.path.join(self.probesFolder, folder, field)
+            count += self.__readFile(fp, self.__values[field])
+        return count
+
+    def changes(self):
+        """Get relative change over the window for each field.
+
+        Returns:
+            A dictionary as {field: (change for each probe)}. Values are None for
+            fields with less samples than window.
+        """
+        changes = {}
+        for field, samples in self.__values.iteritems():
+            if len(samples) < self.window:
+                changes[field] = None
+                continue
+            columns = zip(*(s[1] for s in samples))
+            changes[field] = tuple(self.__change(c) for c in columns)
+        return changes
+
+    def check(self):
+        """Update the values and check if they are stable.
+
+        Returns:
+            A namedtuple as (isStable, timestep, maxChange, field, probe). field
+            and probe are the quantity with the maximum change.
+        """
+        s = namedtuple('ProbeStatus', 'isStable timestep maxChange field probe')
+        self.update()
+        t = self.latestTime
+        maxChange, field, probe = None, None, None
+        for f, changes in self.changes().iteritems():
+            if changes is None:
+                return s(False, t, None, f, None)
+            for count, c in enumerate(changes):
+                if maxChange is None or c > maxChange:
+                    maxChange, field = c, f
+                    probe = self.probes[count] if self.probes else count
+
+        if maxChange is None:
+            # no probes
+            return s(False, t, None, None, None)
+
+        isStable = maxChange <= self.tolerance and t >= self.startTime
+        return s(isStable, t, maxChange, field, probe)
+
+    def __readFile(self, fp, samples):
+        """Read new lines of a probe file to samples. Return number of lines."""
+        try:
+            f = open(fp, 'rb')
+        except IOError:
+            return 0
+
+        count = 0
+        with f:
+            offset = self.__offsets.get(fp, 0)
+            if os.fstat(f.fileno()).st_size < offset:
+                # the file is overwritten by a new run
+                offset = 0
+            f.seek(offset)
+            for line in iter(f.readline, ''):
+                if not line.endswith('\n'):
+                    # the line is not complete yet
+                    break
+                offset += len(line)
+                if line.startswith('#') or not line.strip():
+                    continue
+                try:
+                    sample = self.__parseLine(line)
+                except ValueError:
+                    continue
+                samples.append(sample)
+                count += 1
+            self.__offsets[fp] = offset
+        return count
+
+    def __parseLine(self, line):
+        """Parse a line to (time, values).
+
+        Vectors are written as (x y z) and are converted to magnitude.
+        """
+        try:
+            t, rest = line.split(None, 1)
+        except ValueError:
+            raise ValueError('Invalid line: {}'.format(line))
+        t = parseTime(t)
+        if '(' in rest:
+            values = tuple(
+                math.sqrt(sum(float(c) ** 2 for c in v.split()))
+                for v in rest.replace(')', '').split('(')[1:])
+        else:
+            values = tuple(float(v) for v in rest.split())
+
+        if self.probes:
+            values = tuple(values[i] for i in self.probes)
+        return t, values
+
+    def __change(self, values):
+        mean = sum(values) / len(values)
+        return (max(values) - min(values)) / max(abs(mean), self.minValue)
+
+    def duplicate(self):
+        """Return a copy of this object."""
+        return deepcopy(self)
+
+    def ToString(self):
+        """Overwrite .NET ToString method."""
+        return self.__repr__()
+
+    def __repr__(self):
+        """Probe monitor representation."""
+        return 'ProbeMonitor::{}::window {}::tolerance {}'.format(
+            ','.join(self.fields), self.window, self.tolerance)
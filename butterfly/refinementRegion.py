@@ -1,8 +1,10 @@
 # coding=utf-8
 """Butterfly refinement region."""
 from copy import deepcopy
+from math import ceil, log
 from .geometry import _BFMesh
 from .geometry import bfGeometryFromStlFile
+import vectormath
 
 
 class RefinementRegion(_BFMesh):
@@ -159,3 +161,122 @@ def refinementRegionsFromStlFile(filepath, refinementMode):
     return tuple(RefinementRegion(geo.name, geo.vertices, geo.faceIndices,
                                   geo.normals, refinementMode)
                  for geo in geos)
+
+
+def wakeRefinementRegions(geometries, windVector, baseCellSize, targetCellSize,
+                          upstream=1, downstream=3, lateral=0.5, vertical=0.5,
+                          footprint=False, mode='inside', nCellsBetweenLevels=3):
+    """Create wake refinement regions for geometries aligned with the wind.
+
+    A region is created for each geometry. Distances are multiplied by the
+    height of the geometry. The refinement level is the smallest level that
+    reaches targetCellSize from baseCellSize.
+
+    Args:
+        geometries: A list of butterfly geometries.
+        windVector: Wind vector as (x, y, z). z value is ignored.
+        baseCellSize: Cell size in blockMesh.
+        targetCellSize: Cell size inside the wake regions.
+        upstream: Distance before the geometry (default: 1).
+        downstream: Distance behind the geometry (default: 3).
+        lateral: Distance on the sides of the geometry (default: 0.5).
+        vertical: Distance above the geometry (default: 0.5).
+        footprint: Set to True to extrude the footprint of the geometry along
+            the wind instead of using a box aligned with the wind
+            (default: False).
+        mode: Refinement mode as inside or distance (default: inside). distance
+            refines a band around the region with one level less every
+            nCellsBetweenLevels cells.
+        nCellsBetweenLevels: Number of cells between levels for distance mode
+            (default: 3).
+    Returns:
+        A tuple of RefinementRegions.
+    """
+    assert mode in ('inside', 'distance'), \
+        'mode should be inside or distance not {}.'.format(mode)
+    level = max(0, int(ceil(log(float(baseCellSize) / targetCellSize, 2) - 1e-9)))
+
+    if mode == 'inside':
+        refinementMode = Inside(level)
+    else:
+        levels = []
+        distance = 0
+        for l in range(level, 0, -1):
+            distance += nCellsBetweenLevels * float(baseCellSize) / 2 ** l
+            levels.append((distance, l))
+        refinementMode = Distance(levels or ((0, 0),))
+
+    windVector = (windVector[0], windVector[1], 0)
+    yAxis = vectormath.normalize(windVector)
+    xAxis = vectormath.normalize(vectormath.crossProduct(windVector, (0, 0, 1)))
+
+    regions = []
+    for geo in geometries:
+        height = geo.max[2] - geo.min[2]
+        # vertices in wind coordinates
+        pts = tuple((vectormath.dotProduct(v, xAxis),
+                     vectormath.dotProduct(v, yAxis)) for v in geo.vertices)
+        l, u, d = lateral * height, upstream * height, downstream * height
+        if footprint:
+            moved = tuple((p[0] + dx, p[1] + dy) for p in pts
+                          for dx, dy in ((-l, 0), (l, 0), (0, -u), (0, d)))
+            outline = _convexHull(moved)
+        else:
+            minX, maxX = min(p[0] for p in pts), max(p[0] for p in pts)
+            minY, maxY = min(p[1] for p in pts), max(p[1] for p in pts)
+            outline = ((minX - l, minY - u), (maxX + l, minY - u),
+                       (maxX + l, maxY + d), (minX - l, maxY + d))
+
+        outline = tuple((x * xAxis[0] + y * yAxis[0], x * xAxis[1] + y * yAxis[1])
+                        for x, y in outline)
+        vertices, faceIndices = _extrude(
+            outline, geo.min[2], geo.max[2] + vertical * height)
+        regions.append(RefinementRegion('wake_{}'.format(geo.name), vertices,
+                                        faceIndices, None,
+                                        refinementMode.duplicate()))
+
+    return tuple(regions)
+
+
+def _convexHull(points):
+    """Counter-clockwise convex hull of 2d points."""
+    pts = sorted(set(points))
+    if len(pts) < 3:
+        return pts
+
+    def cross(o, a, b):
+        return (a[0] - o[0]) * (b[1] - o[1]) - (a[1] - o[1]) * (b[0] - o[0])
+
+    lower = []
+    for p in pts:
+        while len(lower) > 1 and cross(lower[-2], lower[-1], p) <= 0:
+            lower.pop()
+        lower.append(p)
+
+    upper = []
+    for p in reversed(pts):
+        while len(upper) > 1 and cross(upper[-2], upper[-1], p) <= 0:
+            upper.pop()
+        upper.append(p)
+
+    return lower[:-1] + upper[:-1]
+
+
+def _extrude(outline, zMin, zMax):
+    """Extrude a counter-clockwise outline to a closed mesh.
+
+    Returns:
+        (vertices, faceIndices) with faces pointing outward.
+    """
+    n = len(outline)
+    vertices = tuple((x, y, zMin) for x, y in outline) + \
+        tuple((x, y, zMax) for x, y in outline)
+
+    faces = [(0, i + 1, i) for i in range(1, n - 1)]
+    faces.extend((n, n + i, n + i + 1) for i in range(1, n - 1))
+    for i in range(n):
+        j = (i + 1) % n
+        faces.append((i, j, n + j))
+        faces.append((i, n + j, n + i))
+
+    return vertices, tuple(faces)
@@ -2,12 +2,14 @@
 """Runmanager for butterfly.
 
 Run manager is only useful for running OpenFOAM for Windows which runs in a
-docker container. For linux systems simply use .bash files or libraries such as
-pyFOAM.
+docker container. For systems with a native OpenFOAM installation use
+LocalRunManager from localrunmanager.
 """
 import os
+import time
 import ctypes
-from subprocess import PIPE, Popen
+import threading
+from subprocess import PIPE, STDOUT, Popen
 from collections import namedtuple
 from copy import deepcopy
 
@@ -19,18 +21,143 @@ class UserNotAdminError(Exception):
     pass
 
 
+class DockerSession(object):
+    """A long-lived shell in OpenFOAM's docker container.
+
+    Commands are sent to the same shell one after another which removes the
+    overhead of starting a new docker exec for each command.
+
+    Args:
+        containerId: OpenFOAM's container id.
+        env: Environment variables to connect to docker.
+        user: Username in container (default: ofuser).
+    """
+
+    SENTINEL = '__BF_DONE__'
+
+    def __init__(self, containerId, env=None, user='ofuser'):
+        """Start a shell in container."""
+        self.__containerId = containerId
+        self.__lock = threading.Lock()
+        self.__process = Popen(
+            'docker exec -i {} su - {}'.format(containerId, user), shell=True,
+            stdin=PIPE, stdout=PIPE, stderr=STDOUT, env=env)
+
+    @property
+    def containerId(self):
+        """Container id for this session."""
+        return self.__containerId
+
+    @property
+    def isAlive(self):
+        """Check if the shell is still running."""
+        return self.__process.poll() is None
+
+    @property
+    def isBusy(self):
+        """Check if the shell is executing a script."""
+        return self.__lock.locked()
+
+    def execute(self, script, blocking=True):
+        """Execute a bash script in the shell and wait for it to finish.
+
+        Outputs of the script will be discarded. Redirect them to log files if
+        needed. The script runs in a new bash with no standard input so the
+        commands (e.g. mpirun) can't read the lines that are sent to the shell.
+
+        Args:
+            script: A bash script.
+            blocking: Set to False to return immediately if the shell is busy
+                with another script (default: True).
+        Returns:
+            Exit code of the script or None if blocking is False and the shell
+            is busy.
+        """
+        script = "bash -c '{}' < /dev/null".format(
+            script.replace("'", "'\\''"))
+        if not self.__lock.acquire(blocking):
+            return None
+        try:
+            assert self.isAlive, 'Docker session is closed.'
+            self.__process.stdin.write(
+                '{}\necho {} $?\n'.format(script, self.SENTINEL))
+            self.__process.stdin.flush()
+
+            for line in iter(self.__process.stdout.readline, ''):
+                if line.startswith(self.SENTINEL):
+                    try:
+                        return int(line.split()[-1])
+                    except ValueError:
+                        return 1
+
+            # shell is closed before finishing the command
+            return self.__process.wait() or 1
+        finally:
+            self.__lock.release()
+
+    def close(self):
+        """Close the shell."""
+        if not self.isAlive:
+            return
+        try:
+            self.__process.stdin.write('exit\n')
+            self.__process.stdin.flush()
+        except IOError:
+            self.__process.terminate()
+
+    def ToString(self):
+        """Overwrite .NET ToString method."""
+        return self.__repr__()
+
+    def __repr__(self):
+        """Docker session representation."""
+        return 'DockerSession::{}::{}'.format(
+            self.containerId, 'alive' if self.isAlive else 'closed')
+
+
+class CompletedProcess(object):
+    """A finished command with the same interface as Popen for reporting.
+
+    Args:
+        returncode: Exit code of the command.
+    """
+
+    def __init__(self, returncode):
+        """Init completed process."""
+        self.returncode = returncode
+
+    def poll(self):
+        """Return returncode."""
+        return self.returncode
+
+    def wait(self):
+        """Return returncode."""
+        return self.returncode
+
+    def communicate(self):
+        """Return (None, None) as outputs are written to log files."""
+        return None, None
+
+
 class RunManager(object):
     """
     RunManager to write and run OpenFOAM commands through batch files.
 
     Run manager is currently only useful for running OpenFOAM for Windows which
-    runs in a docker container. For linux systems simply use .bash files or
-    libraries such as pyFOAM.
+    runs in a docker container. For linux systems use LocalRunManager.
 
+    Docker environment, container id and the shell session in container are
+    shared between all the instances and will be reused for CACHETTL seconds.
+    Cached values will be validated after CACHETTL and will be updated only if
+    they are not valid anymore.
     """
 
-    shellinit = None
-    __containerId = None
+    # time to live for cached values in seconds
+    CACHETTL = 300
+
+    # {key: (value, time)} shared between all the instances
+    __registry = {}
+    __registryLock = threading.RLock()
 
     def __init__(self, projectName):
         u"""Init run manager for project.
@@ -60,13 +187,96 @@ class RunManager(object):
         self.logFolder = './log'
         self.errFolder = './log'
 
+        # record bytes written to the case folder in runReport. The whole case
+        # folder is walked before and after each command.
+        self.measureBytesWritten = False
+
+    @classmethod
+    def clearCache(cls):
+        """Clear cached docker environment, container id and close the session."""
+        with cls.__registryLock:
+            session = cls.__registry.get('session', (None,))[0]
+            if session:
+                session.close()
+            cls.__registry.clear()
+
+    def __cached(self, key, getter, isValid=None):
+        """Get a value from registry or update the value using getter."""
+        with self.__registryLock:
+            value, t = self.__registry.get(key, (None, 0))
+            now = time.time()
+            if value is not None:
+                if now - t < self.CACHETTL:
+                    return value
+                elif isValid and isValid(value):
+                    self.__registry[key] = (value, now)
+                    return value
+
+            value = getter()
+            if value is not None:
+                self.__registry[key] = (value, now)
+            else:
+                self.__registry.pop(key, None)
+            return value
+
+    @property
+    def shellinit(self):
+        """Shellinit lines to set up the environment for docker.
+
+        Shellinit will be updated if butterfly fails to find the container.
+        """
+        return self.__cached('shellinit', self.getShellinit, lambda v: True)
+
+    @shellinit.setter
+    def shellinit(self, lines):
+        with self.__registryLock:
+            self.__registry['shellinit'] = (tuple(lines), time.time())
+
+    @property
+    def environment(self):
+        """Environment variables to connect to docker as a dictionary."""
+        env = dict(os.environ)
+        for line in self.shellinit or ():
+            # set DOCKER_HOST=tcp://192.168.99.100:2376
+            if not line.lower().startswith('set ') or '=' not in line:
+                continue
+            key, value = line[4:].split('=', 1)
+            env[key.strip()] = value.strip()
+        return env
+
     @property
     def containerId(self):
         """Container ID."""
-        if not self.__containerId:
-            self.getContainerId()
+        return self.__cached('containerId', self.getContainerId,
+                             self.isContainerRunning)
 
-        return self.__containerId
+    @property
+    def session(self):
+        """A long-lived shell in OpenFOAM's container."""
+        containerId = self.containerId
+        if not containerId:
+            return
+
+        def isValid(s):
+            return s.isAlive and s.containerId == containerId
+
+        with self.__registryLock:
+            session = self.__registry.get('session', (None,))[0]
+            if session and not isValid(session):
+                # container has changed or session is closed
+                session.close()
+                self.__registry.pop('session')
+
+            return self.__cached(
+                'session', lambda: DockerSession(containerId, self.environment),
+                isValid)
+
+    def isContainerRunning(self, containerId):
+        """Check if a container is running."""
+        p = Popen('docker inspect -f {{.State.Running}} %s' % containerId,
+                  shell=True, stdout=PIPE, stderr=PIPE, env=self.environment)
+        out, err = p.communicate()
+        return out.strip() == 'true'
 
     def getShellinit(self):
         """Get shellinit for setting up initial environment for docker."""
@@ -101,38 +311,59 @@ class RunManager(object):
     def getContainerId(self):
         """Get OpenFOAM's container id."""
         _id = None
-        if not self.shellinit:
-            self.shellinit = self.getShellinit()
-
-        cmds = '&'.join(self.shellinit + ('docker ps',))
-
-        p = Popen(cmds, shell=True, stdout=PIPE, stderr=PIPE)
-
-        if tuple(p.stderr):
-            for line in p.stderr:
-                print line
+        p = Popen('docker ps', shell=True, stdout=PIPE, stderr=PIPE,
+                  env=self.environment)
+        out, err = p.communicate()
+
+        if err.strip():
+            print err
+            # environment might have changed. update it next time.
+            with self.__registryLock:
+                self.__registry.pop('shellinit', None)
             return
 
-        for count, line in enumerate(p.stdout):
+        for line in out.split('\n'):
             if line.find('of_plus') > -1:
                 # find container
                 _id = line.split()[0]
                 print 'container id: {}'.format(_id)
 
-        self.__containerId = _id
+        return _id
 
-    def terminate(self):
-        """Kill all process under username ofuser."""
-        # This code failed but should return pid for the container
-        # docker inspect --format="{{ .State.Pid }}" e7a36e8e9eeb'
-        # for now I kill all process in docker.
-        # docker exec -i e7a36e8e9eeb killall -u ofuser
+    def terminate(self, force=False, pidfiles=None):
+        """Terminate the commands of this project.
+
+        Each command is started in a new session in the container and the
+        process id of the session is written to log/<command>.pid. The signal
+        is only sent to these process groups so the commands of the other
+        projects in the container are not affected. Use pidfiles to only
+        terminate some of the commands of this project.
+
+        Args:
+            force: Send SIGKILL instead of SIGTERM (default: False).
+            pidfiles: Optional list of pid files for the commands to be
+                terminated (e.g. pidfiles from run). By default all the
+                commands of this project will be terminated.
+        """
         if not self.containerId:
-            self.getContainerId()
-        killer = 'docker exec -i {} killall -u ofuser'.format(self.containerId)
+            return
+        pidfiles = ' '.join(pidfiles) if pidfiles \
+            else '{}/*.pid'.format(self.logFolder)
+        script = 'cd {0}; for f in {1}; do test -s $f && ' \
+            'kill -{2} -- -$(cat $f); done'.format(
+                self.__containerProjectDir, pidfiles,
+                'KILL' if force else 'TERM')
+        killer = 'docker exec -i {} su - ofuser -c "{}"'.format(
+            self.containerId, script)
+        Popen(killer, shell=True, env=self.environment).wait()
+
+    def pidFile(self, cmd):
+        """Relative path to the file for process id of a command."""
+        return '{}/{}.pid'.format(self.logFolder, cmd)
 
-        cmds = '&'.join(self.shellinit + (killer,))
-        p = Popen(cmds, shell=True)
+    @property
+    def __containerProjectDir(self):
+        return '/home/ofuser/workingDir/butterfly/{}'.format(self.__projectName)
 
     @property
     def __ofBatchFile(self):
@@ -148,9 +379,6 @@ class RunManager(object):
 
     def header(self):
         """Get header for batch files."""
-        if not self.shellinit:
-            self.shellinit = self.getShellinit()
-
         _base = '@echo off{0}' \
                 'cd {1}{0}' \
                 'echo Setting up the environment to connect to docker...{0}' \
@@ -161,10 +389,11 @@ class RunManager(object):
                 'echo .'
 
         return _base.format(self.__separator, self.dockerPath,
-                            self.__separator.join(self.shellinit))
+                            self.__separator.join(self.shellinit or ()))
 
     # TODO: Update controlDict.application for multiple commands
-    def command(self, cmd, args=None, decomposeParDict=None, includeHeader=True):
+    def command(self, cmd, args=None, decomposeParDict=None, includeHeader=True,
+                decompose=True, reconstruct=True):
         """
         Get command line for an OpenFOAM command in parallel or serial.
 
@@ -174,15 +403,21 @@ class RunManager(object):
             decomposeParDict: decomposeParDict for parallel runs (default: None).
             includeHeader: Include header lines to set up the environment
                 (default: True).
-            tee: Include tee in command line.
+            decompose: Run decomposePar before a parallel command. Use a list
+                of arguments (e.g. ('fields',)) to run decomposePar with
+                arguments or False to use current processor folders
+                (default: True).
+            reconstruct: Reconstruct the case and remove processor folders
+                after a parallel command (default: True).
         Returns:
-            (cmd, logfiles, errorfiles)
+            (cmd, logfiles, errorfiles, pidfiles)
         """
         if isinstance(cmd, str):
-            return self.__command(cmd, args, decomposeParDict, includeHeader)
+            return self.__command(cmd, args, decomposeParDict, includeHeader,
+                                  decompose, reconstruct)
         elif isinstance(cmd, (list, tuple)):
             # a list of commands
-            res = namedtuple('log', 'cmd logfiles errorfiles')
+            res = namedtuple('log', 'cmd logfiles errorfiles pidfiles')
             logs = range(len(cmd))  # create a place holder for commands
             for count, c in enumerate(cmd):
                 if count > 0:
@@ -195,15 +430,21 @@ class RunManager(object):
                     arg = args
 
                 logs[count] = self.__command(c, None, decomposeParDict,
-                                             includeHeader)
+                                             includeHeader, decompose,
+                                             reconstruct)
+                if decomposeParDict and not reconstruct:
+                    # processor folders are kept for the next commands
+                    decompose = False
 
             command = '&'.join(log.cmd for log in logs)
             logfiles = tuple(ff for log in logs for ff in log.logfiles)
             errorfiles = tuple(ff for log in logs for ff in log.errorfiles)
+            pidfiles = tuple(ff for log in logs for ff in log.pidfiles)
 
-            return res(command, logfiles, errorfiles)
+            return res(command, logfiles, errorfiles, pidfiles)
 
-    def __command(self, cmd, args=None, decomposeParDict=None, includeHeader=True):
+    def __command(self, cmd, args=None, decomposeParDict=None, includeHeader=True,
+                  decompose=True, reconstruct=True):
         """
         Get command line for an OpenFOAM command in parallel or serial.
 
@@ -213,28 +454,56 @@ class RunManager(object):
             decomposeParDict: decomposeParDict for parallel runs (default: None).
             includeHeader: Include header lines to set up the environment
                 (default: True).
-            tee: Include tee in command line.
+            decompose: See command.
+            reconstruct: See command.
         Returns:
-            (cmd, logfiles, errorfiles)
+            (cmd, logfiles, errorfiles, pidfiles)
         """
-        tee = 'tee'
-        res = namedtuple('log', 'cmd logfiles errorfiles')
+        res = namedtuple('log', 'cmd logfiles errorfiles pidfiles')
         _msg = 'Failed to find container id.' \
             'Do you have the OpenFOAM container running?\n' \
             'You can initiate OpenFOAM container by running start_OF.bat:\n{}' \
             .format(self.__ofBatchFile)
 
         # try to get containerId
-        if not self.containerId:
-            self.getContainerId()
-
-        assert self.containerId, _msg
+        containerId = self.containerId
+        assert containerId, _msg
 
         # containerId is found. put the commands together
-        _base = 'start /wait docker exec -i {} su - ofuser -c ' \
-            '"cd /home/ofuser/workingDir/butterfly/{}; {}"'
-        _baseCmd = '{0} {1} > >(%s %s/{2}.log) 2> >(%s %s/{2}.err >&2)' \
-            % (tee, self.logFolder, tee, self.errFolder)
+        _base = 'start /wait docker exec -i {} su - ofuser -c "{}"'
+        script, logfiles, errfiles, pidfiles = self.__script(
+            cmd, args, decomposeParDict, decompose=decompose,
+            reconstruct=reconstruct)
+        cmds = _base.format(containerId, script)
+
+        if includeHeader:
+            return res(self.header() + self.__separator + cmds, logfiles,
+                       errfiles, pidfiles)
+        else:
+            return res(cmds, logfiles, errfiles, pidfiles)
+
+    def __script(self, cmd, args=None, decomposeParDict=None, tee=True,
+                 decompose=True, reconstruct=True):
+        """Get bash script to run an OpenFOAM command in container.
+
+        Args:
+            cmd: An OpenFOAM command.
+            args: List of optional arguments for command. e.g. ('c', 'latestTime')
+            decomposeParDict: decomposeParDict for parallel runs (default: None).
+            tee: Use tee to write the outputs to log files and standard output.
+                Set to False to only write the outputs to log files.
+            decompose: See command.
+            reconstruct: See command.
+        Returns:
+            (script, logfiles, errorfiles, pidfiles)
+        """
+        res = namedtuple('log', 'script logfiles errorfiles pidfiles')
+        if tee:
+            _baseCmd = '{0} {1} > >(tee %s/{2}.log) 2> >(tee %s/{2}.err >&2)' \
+                % (self.logFolder, self.errFolder)
+        else:
+            _baseCmd = '{0} {1} > %s/{2}.log 2> %s/{2}.err' \
+                % (self.logFolder, self.errFolder)
 
         # join arguments for the command
         arguments = '' if not args else '-{}'.format(' -'.join(args))
@@ -255,12 +524,19 @@ class RunManager(object):
                 argList = ('', arguments, '', '-r proc*')
                 cmdNameList = ('decomposePar', cmd, 'reconstructPar', 'rm')
 
-            # join commands together
-            cmds = (_baseCmd.format(c, arg, name) for c, arg, name in
-                    zip(cmdList, argList, cmdNameList))
+            if isinstance(decompose, (list, tuple)):
+                argList = ('-{}'.format(' -'.join(decompose)),) + argList[1:]
 
-            cmds = _base.format(self.containerId, self.__projectName,
-                                '; '.join(cmds))
+            # keep processor folders
+            start = 0 if decompose else 1
+            end = 4 if reconstruct else 2
+            cmdList, argList, cmdNameList = cmdList[start:end], \
+                argList[start:end], cmdNameList[start:end]
+
+            # join commands together. Stop at the first failed command so the
+            # exit code of the script is the exit code of the failed command.
+            cmds = ' && '.join(_baseCmd.format(c, arg, name) for c, arg, name in
+                             zip(cmdList, argList, cmdNameList))
 
             errfiles = tuple('{}/{}.err'.format(self.errFolder, name)
                              for name in cmdNameList)
@@ -268,32 +544,69 @@ class RunManager(object):
                              for name in cmdNameList)
         else:
             # run is serial
-            cmds = _base.format(self.containerId, self.__projectName,
-                                _baseCmd.format(cmd, arguments, cmd))
+            cmds = _baseCmd.format(cmd, arguments, cmd)
             errfiles = ('{}/{}.err'.format(self.errFolder, cmd),)
             logfiles = ('{}/{}.log'.format(self.logFolder, cmd),)
 
-        if includeHeader:
-            return res(self.header() + self.__separator + cmds, logfiles, errfiles)
-        else:
-            return res(cmds, logfiles, errfiles)
+        # run the commands in a new session so they can be terminated as a
+        # process group without affecting the other projects in the container.
+        pidfile = self.pidFile(cmd)
+        cmds = 'echo $$ > {} && {}'.format(pidfile, cmds) \
+            .replace("'", "'\\''")
+        script = "cd {} && setsid -w bash -c '{}'".format(
+            self.__containerProjectDir, cmds)
+
+        return res(script, logfiles, errfiles, (pidfile,))
+
+    def run(self, command, args=None, decomposeParDict=None, wait=True,
+            decompose=True, reconstruct=True):
+        """Run OpenFOAM command.
+
+        If wait is True the command will be executed in the shared docker
+        session. Otherwise or if the session is busy with another command (e.g.
+        a long solve in another thread) a new docker exec will be started for
+        the command. See command for decompose and reconstruct.
+        """
+        log = namedtuple('log', 'process logfiles errorfiles pidfiles')
+
+        if wait and self.session:
+            if isinstance(command, str):
+                command = (command,)
+                args = (args,)
+
+            scripts = []
+            _decompose = decompose
+            for count, c in enumerate(command):
+                try:
+                    arg = args[count]
+                except (IndexError, TypeError):
+                    arg = None
+                dpd = None if c == 'blockMesh' else decomposeParDict
+                scripts.append(self.__script(c, arg, dpd, False, _decompose,
+                                             reconstruct))
+                if dpd and not reconstruct:
+                    # processor folders are kept for the next commands
+                    _decompose = False
+
+            code = self.session.execute(' && '.join(s.script for s in scripts),
+                                        blocking=False)
+            if code is not None:
+                return log(CompletedProcess(code),
+                           tuple(f for s in scripts for f in s.logfiles),
+                           tuple(f for s in scripts for f in s.errorfiles),
+                           tuple(f for s in scripts for f in s.pidfiles))
 
-    def run(self, command, args=None, decomposeParDict=None, wait=True):
-        """Run OpenFOAM command."""
         # get the command as a single line
-        cmd, logfiles, errfiles = self.command(command, args, decomposeParDict)
+        cmd, logfiles, errfiles, pidfiles = self.command(
+            command, args, decomposeParDict, False, decompose, reconstruct)
 
         # run the command.
         # shell should be True to run multiple commands at the same time.
-        log = namedtuple('log', 'process logfiles errorfiles')
-        p = Popen(cmd, shell=True)
+        p = Popen(cmd, shell=True, env=self.environment)
         if wait:
             p.communicate()
-            # once over kill all processes. This is effective if the user has
-            # canceled the run, otherwise there is no process to kill.
-            self.terminate()
 
-        return log(p, logfiles, errfiles)
+        return log(p, logfiles, errfiles, pidfiles)
 
     def checkFileContents(self, files, mute=False):
         """Check files for content and print them out if any.
@@ -0,0 +1,219 @@
+# coding=utf-8
+"""Run report for a case.
+
+RunReport keeps a structured record of the commands that are executed for a
+case in log/runReport.json. Each command is recorded with wall time, CPU time,
+peak memory, exit code, bytes written to the case folder (if measureBytesWritten
+is set on the run manager) and ExecutionTime and ClockTime from OpenFOAM's log.
+Other parts of butterfly (e.g. early stopping) add their own sections to the
+same file.
+
+Usage:
+    report = RunReport(case.projectDir)
+    print report.summary()
+    # aggregate the commands of a batch of cases
+    print RunReport.aggregate(cases)
+"""
+import os
+import re
+import json
+import threading
+from collections import namedtuple, OrderedDict
+from copy import deepcopy
+
+from .utilities import tail
+
+# keys for each command in the report
+COMMANDKEYS = ('name', 'command', 'start', 'wallTime', 'cpuTime', 'maxRss',
+               'exitCode', 'bytesWritten', 'executionTime', 'clockTime')
+
+CommandRecord = namedtuple('CommandRecord', COMMANDKEYS)
+
+Summary = namedtuple('Summary', 'count failed wallTime cpuTime maxRss '
+                     'bytesWritten executionTime clockTime')
+
+
+def commandRecord(name, command, start, wallTime, cpuTime=None, maxRss=None,
+                  exitCode=None, bytesWritten=None, logfile=None):
+    """Create a CommandRecord.
+
+    ExecutionTime and ClockTime are parsed from the end of the log file if
+    logfile is provided.
+    """
+    executionTime, clockTime = parseExecutionTime(logfile) if logfile \
+        else (None, None)
+    return CommandRecord(name, command, start, wallTime, cpuTime, maxRss,
+                         exitCode, bytesWritten, executionTime, clockTime)
+
+
+def parseExecutionTime(logfile):
+    """Get the last ExecutionTime and ClockTime in seconds from a log file.
+
+    Returns:
+        (executionTime, clockTime). Values are None if they are not found.
+    """
+    pattern = re.compile(
+        r'ExecutionTime\s*=\s*([-+\d.eE]+)\s*s\s+ClockTime\s*=\s*([-+\d.eE]+)')
+    try:
+        lines = tail(logfile, 50).split('\n')
+    except IOError:
+        return None, None
+
+    for line in reversed(lines):
+        match = pattern.search(line)
+        if match:
+            try:
+                return float(match.group(1)), float(match.group(2))
+            except ValueError:
+                break
+    return None, None
+
+
+class RunReport(object):
+    """Run report for a case folder saved to log/runReport.json.
+
+    Args:
+        projectDir: Full path to case folder.
+    """
+
+    FILENAME = 'runReport.json'
+
+    # one lock for all the reports. Commands and solution monitors can update
+    # the same report from different threads.
+    __lock = threading.RLock()
+
+    def __init__(self, projectDir):
+        """Init run report."""
+        self.projectDir = projectDir
+
+    @classmethod
+    def fromCase(cls, case):
+        """Create the run report for a butterfly case."""
+        return cls(case.projectDir)
+
+    @property
+    def projectDir(self):
+        """Full path to case folder."""
+        return self.__projectDir
+
+    @projectDir.setter
+    def projectDir(self, p):
+        self.__projectDir = os.path.normpath(p)
+
+    @property
+    def reportFile(self):
+        """Full path to report file."""
+        return os.path.join(self.projectDir, 'log', self.FILENAME)
+
+    @property
+    def data(self):
+        """Content of the report as an OrderedDict."""
+        try:
+            with open(self.reportFile, 'rb') as inf:
+                return json.load(inf, object_pairs_hook=OrderedDict)
+        except (IOError, ValueError):
+            return OrderedDict()
+
+    @property
+    def commands(self):
+        """Recorded commands as a tuple of CommandRecords."""
+        return tuple(
+            CommandRecord(*(c.get(k) for k in COMMANDKEYS))
+            for c in self.data.get('commands', ()))
+
+    def addCommand(self, record):
+        """Add a CommandRecord to the report."""
+        with self.__lock:
+            data = self.data
+            data.setdefault('commands', []).append(
+                OrderedDict(zip(COMMANDKEYS, record)))
+            self.__write(data)
+
+    def update(self, key, value):
+        """Set a section of the report (e.g. earlyStop)."""
+        with self.__lock:
+            data = self.data
+            data[key] = value
+            self.__write(data)
+
+    def clear(self):
+        """Remove the report."""
+        with self.__lock:
+            if os.path.isfile(self.reportFile):
+                os.remove(self.reportFile)
+
+    def summary(self):
+        """Summary of commands by name.
+
+        Returns:
+            An OrderedDict as {name: Summary}. Times and bytes are summed and
+            maxRss is the maximum of the commands.
+        """
+        return self.__summarize(self.commands)
+
+    @classmethod
+    def aggregate(cls, cases):
+        """Summary of commands by name for a batch of cases.
+
+        Args:
+            cases: A list of butterfly cases, RunReports or case folders.
+        Returns:
+            An OrderedDict as {name: Summary}. See summary.
+        """
+        records = []
+        for case in cases:
+            if isinstance(case, RunReport):
+                report = case
+            elif hasattr(case, 'projectDir'):
+                report = cls(case.projectDir)
+            else:
+                report = cls(case)
+            records.extend(report.commands)
+        return cls.__summarize(records)
+
+    @staticmethod
+    def __summarize(records):
+        def total(values):
+            values = [v for v in values if v is not None]
+            return sum(values) if values else None
+
+        summary = OrderedDict()
+        names = OrderedDict()
+        for r in records:
+            names.setdefault(r.name, []).append(r)
+
+        for name, rs in names.iteritems():
+            maxRss = [r.maxRss for r in rs if r.maxRss is not None]
+            summary[name] = Summary(
+                len(rs), sum(1 for r in rs if r.exitCode),
+                total(r.wallTime for r in rs), total(r.cpuTime for r in rs),
+                max(maxRss) if maxRss else None,
+                total(r.bytesWritten for r in rs),
+                total(r.executionTime for r in rs),
+                total(r.clockTime for r in rs))
+        return summary
+
+    def __write(self, data):
+        logFolder = os.path.dirname(self.reportFile)
+        if not os.path.isdir(logFolder):
+            os.makedirs(logFolder)
+        # write to a temporary file first so readers never see a partial file
+        temp = self.reportFile + '.tmp'
+        with open(temp, 'wb') as outf:
+            json.dump(data, outf, indent=4)
+        if os.name == 'nt' and os.path.isfile(self.reportFile):
+            os.remove(self.reportFile)
+        os.rename(temp, self.reportFile)
+
+    def duplicate(self):
+        """Return a copy of this object."""
+        return deepcopy(self)
+
+    def ToString(self):
+        """Overwrite .NET ToString method."""
+        return self.__repr__()
+
+    def __repr__(self):
+        """Run report representation."""
+        return 'RunReport::{}::{} commands'.format(
+            os.path.basename(self.projectDir), len(self.commands))
@@ -0,0 +1,369 @@
+# coding=utf-8
+"""Batch scheduler for running many solutions concurrently.
+
+Use BatchScheduler to run parametric studies (e.g. wind directions, wind speeds
+or design options) under a total core budget.
+
+Usage:
+    scheduler = BatchScheduler(maxCores=16)
+    for case in cases:
+        scheduler.add(Job(case, recipe, DecomposeParDict.scotch(4)))
+    scheduler.run()
+    print scheduler.progress
+"""
+import os
+import time
+import heapq
+import multiprocessing
+from collections import namedtuple
+from copy import deepcopy
+
+from .solution import Solution
+
+
+class Job(object):
+    """A Case and Recipe pair to be executed by BatchScheduler.
+
+    Args:
+        case: A butterfly case. Case should be saved and meshed.
+        recipe: A butterfly recipe.
+        decomposeParDict: Optional decomposeParDict to run the job in parallel.
+            Number of cores for the job is numberOfSubdomains (default: None).
+        priority: Jobs with higher priority will start first (default: 0).
+        retries: Number of times to retry the job if it fails (default: 0).
+    """
+
+    STATUS = ('queued', 'running', 'succeeded', 'failed', 'cancelled')
+
+    def __init__(self, case, recipe, decomposeParDict=None, priority=0,
+                 retries=0):
+        """Init job."""
+        assert hasattr(case, 'isCase'), '{} is not a Butterfly.Case'.format(case)
+        assert hasattr(recipe, 'isRecipe'), '{} is not a recipe.'.format(recipe)
+        self.case = case
+        self.recipe = recipe
+        self.decomposeParDict = decomposeParDict
+        self.priority = priority
+        self.retries = int(retries)
+        self.status = 'queued'
+        self.attempts = 0
+        self.returncode = None
+        self.error = None
+        self.startTime = None
+        self.endTime = None
+        self.solution = None
+        self.blockedSince = None
+        self.__log = None
+
+    @property
+    def name(self):
+        """Job name which is the project name of the case."""
+        return self.case.projectName
+
+    @property
+    def cores(self):
+        """Number of cores for this job."""
+        if not self.decomposeParDict:
+            return 1
+        return max(1, int(self.decomposeParDict.numberOfSubdomains))
+
+    @property
+    def isDone(self):
+        """Check if the job is finished."""
+        return self.status in ('succeeded', 'failed', 'cancelled')
+
+    @property
+    def duration(self):
+        """Duration of the last attempt in seconds."""
+        if not self.startTime:
+            return 0
+        return (self.endTime or time.time()) - self.startTime
+
+    @property
+    def logfiles(self):
+        """Log files for the last attempt."""
+        return self.__log.logfiles if self.__log else ()
+
+    @property
+    def errorfiles(self):
+        """Error files for the last attempt."""
+        return self.__log.errorfiles if self.__log else ()
+
+    def start(self):
+        """Start the job without waiting for it to finish."""
+        self.attempts += 1
+        self.status = 'running'
+        self.returncode = None
+        self.error = None
+        self.startTime = time.time()
+        self.endTime = None
+
+        if not self.solution:
+            # solution writes the recipe files to case folder
+            self.solution = Solution(self.case, self.recipe,
+                                     self.decomposeParDict)
+
+        self.case.renameSnappyHexMeshFolders()
+        self.__log = self.case.command(
+            self.recipe.application, decomposeParDict=self.decomposeParDict,
+            run=True, wait=False)
+
+    def poll(self):
+        """Check the job and update status. Return True if the job is running."""
+        if self.status != 'running':
+            return False
+
+        code = self.__log.process.poll()
+        if code is None:
+            return True
+
+        self.endTime = time.time()
+        self.returncode = code
+        hasError, content = self.case.runmanager.checkFileContents(
+            self.errorfiles, mute=True)
+
+        if code or hasError:
+            self.status = 'failed'
+            self.error = content or 'Exit code {}.'.format(code)
+        else:
+            self.status = 'succeeded'
+
+        return False
+
+    def terminate(self):
+        """Terminate the job.
+
+        Commands are terminated through the run manager of the case. For docker
+        the process is the command on host and terminating it doesn't stop the
+        commands in the container.
+        """
+        if self.status == 'running':
+            self.case.runmanager.terminate()
+        self.status = 'cancelled'
+        self.endTime = time.time()
+
+    def duplicate(self):
+        """Return a copy of this object."""
+        return deepcopy(self)
+
+    def ToString(self):
+        """Overwrite .NET ToString method."""
+        return self.__repr__()
+
+    def __repr__(self):
+        """Job representation."""
+        return 'Job::{}::{} cores::{}'.format(self.name, self.cores, self.status)
+
+
+class BatchScheduler(object):
+    """Run jobs concurrently under a total core budget.
+
+    Jobs with higher priority start first. A job with lower priority will start
+    if there are not enough free cores for higher priority jobs but there are
+    enough cores for this job (backfilling). Once a job has been waiting for
+    free cores for backfillTime, the cores are reserved for the job and jobs
+    after it in the queue will not start until it starts. This stops smaller
+    jobs from starving larger jobs with higher priority.
+
+    Args:
+        maxCores: Maximum number of cores that can be used at the same time
+            (default: number of cpus).
+        pollInterval: Time in seconds between checking running jobs
+            (default: 1).
+        callback: An optional function which will be called with the progress
+            every time a job starts or finishes.
+        backfillTime: Time in seconds that jobs after a waiting job can use the
+            free cores. Use 0 to disable backfilling and None to always allow
+            backfilling (default: 300).
+    """
+
+    def __init__(self, maxCores=None, pollInterval=1, callback=None,
+                 backfillTime=300):
+        """Init batch scheduler."""
+        self.maxCores = int(maxCores or multiprocessing.cpu_count())
+        self.pollInterval = pollInterval
+        self.callback = callback
+        self.backfillTime = backfillTime
+        self.__jobs = []
+        self.__queue = []
+        self.__count = 0
+
+    @property
+    def jobs(self):
+        """All the jobs in the scheduler."""
+        return tuple(self.__jobs)
+
+    @property
+    def running(self):
+        """Running jobs."""
+        return tuple(j for j in self.__jobs if j.status == 'running')
+
+    @property
+    def usedCores(self):
+        """Number of cores in use."""
+        return sum(j.cores for j in self.running)
+
+    @property
+    def freeCores(self):
+        """Number of free cores."""
+        return self.maxCores - self.usedCores
+
+    @property
+    def reserved(self):
+        """The job that the free cores are reserved for or None."""
+        if self.backfillTime is None:
+            return
+        now = time.time()
+        for item in sorted(self.__queue):
+            job = item[2]
+            if job.status == 'queued' and job.blockedSince is not None and \
+                    now - job.blockedSince >= self.backfillTime:
+                return job
+
+    @property
+    def isDone(self):
+        """Check if all the jobs are finished."""
+        return all(j.isDone for j in self.__jobs)
+
+    @property
+    def progress(self):
+        """Progress as a namedtuple.
+
+        (total, queued, running, succeeded, failed, cancelled, usedCores, percentage)
+        """
+        p = namedtuple('Progress', 'total queued running succeeded failed '
+                       'cancelled usedCores percentage')
+        counts = dict.fromkeys(Job.STATUS, 0)
+        for j in self.__jobs:
+            counts[j.status] += 1
+        total = len(self.__jobs)
+        done = counts['succeeded'] + counts['failed'] + counts['cancelled']
+        return p(total, counts['queued'], counts['running'], counts['succeeded'],
+                 counts['failed'], counts['cancelled'], self.usedCores,
+                 100.0 * done / total if total else 100.0)
+
+    def add(self, job):
+        """Add a job to the queue."""
+        assert hasattr(job, 'cores') and hasattr(job, 'start'), \
+            '{} is not a Job.'.format(job)
+        if job.cores > self.maxCores:
+            raise ValueError(
+                '{} needs {} cores which is more than maxCores ({}).'.format(
+                    job.name, job.cores, self.maxCores))
+
+        projectDir = os.path.normpath(job.case.projectDir)
+        for j in self.__jobs:
+            if os.path.normpath(j.case.projectDir) == projectDir:
+                raise ValueError(
+                    '{} and {} are using the same folder: {}'.format(
+                        job, j, projectDir))
+
+        self.__jobs.append(job)
+        self.__push(job)
+
+    def addJobs(self, jobs):
+        """Add a list of jobs to the queue."""
+        for job in jobs:
+            self.add(job)
+
+    def __push(self, job):
+        job.status = 'queued'
+        job.blockedSince = None
+        # count keeps the order for jobs with the same priority
+        heapq.heappush(self.__queue, (-job.priority, self.__count, job))
+        self.__count += 1
+
+    def step(self):
+        """Check running jobs and start new jobs if there are free cores.
+
+        Use this method to run the scheduler without blocking. Returns True
+        if there are still jobs to run.
+        """
+        changed = False
+        for job in self.running:
+            if job.poll():
+                continue
+            changed = True
+            if job.status == 'failed' and job.attempts <= job.retries:
+                print('{} failed. Retrying [{}/{}]...'.format(
+                    job.name, job.attempts, job.retries))
+                self.__push(job)
+            else:
+                print('{} {} in {:.1f} seconds.'.format(
+                    job.name, job.status, job.duration))
+
+        # start as many jobs as possible from the queue
+        freeCores = self.freeCores
+        skipped = []
+        now = time.time()
+        while self.__queue and freeCores > 0:
+            item = heapq.heappop(self.__queue)
+            job = item[2]
+            if job.status != 'queued':
+                # cancelled
+                continue
+            if job.cores > freeCores:
+                skipped.append(item)
+                if job.blockedSince is None:
+                    job.blockedSince = now
+                if self.backfillTime is not None and \
+                        now - job.blockedSince >= self.backfillTime:
+                    # reserve the free cores for this job
+                    break
+                continue
+            job.blockedSince = None
+            try:
+                job.start()
+            except Exception as e:
+                job.status = 'failed'
+                job.error = str(e)
+                print('Failed to start {}:\n\t{}'.format(job.name, e))
+            else:
+                freeCores -= job.cores
+            changed = True
+
+        for item in skipped:
+            heapq.heappush(self.__queue, item)
+
+        if changed and self.callback:
+            self.callback(self.progress)
+
+        return not self.isDone
+
+    def run(self, wait=True):
+        """Run the jobs.
+
+        Args:
+            wait: Wait until all the jobs are finished (default: True). If False
+                only the first jobs will be started. Call step to continue.
+        Returns:
+            Progress of the jobs.
+        """
+        try:
+            while self.step() and wait:
+                time.sleep(self.pollInterval)
+        except KeyboardInterrupt:
+            self.terminate()
+            raise
+
+        return self.progress
+
+    def terminate(self):
+        """Terminate running jobs and cancel queued jobs."""
+        for job in self.__jobs:
+            if not job.isDone:
+                job.terminate()
+        self.__queue = []
+
+    def duplicate(self):
+        """Return a copy of this object."""
+        return deepcopy(self)
+
+    def ToString(self):
+        """Overwrite .NET ToString method."""
+        return self.__repr__()
+
+    def __repr__(self):
+        """Batch scheduler representation."""
+        return 'BatchScheduler::{}/{} cores::{}'.format(
+            self.usedCores, self.maxCores, self.progress)
@@ -3,9 +3,15 @@
 from copy import deepcopy
 from collections import namedtuple, OrderedDict
 import os
+import time
+import threading
 
 from .utilities import tail, loadSkippedProbes
 from .parser import CppDictParser
+from .convergence import ConvergenceAnalyzer
+from .timeindex import parseTime
+from .probemonitor import ProbeMonitor
+from .diskbudget import DiskBudget
 
 
 class Solution(object):
@@ -42,8 +48,11 @@ class Solution(object):
         self.__isRunStarted = False
         self.__isRunFinished = False
         self.__process = None
+        self.__future = None
         self.__logFiles = None
         self.__errFiles = None
+        self.__probeMonitor = None
+        self.__diskBudget = None
 
     @property
     def projectName(self):
@@ -101,6 +110,42 @@ class Solution(object):
         """Get controlDict."""
         return self.__case.controlDict
 
+    @property
+    def probeMonitor(self):
+        """Optional ProbeMonitor for early stopping.
+
+        If set, the solution will be stopped gracefully once the monitored probe
+        values are stable. Stop criteria are recorded in log/runReport.json.
+        """
+        return self.__probeMonitor
+
+    @probeMonitor.setter
+    def probeMonitor(self, m):
+        if m:
+            assert hasattr(m, 'check'), '{} is not a ProbeMonitor.'.format(m)
+        self.__probeMonitor = m
+
+    @property
+    def diskBudget(self):
+        """Optional DiskBudget for the case folder.
+
+        If set, the estimated size of the results is checked against the quota
+        before the run and the budget is applied once the run is finished.
+        """
+        return self.__diskBudget
+
+    @diskBudget.setter
+    def diskBudget(self, b):
+        if b:
+            assert isinstance(b, DiskBudget), \
+                '{} is not a DiskBudget.'.format(b)
+        self.__diskBudget = b
+
+    @property
+    def runReport(self):
+        """RunReport for the case of this solution."""
+        return self.case.runReport
+
     @property
     def residualControl(self):
         """Get residualControl values for this solution."""
@@ -131,21 +176,51 @@ class Solution(object):
         """Get full path to error files."""
         return self.__errFiles
 
+    @property
+    def future(self):
+        """CommandFuture for the latest run.
+
+        Use it to wait for the solution or to add callbacks with no need to
+        poll isRunning. None if the solution has not started.
+        """
+        return self.__future
+
     @property
     def isRunning(self):
-        """Check if the solution is still running."""
-        if not self.__isRunStarted and not self.__isRunFinished:
+        """Check if the solution is still running.
+
+        Once the solution is finished use success and error to check the result.
+        """
+        if not self.__future:
             return False
-        elif self.__process.poll() is None:
+        elif self.__future.isRunning:
             return True
-        else:
+
+        if not self.__isRunFinished:
             self.__isRunFinished = True
             self.case.renameSnappyHexMeshFolders()
-            # load errors if any
+            # report the logs and errors once
             self.case.runmanager.checkFileContents(self.logFiles)
-            failed, err = self.case.runmanager.checkFileContents(self.errFiles)
+            if self.__future.error:
+                print(self.__future.error)
+        return False
+
+    @property
+    def success(self):
+        """True if the latest run has finished successfully.
 
-            assert not failed, err
+        None if the solution has not started or is still running.
+        """
+        return self.__future.success if self.__future else None
+
+    @property
+    def error(self):
+        """Error message if the latest run has failed.
+
+        None if the solution has not started, is still running or has finished
+        successfully.
+        """
+        return self.__future.error if self.__future else None
 
     @property
     def timestep(self):
@@ -174,8 +249,8 @@ class Solution(object):
         text = tail(self.residualFile).split("\nTime =")[-1].split('\n')
         # get timestep
         try:
-            t = int(text[0])
-        except:
+            t = parseTime(text[0])
+        except ValueError:
             t = 0
 
         # read residual values
@@ -191,6 +266,26 @@ class Solution(object):
 
         return i(t, self.__residualValues.values())
 
+    def analyzeConvergence(self, window=50, plateauTolerance=1e-4,
+                           oscillationThreshold=0.5):
+        """Analyze residuals of this solution.
+
+        Args:
+            window: Number of iterations for rolling values (default: 50).
+            plateauTolerance: Maximum absolute slope in decades per iteration
+                for a field to be considered stalled (default: 1e-4).
+            oscillationThreshold: Minimum fraction of sign changes for a field
+                to be considered oscillating (default: 0.5).
+        Returns:
+            A ConvergenceAnalyzer. Use slopes, status, iterationsToTarget and eta
+            to check the convergence.
+        """
+        assert os.path.isfile(self.residualFile), \
+            'Failed to find {}. Run the solution first.'.format(self.residualFile)
+
+        return ConvergenceAnalyzer.fromSolution(
+            self, window, plateauTolerance, oscillationThreshold)
+
     def __getLatestTime(self):
         # get end of the log file
         if not os.path.isfile(self.residualFile):
@@ -198,8 +293,8 @@ class Solution(object):
         text = tail(self.residualFile).split("\nTime =")[-1].split('\n')
         # get timestep
         try:
-            t = int(text[0])
-        except:
+            t = parseTime(text[0])
+        except ValueError:
             t = 0
         return t
 
@@ -256,20 +351,91 @@ class Solution(object):
                         self.controlDict.include = solPar.filename
                         self.controlDict.save(self.projectDir)
 
-    def run(self):
-        """Execute the solution."""
+    def run(self, callback=None):
+        """Execute the solution.
+
+        If diskBudget is set the run will fail with a ValueError if the
+        estimated size of the results exceeds the quota.
+
+        Args:
+            callback: Optional function to be called with the future once the
+                solution is finished.
+        Returns:
+            A CommandFuture for the solution. See future.
+        """
+        if self.diskBudget:
+            self.diskBudget.check(self.case)
+            if self.diskBudget.updateControlDict(self.controlDict):
+                self.controlDict.save(self.projectDir)
         self.case.renameSnappyHexMeshFolders()
-        log = self.case.command(
+        self.__future = self.case.commandAsync(
             cmd=self.recipe.application,
             args=None,
             decomposeParDict=self.__decomposeParDict,
-            run=True, wait=False)
-        self.__process = log.process
-        self.__errFiles = log.errorfiles
-        self.__logFiles = log.logfiles
+            callback=callback)
+        self.__process = self.__future.process
+        self.__errFiles = self.__future.errorfiles
+        self.__logFiles = self.__future.logfiles
         self.__isRunStarted = True
         self.__isRunFinished = False
 
+        if self.probeMonitor:
+            # don't load the values of the previous runs
+            self.probeMonitor.reset(skipExisting=True)
+            t = threading.Thread(target=self.__watchProbes,
+                                 args=(self.__process,))
+            t.daemon = True
+            t.start()
+
+        budget = self.diskBudget
+        if budget:
+            self.__future.addDoneCallback(lambda f: budget.apply(self.case))
+
+        return self.__future
+
+    def addProbeMonitor(self, fields=('U',), probes=None, window=50,
+                        tolerance=0.01, startTime=0, interval=5):
+        """Stop the solution once the probe values are stable.
+
+        See ProbeMonitor for the arguments.
+
+        Returns:
+            The ProbeMonitor.
+        """
+        self.probeMonitor = ProbeMonitor(
+            self.case.probesFolder, fields, probes, window, tolerance,
+            startTime, interval=interval)
+        return self.probeMonitor
+
+    def __watchProbes(self, process):
+        """Check probe values while the process is running and stop it."""
+        monitor = self.probeMonitor
+        while process.poll() is None:
+            time.sleep(monitor.interval)
+            if process.poll() is not None:
+                break
+            try:
+                status = monitor.check()
+            except Exception as e:
+                print 'Failed to check probe values:\n\t{}'.format(e)
+                return
+            if not status.isStable:
+                continue
+
+            print 'Probe values are stable at {} (maximum change of {:.2e} for ' \
+                '{} at probe {}). Stopping {}...'.format(
+                    status.timestep, status.maxChange, status.field,
+                    status.probe, self.recipe.application)
+            stop = self.stop()
+            report = OrderedDict(monitor.criteria)
+            report.update(status._asdict())
+            if stop:
+                report['graceful'] = stop.graceful
+                report['signal'] = stop.signal
+                report['stoppedAt'] = stop.timestep
+            self.runReport.update('earlyStop', report)
+            return
+
     def purge(self, removePolyMeshContent=True,
               removeSnappyHexMeshFolders=True,
               removeResultFolders=False,
@@ -280,8 +446,83 @@ class Solution(object):
             removeResultFolders, removePostProcessingFolder)
 
     def terminate(self):
-        """Cancel the solution."""
-        self.case.runmanager.terminate()
+        """Cancel the solution.
+
+        The solver is terminated with no write. Use stop to write the current
+        time step before stopping the solver.
+        """
+        if self.__future:
+            # only the solver and not the other commands of the case
+            self.__future.cancel()
+        else:
+            self.case.runmanager.terminate()
+
+    def stop(self, timeout=120, killTimeout=10, wait=True):
+        """Stop the solution gracefully and write the current time step.
+
+        stopAt in controlDict is changed to writeNow. The solver re-reads
+        controlDict at the next iteration (runTimeModifiable), writes the
+        current time step and exits. If the solution is still running after
+        timeout the solver is terminated and if it is still running after
+        killTimeout it will be killed. stopAt is restored once the solution is
+        stopped.
+
+        Args:
+            timeout: Seconds to wait for the solver to write and exit
+                (default: 120).
+            killTimeout: Seconds to wait for the solver to exit after each
+                signal (default: 10).
+            wait: Wait for the solution to stop. If False the solution will be
+                stopped in a background thread (default: True).
+        Returns:
+            A namedtuple as (graceful, signal, timestep). graceful is True if
+            the solver has stopped with no signal. signal is None, SIGTERM or
+            SIGKILL. Returns None if the solution is not running or wait is
+            False.
+        """
+        if not self.__isRunStarted or self.__process.poll() is not None:
+            return
+
+        if not wait:
+            t = threading.Thread(target=self.stop,
+                                 args=(timeout, killTimeout, True))
+            t.daemon = True
+            t.start()
+            return
+
+        res = namedtuple('Stop', 'graceful signal timestep')
+        controlDict = self.controlDict
+        stopAt = controlDict.stopAt
+        if str(controlDict.runTimeModifiable).lower() in \
+                ('off', 'false', 'no', 'n', '0'):
+            print 'runTimeModifiable is off. {} will be terminated after {} ' \
+                'seconds.'.format(self.recipe.application, timeout)
+
+        controlDict.stopAt = 'writeNow'
+        controlDict.save(self.projectDir)
+        sig = None
+        try:
+            if not self.__waitToFinish(timeout):
+                sig = 'SIGTERM'
+                self.__future.cancel()
+                if not self.__waitToFinish(killTimeout):
+                    sig = 'SIGKILL'
+                    self.__future.cancel(force=True)
+                    self.__waitToFinish(killTimeout)
+        finally:
+            controlDict.stopAt = stopAt
+            controlDict.save(self.projectDir)
+
+        return res(sig is None, sig, self.timestep)
+
+    def __waitToFinish(self, timeout, interval=0.5):
+        """Wait for the solution process. Return True if it is finished."""
+        end = time.time() + timeout
+        while self.__process.poll() is None:
+            if time.time() >= end:
+                return False
+            time.sleep(interval)
+        return True
 
     def loadProbeValues(self, field):
         """Return OpenFOAM probes results for a given field (e.g. U)."""
@@ -332,8 +573,8 @@ class SolutionParameter(object):
         self.replace = replace
 
         try:
-            self.__t0 = int(timeRange[0])
-            self.__t1 = int(timeRange[1])
+            self.__t0 = parseTime(timeRange[0])
+            self.__t1 = parseTime(timeRange[1])
         except:
             self.__t0, self.__t1 = 0, 1.0e+100
 
@@ -0,0 +1,170 @@
+# coding=utf-8
+"""Index of OpenFOAM time folders.
+
+OpenFOAM writes results to folders named after time values. Steady solvers use
+integer names (e.g. 100) but transient solvers write float names (e.g. 0.01,
+1e-05). TimeIndex lists these folders, sorts them numerically and caches the
+result per directory modification time.
+"""
+import os
+import math
+import time
+import threading
+from collections import OrderedDict
+
+try:
+    from os import scandir
+except ImportError:
+    try:
+        # python 2 backport
+        from scandir import scandir
+    except ImportError:
+        scandir = None
+
+
+def parseTime(value):
+    """Convert an OpenFOAM time name to a number.
+
+    Args:
+        value: Time as a string (e.g. '100', '0.01', '1e-05').
+    Returns:
+        An integer for integral values and a float otherwise. Raises ValueError
+        if value is not a valid time.
+    """
+    t = float(value)
+    if math.isinf(t) or math.isnan(t):
+        raise ValueError('{} is not a valid time.'.format(value))
+    return int(t) if t.is_integer() else t
+
+
+class TimeIndex(object):
+    """Sorted time folders of a directory.
+
+    Instances are cheap. Folder names are shared between all the instances for
+    the same directory and will only be reloaded once the modification time of
+    the directory changes. Directories which are modified in the last
+    RESCANWINDOW seconds are always reloaded as a folder can be created in the
+    same tick of a file system with coarse timestamps (e.g. 1 or 2 seconds on
+    HFS+, FAT or SMB shares) without changing the modification time. Up to
+    MAXCACHESIZE directories are cached.
+
+    Args:
+        directory: Full path to an OpenFOAM case or a postProcessing folder.
+
+    Usage:
+        ti = TimeIndex(case.projectDir)
+        print ti.names  # ('0', '0.01', '0.02', ..., '10')
+        print ti.latest  # 10
+    """
+
+    # seconds after the last modification of a directory to reload it
+    RESCANWINDOW = 2
+
+    # maximum number of cached directories
+    MAXCACHESIZE = 256
+
+    # {directory: (mtime, ((time, name), ...))} with the least recently used
+    # directory first
+    __cache = OrderedDict()
+    __lock = threading.Lock()
+
+    def __init__(self, directory):
+        """Init time index."""
+        self.__directory = os.path.normpath(directory)
+
+    @property
+    def directory(self):
+        """Indexed directory."""
+        return self.__directory
+
+    @property
+    def items(self):
+        """Sorted time folders as a tuple of (time, name)."""
+        try:
+            mtime = os.stat(self.directory).st_mtime
+        except OSError:
+            return ()
+
+        with self.__lock:
+            cached = self.__cache.pop(self.directory, None)
+            if cached:
+                # keep the directory as the most recently used one
+                self.__cache[self.directory] = cached
+        if cached and cached[0] == mtime and \
+                time.time() - mtime > self.RESCANWINDOW:
+            return cached[1]
+
+        items = self.__scan(self.directory)
+        with self.__lock:
+            self.__cache.pop(self.directory, None)
+            self.__cache[self.directory] = (mtime, items)
+            while len(self.__cache) > self.MAXCACHESIZE:
+                self.__cache.popitem(last=False)
+        return items
+
+    @property
+    def names(self):
+        """Sorted folder names."""
+        return tuple(name for t, name in self.items)
+
+    @property
+    def times(self):
+        """Sorted time values."""
+        return tuple(t for t, name in self.items)
+
+    @property
+    def latest(self):
+        """Latest time value or None if there is no time folder."""
+        items = self.items
+        return items[-1][0] if items else None
+
+    @property
+    def latestName(self):
+        """Folder name for the latest time or None if there is no time folder."""
+        items = self.items
+        return items[-1][1] if items else None
+
+    def fullpaths(self):
+        """Full path to sorted time folders."""
+        return tuple(os.path.join(self.directory, name) for name in self.names)
+
+    @classmethod
+    def clearCache(cls, directory=None):
+        """Clear cached folders for a directory or all the directories."""
+        with cls.__lock:
+            if directory:
+                cls.__cache.pop(os.path.normpath(directory), None)
+            else:
+                cls.__cache.clear()
+
+    @staticmethod
+    def __scan(directory):
+        """Collect time folders in directory."""
+        if scandir:
+            entries = ((e.name, e.is_dir()) for e in scandir(directory))
+        else:
+            entries = ((name, os.path.isdir(os.path.join(directory, name)))
+                       for name in os.listdir(directory))
+
+        items = []
+        for name, isdir in entries:
+            if not isdir or not (name[0].isdigit() or name[0] in '.-'):
+                # quick check to skip constant, system, etc.
+                continue
+            try:
+                items.append((parseTime(name), name))
+            except ValueError:
+                # not a time folder (e.g. 1.org)
+                continue
+
+        items.sort(key=lambda item: item[0])
+        return tuple(items)
+
+    def ToString(self):
+        """Overwrite .NET ToString method."""
+        return self.__repr__()
+
+    def __repr__(self):
+        """Time index representation."""
+        return 'TimeIndex::{}::{} time folders'.format(self.directory,
+                                                       len(self.items))
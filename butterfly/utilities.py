@@ -3,10 +3,16 @@
 from __future__ import print_function
 import os
 import sys
+import errno
+import shutil
+import tempfile
+import threading
 from collections import OrderedDict, namedtuple
 from subprocess import Popen, PIPE
 import gzip
 
+from .timeindex import TimeIndex
+
 
 def listfiles(folder, fullpath=False):
     """list files in a folder."""
@@ -26,7 +32,7 @@ def listfiles(folder, fullpath=False):
 def loadCaseFiles(folder, fullpath=False):
     """load openfoam files from a folder."""
     files = []
-    for p in ('0', 'constant', 'system', 'constant\\triSurface'):
+    for p in ('0', 'constant', 'system', os.path.join('constant', 'triSurface')):
         fp = os.path.join(folder, p)
         files.append(tuple(listfiles(fp, fullpath)))
 
@@ -50,6 +56,137 @@ def mkdir(directory, overwrite=True):
     return directory
 
 
+def copyfile(source, target, chunkSize=16 * 1024 ** 2):
+    """Copy a file in chunks.
+
+    Large files are never loaded to memory. Use this method to copy mesh files
+    across file systems.
+    """
+    with open(source, 'rb') as inf, open(target, 'wb') as outf:
+        shutil.copyfileobj(inf, outf, chunkSize)
+    shutil.copystat(source, target)
+    return target
+
+
+def linktree(source, target, ignore=(), hardlink=True):
+    """Hardlink files from source folder to target folder.
+
+    Files will be copied in chunks if hardlinks are not supported (e.g. on
+    Windows with IronPython or across different file systems). Existing files
+    in target will be replaced. Hardlinked files share the same data so a
+    command that rewrites a file in place changes both of them.
+
+    Args:
+        source: Path to source folder.
+        target: Path to target folder. It will be created if it doesn't exist.
+        ignore: A list of file names to be ignored.
+        hardlink: Set to False to copy the files (default: True).
+    Returns:
+        Number of copied files. 0 means all the files are hardlinked.
+    """
+    if not os.path.isdir(target):
+        os.makedirs(target)
+
+    copied = 0
+    for f in os.listdir(source):
+        if f in ignore:
+            continue
+        s = os.path.join(source, f)
+        t = os.path.join(target, f)
+        if os.path.isdir(s):
+            copied += linktree(s, t, hardlink=hardlink)
+            continue
+        if os.path.isfile(t):
+            os.remove(t)
+        if hardlink and hasattr(os, 'link'):
+            try:
+                os.link(s, t)
+                continue
+            except OSError:
+                # different file system or hardlinks are not supported
+                pass
+        copyfile(s, t)
+        copied += 1
+
+    return copied
+
+
+def movetree(source, target):
+    """Move source folder to target.
+
+    Folder will be renamed if source and target are on the same file system
+    which is atomic and independent of the size of the folder. Otherwise files
+    are copied in chunks and source folder is removed.
+    """
+    try:
+        os.rename(source, target)
+    except OSError as e:
+        if e.errno not in (errno.EXDEV, errno.EEXIST, errno.ENOTEMPTY,
+                           errno.EACCES):
+            raise
+        linktree(source, target)
+        removetree(source, wait=True)
+
+    return target
+
+
+def removetree(path, wait=False):
+    """Remove a folder.
+
+    The folder is renamed first so it disappears immediately from the parent
+    folder and then it will be removed in a background thread.
+
+    Args:
+        path: Path to folder.
+        wait: Set to True to remove the folder in the current thread.
+    Returns:
+        The thread which removes the folder or None if wait is True.
+    """
+    if not os.path.isdir(path):
+        return
+
+    if not wait:
+        trash = tempfile.mkdtemp(prefix='.trash',
+                                 dir=os.path.dirname(os.path.abspath(path)))
+        try:
+            os.rename(path, os.path.join(trash, os.path.basename(path)))
+        except OSError:
+            # folder is in use. remove it in place.
+            os.rmdir(trash)
+        else:
+            path = trash
+
+    def onerror(func, p, excinfo):
+        try:
+            # read-only files on Windows
+            os.chmod(p, 0o666)
+            func(p)
+        except OSError as e:
+            print('Failed to remove {}:\n\t{}'.format(p, e))
+
+    if wait:
+        shutil.rmtree(path, onerror=onerror)
+        return
+
+    # not a daemon thread so python waits for the folder to be removed on exit
+    t = threading.Thread(target=shutil.rmtree, args=(path, False, onerror))
+    t.start()
+    return t
+
+
+def foldersize(path):
+    """Get the size of all the files in a folder in bytes."""
+    size = 0
+    for root, dirs, files in os.walk(path):
+        for f in files:
+            try:
+                size += os.path.getsize(os.path.join(root, f))
+            except OSError:
+                # file is removed
+                pass
+    return size
+
+
 def wfile(fullPath, content):
     """write string content to a file."""
     try:
@@ -254,9 +391,7 @@ def loadProbeValuesFromFolder(probesFolder, field):
         raise ValueError(
             'Failed to find probes folder folder at {}'.format(probesFolder))
 
-    folders = [os.path.join(probesFolder, f) for f in os.listdir(probesFolder)
-               if (os.path.isdir(os.path.join(probesFolder, f)) and
-                   f.isdigit())]
+    folders = TimeIndex(probesFolder).fullpaths()
 
     # sort based on last modified
     folders = sorted(folders, key=lambda folder:
@@ -1,8 +1,10 @@
 # coding=utf-8
 """Butterfly wind tunnel."""
+import math
+from collections import namedtuple
 from copy import deepcopy
 
-from .blockMeshDict import BlockMeshDict
+from .blockMeshDict import BlockMeshDict, MultiBlockMeshDict
 from .case import Case
 from .meshingparameters import MeshingParameters
 from .geometry import calculateMinMaxFromBFGeometries, BFBlockGeometry
@@ -10,9 +12,73 @@ from .boundarycondition import WindTunnelGroundBoundaryCondition, \
     WindTunnelInletBoundaryCondition, WindTunnelOutletBoundaryCondition, \
     WindTunnelTopAndSidesBoundaryCondition, WindTunnelWallBoundaryCondition
 from .conditions import ABLConditions
+from .refinementRegion import wakeRefinementRegions
 import vectormath as vm
 
 
+def frontalArea(geometries, windVector, resolution=256):
+    """Calculate projected frontal area of geometries for a wind direction.
+
+    Faces are projected to the vertical plane perpendicular to the wind and
+    rasterized so overlapping faces are only counted once.
+
+    Args:
+        geometries: A list of butterfly geometries.
+        windVector: Wind vector as (x, y, z). z value is ignored.
+        resolution: Number of pixels along the longer side of projected
+            bounding box (default: 256).
+    Returns:
+        Frontal area in model units.
+    """
+    windVector = (windVector[0], windVector[1], 0)
+    xAxis = vm.normalize(vm.crossProduct(windVector, (0, 0, 1)))
+
+    triangles = []
+    for geo in geometries:
+        pts = tuple((vm.dotProduct(v, xAxis), v[2]) for v in geo.vertices)
+        for f in geo.faceIndices:
+            for i in xrange(1, len(f) - 1):
+                triangles.append((pts[f[0]], pts[f[i]], pts[f[i + 1]]))
+
+    if not triangles:
+        return 0
+
+    minU = min(p[0] for t in triangles for p in t)
+    maxU = max(p[0] for t in triangles for p in t)
+    minZ = min(p[1] for t in triangles for p in t)
+    maxZ = max(p[1] for t in triangles for p in t)
+    size = max(maxU - minU, maxZ - minZ) / float(resolution)
+    if size == 0:
+        return 0
+
+    nu = int(math.ceil((maxU - minU) / size)) or 1
+    nz = int(math.ceil((maxZ - minZ) / size)) or 1
+    pixels = bytearray(nu * nz)
+    for (u0, z0), (u1, z1), (u2, z2) in triangles:
+        det = (u1 - u0) * (z2 - z0) - (u2 - u0) * (z1 - z0)
+        if det == 0:
+            continue
+        # pixel range for triangle bounding box
+        i0 = max(0, int((min(u0, u1, u2) - minU) / size - 0.5))
+        i1 = min(nu - 1, int((max(u0, u1, u2) - minU) / size + 0.5))
+        j0 = max(0, int((min(z0, z1, z2) - minZ) / size - 0.5))
+        j1 = min(nz - 1, int((max(z0, z1, z2) - minZ) / size + 0.5))
+        for j in xrange(j0, j1 + 1):
+            z = minZ + (j + 0.5) * size
+            row = j * nu
+            for i in xrange(i0, i1 + 1):
+                if pixels[row + i]:
+                    continue
+                u = minU + (i + 0.5) * size
+                # barycentric coordinates of pixel center
+                a = ((u1 - u) * (z2 - z) - (u2 - u) * (z1 - z)) / det
+                b = ((u2 - u) * (z0 - z) - (u0 - u) * (z2 - z)) / det
+                if a >= 0 and b >= 0 and a + b <= 1:
+                    pixels[row + i] = 1
+
+    return sum(pixels) * size * size
+
+
 class WindTunnel(object):
     """Butterfly WindTunnel.
 
@@ -35,10 +101,15 @@ class WindTunnel(object):
                 '1.0'     # closed
                 '2.0'     # chaotic
         Zref: Reference height for wind velocity in meters (default: 10).
+        multiBlock: Use a MultiBlockMeshDict with a core block around test
+            geometries and graded buffer blocks toward the boundaries. The
+            core has the same cell size as the single block and extends one
+            height of test geometries around them (default: False).
     """
 
     def __init__(self, name, inlet, outlet, sides, top, ground, testGeomtries,
-                 roughness, meshingParameters=None, Zref=None, convertToMeters=1):
+                 roughness, meshingParameters=None, Zref=None, convertToMeters=1,
+                 multiBlock=False):
         """Init wind tunnel."""
         self.name = str(name)
         self.inlet = self.__checkInputGeometry(inlet)
@@ -50,11 +121,22 @@ class WindTunnel(object):
                                    if self.__checkInputGeometry(geo))
         self.z0 = roughness if roughness > 0 else 0.0001
 
-        self.__blockMeshDict = BlockMeshDict.fromBFBlockGeometries(
-            self.boundingGeometries, convertToMeters)
+        if multiBlock:
+            self.__blockMeshDict = MultiBlockMeshDict.fromBFBlockGeometries(
+                self.boundingGeometries, convertToMeters)
+        else:
+            self.__blockMeshDict = BlockMeshDict.fromBFBlockGeometries(
+                self.boundingGeometries, convertToMeters)
 
         self.meshingParameters = meshingParameters or MeshingParameters()
 
+        if multiBlock:
+            vertices = tuple(v for geo in self.testGeomtries
+                             for v in geo.vertices)
+            zValues = tuple(v[2] for v in vertices)
+            self.__blockMeshDict.setCore(
+                vertices, margin=max(zValues) - min(zValues))
+
         self.Zref = float(Zref) if Zref else 10
         self.convertToMeters = convertToMeters
 
@@ -64,8 +146,13 @@ class WindTunnel(object):
     @classmethod
     def fromGeometriesWindVectorAndParameters(
             cls, name, geometries, windVector, tunnelParameters, roughness,
-            meshingParameters=None, Zref=None, convertToMeters=1):
-        """Create a windTunnel based on size, wind speed and wind direction."""
+            meshingParameters=None, Zref=None, convertToMeters=1,
+            multiBlock=False):
+        """Create a windTunnel based on size, wind speed and wind direction.
+
+        Set multiBlock to True to use graded buffer blocks around a core block
+        for the test geometries.
+        """
         # butterfly geometries
         geos = tuple(cls.__checkInputGeometry(geo) for geo in geometries)
 
@@ -137,10 +224,39 @@ class WindTunnel(object):
         # return the class
         wt = cls(name, inlet, outlet, (rightSide, leftSide), top, ground,
                  geometries, roughness, meshingParameters, Zref,
-                 convertToMeters)
+                 convertToMeters, multiBlock)
 
         return wt
 
+    @classmethod
+    def fromGeometriesWindVectorAndBlockageRatio(
+            cls, name, geometries, windVector, roughness, blockageRatio=0.03,
+            meshingParameters=None, Zref=None, convertToMeters=1,
+            multiBlock=False):
+        """Create a windTunnel for a blockage ratio.
+
+        The tunnel is sized using TunnelParameters.fromBlockageRatio for the
+        frontal area of the geometries in this wind direction. The domain meets
+        the recommended distances and the blockage ratio. Change in number of
+        background cells compared to default TunnelParameters is printed.
+        """
+        tp = TunnelParameters.fromBlockageRatio(geometries, windVector,
+                                                blockageRatio)
+        savings = tp.cellSavings(geometries, windVector)
+        print 'Tunnel parameters for blockage ratio {}: {}'.format(
+            blockageRatio, tp)
+        print 'Blockage ratio: {:.4f} ({:.4f} for {})'.format(
+            tp.blockageRatio(geometries, windVector),
+            savings.reference.blockageRatio(geometries, windVector),
+            savings.reference)
+        print 'Background cells: {:.1f}% {} than {}'.format(
+            abs(savings.savings) * 100,
+            'less' if savings.savings >= 0 else 'more', savings.reference)
+
+        return cls.fromGeometriesWindVectorAndParameters(
+            name, geometries, windVector, tp, roughness, meshingParameters,
+            Zref, convertToMeters, multiBlock)
+
     @property
     def width(self):
         """Get width in x direction."""
@@ -220,6 +336,37 @@ class WindTunnel(object):
 
         self.__refinementRegions.append(refinementRegion)
 
+    def addWakeRefinementRegions(self, targetCellSize, upstream=1,
+                                 downstream=3, lateral=0.5, vertical=0.5,
+                                 footprint=False, mode='inside'):
+        """Add wake refinement regions for test geometries.
+
+        Regions are aligned with the flow direction of the tunnel. See
+        wakeRefinementRegions for the arguments.
+
+        Returns:
+            A tuple of added refinement regions.
+        """
+        flowDir = self.flowDir
+        if isinstance(flowDir, str):
+            flowDir = tuple(float(v) for v in flowDir.strip()[1:-1].split())
+
+        if hasattr(self.blockMeshDict, 'cellSizeXYZ'):
+            baseCellSize = max(self.blockMeshDict.cellSizeXYZ)
+        else:
+            baseCellSize = max(
+                s / n for s, n in zip((self.width, self.length, self.height),
+                                      self.blockMeshDict.nDivXYZ))
+
+        regions = wakeRefinementRegions(
+            self.testGeomtries, flowDir, baseCellSize, targetCellSize,
+            upstream, downstream, lateral, vertical, footprint, mode)
+
+        for region in regions:
+            self.addRefinementRegion(region)
+
+        return regions
+
     @staticmethod
     def __checkInputGeometry(input):
         if hasattr(input, 'isBFGeometry'):
@@ -255,6 +402,209 @@ class WindTunnel(object):
             float(self.flowSpeed))
 
 
+class WindStudy(object):
+    """Single-mesh wind study for several wind directions.
+
+    The wind tunnel is a direction-independent, axis aligned box around the
+    geometries. Each of the four sides (south, east, north and west) is set to
+    inlet, outlet or slip based on the wind direction. The mesh is the same for
+    all the directions, so the case only needs to be meshed once. For each
+    direction only the files in 0 folder and ABLConditions will be updated.
+
+    Args:
+        name: Case name as a string with no whitespace.
+        geometries: A list of butterfly geometries.
+        windSpeed: Wind speed in m/s.
+        tunnelParameters: TunnelParameters. The largest value for windward,
+            side and leeward will be used for all the sides as all of them can
+            be an inlet or an outlet.
+        roughness: z0 (roughness) value.
+        meshingParameters: Optional MeshingParameters.
+        Zref: Reference height for wind velocity in meters (default: 10).
+        convertToMeters: Scaling factor for the vertex coordinates.
+        multiBlock: Use graded buffer blocks around a core block for the
+            geometries (default: False).
+
+    Usage:
+        study = WindStudy('study', geometries, 5, TunnelParameters(5, 3, 5, 5), 0.5)
+        case = study.save(overwrite=True)
+        # mesh the case once
+        for windVector in WindStudy.windVectors(16, 5):
+            study.setWindDirection(case, windVector)
+            # run the solution for this direction
+    """
+
+    # side name and outward normal
+    SIDES = (('south', (0, -1, 0)), ('east', (1, 0, 0)), ('north', (0, 1, 0)),
+             ('west', (-1, 0, 0)))
+
+    def __init__(self, name, geometries, windSpeed, tunnelParameters, roughness,
+                 meshingParameters=None, Zref=None, convertToMeters=1,
+                 multiBlock=False):
+        """Init wind study."""
+        geos = tuple(geo for geo in geometries if hasattr(geo, 'isBFGeometry'))
+        assert len(geos) == len(geometries), \
+            'At least one of the inputs is not a Butterfly geometry.'
+
+        # update boundary condition of wall geometries
+        for bfGeometry in geos:
+            bfGeometry.boundaryCondition = WindTunnelWallBoundaryCondition(
+                bfGeometry.boundaryCondition.refLevels
+            )
+
+        tp = tunnelParameters
+        minPt, maxPt = calculateMinMaxFromBFGeometries(geos)
+        height = maxPt[2] - minPt[2]
+        dist = max(tp.windward, tp.side, tp.leeward) * height
+        halfSize = max(maxPt[0] - minPt[0], maxPt[1] - minPt[1]) / 2.0 + dist
+        cx = (minPt[0] + maxPt[0]) / 2.0
+        cy = (minPt[1] + maxPt[1]) / 2.0
+        zMin = minPt[2]
+        zMax = maxPt[2] + tp.top * height
+
+        v0, v1, v2, v3 = ((cx - halfSize, cy - halfSize, zMin),
+                          (cx + halfSize, cy - halfSize, zMin),
+                          (cx + halfSize, cy + halfSize, zMin),
+                          (cx - halfSize, cy + halfSize, zMin))
+        v4, v5, v6, v7 = ((v[0], v[1], zMax) for v in (v0, v1, v2, v3))
+
+        self.z0 = roughness if roughness > 0 else 0.0001
+        self.__zGround = zMin
+
+        # initial direction is north (0, 1, 0)
+        windVector = (0, float(windSpeed), 0)
+        ablConditions = self.ablConditions(windVector)
+
+        _order = (range(4),)
+        faces = {'south': (v0, v1, v5, v4), 'east': (v1, v2, v6, v5),
+                 'north': (v2, v3, v7, v6), 'west': (v3, v0, v4, v7)}
+        sides = tuple(
+            BFBlockGeometry(side, faces[side], _order, (faces[side],),
+                            self.sideBoundaryCondition(side, windVector,
+                                                       ablConditions))
+            for side, normal in self.SIDES)
+
+        top = BFBlockGeometry('top', (v4, v5, v6, v7), _order,
+                              ((v4, v5, v6, v7),),
+                              WindTunnelTopAndSidesBoundaryCondition())
+
+        ground = BFBlockGeometry(
+            'ground', (v3, v2, v1, v0), _order, ((v3, v2, v1, v0),),
+            WindTunnelGroundBoundaryCondition(ablConditions))
+
+        # south is the inlet and north is the outlet for the initial direction
+        self.__windTunnel = WindTunnel(
+            name, sides[0], sides[2], (sides[1], sides[3]), top, ground, geos,
+            roughness, meshingParameters, Zref, convertToMeters, multiBlock)
+
+    @staticmethod
+    def windVectors(count=16, windSpeed=1):
+        """Get wind vectors for equally distributed directions.
+
+        Directions start from north (0, 1, 0) and go clockwise.
+        """
+        return tuple(
+            (round(windSpeed * math.sin(2 * math.pi * i / count), 8),
+             round(windSpeed * math.cos(2 * math.pi * i / count), 8), 0)
+            for i in xrange(count))
+
+    @property
+    def windTunnel(self):
+        """Wind tunnel for the initial direction."""
+        return self.__windTunnel
+
+    def ablConditions(self, windVector):
+        """Get ABLConditions for a wind vector."""
+        windVector = (windVector[0], windVector[1], 0)
+        return ABLConditions.fromInputValues(
+            flowSpeed=vm.length(windVector), z0=self.z0,
+            flowDir=vm.normalize(windVector), zGround=self.__zGround)
+
+    def sideBoundaryCondition(self, side, windVector, ablConditions=None):
+        """Get boundary condition for a side of the tunnel.
+
+        A side is an inlet if the wind enters the tunnel from that side, an
+        outlet if the wind leaves the tunnel and slip if the side is parallel
+        to the wind.
+        """
+        normal = dict(self.SIDES)[side]
+        flowDir = vm.normalize((windVector[0], windVector[1], 0))
+        d = vm.dotProduct(normal, flowDir)
+        if d < -1e-6:
+            return WindTunnelInletBoundaryCondition(
+                ablConditions or self.ablConditions(windVector))
+        elif d > 1e-6:
+            return WindTunnelOutletBoundaryCondition()
+        else:
+            return WindTunnelTopAndSidesBoundaryCondition()
+
+    def toOpenFOAMCase(self, make2dParameters=None):
+        """Return a BF case for this wind study for the initial direction."""
+        return Case.fromWindTunnel(self.windTunnel, make2dParameters)
+
+    def save(self, overwrite=False, minimum=True, make2dParameters=None):
+        """Save wind study to folder as an OpenFOAM case.
+
+        Returns:
+            A butterfly.Case.
+        """
+        return self.windTunnel.save(overwrite, minimum, make2dParameters)
+
+    def setWindDirection(self, case, windVector, save=True):
+        """Update a case for a new wind direction.
+
+        Only ABLConditions, initialConditions and boundaryField of the sides in
+        0 folder files will be updated. The mesh will not change.
+
+        Args:
+            case: A case which is created from this wind study.
+            windVector: Wind vector. Length of vector is the wind speed.
+            save: Save updated files to case folder (default: True).
+        """
+        assert hasattr(case, 'ABLConditions'), \
+            '{} is not a wind tunnel case.'.format(case)
+
+        abl = self.ablConditions(windVector)
+        case.ABLConditions.updateValues(
+            {'flowDir': abl.values['flowDir'], 'Uref': abl.values['Uref']},
+            mute=True)
+        if hasattr(case, 'initialConditions'):
+            case.initialConditions.Uref = abl.values['Uref']
+
+        updated = [case.ABLConditions, case.initialConditions] \
+            if hasattr(case, 'initialConditions') else [case.ABLConditions]
+
+        for side, normal in self.SIDES:
+            bc = self.sideBoundaryCondition(side, windVector, case.ABLConditions)
+            for ff in case.getFoamFilesFromLocation('0'):
+                try:
+                    boundaryField = ff.values['boundaryField']
+                except KeyError:
+                    continue
+                if side not in boundaryField or not hasattr(bc, ff.name):
+                    continue
+                boundaryField[side] = getattr(bc, ff.name).valueDict
+                if ff not in updated:
+                    updated.append(ff)
+
+        if save:
+            for ff in updated:
+                ff.save(case.projectDir)
+
+    def duplicate(self):
+        """Return a copy of this object."""
+        return deepcopy(self)
+
+    def ToString(self):
+        """Overwrite .NET ToString method."""
+        return self.__repr__()
+
+    def __repr__(self):
+        """Wind study."""
+        return "WindStudy::%.2f * %.2f * %.2f" % (
+            self.windTunnel.width, self.windTunnel.length, self.windTunnel.height)
+
+
 class TunnelParameters(object):
     """Wind tunnel parameters.
 
@@ -274,6 +624,107 @@ class TunnelParameters(object):
         self.side = self.__checkInput(side)
         self.leeward = self.__checkInput(leeward)
 
+    @classmethod
+    def fromBlockageRatio(cls, geometries, windVector, blockageRatio=0.03,
+                          windward=5, top=5, side=5, leeward=15):
+        """Create the smallest tunnel parameters for a target blockage ratio.
+
+        Blockage ratio is the ratio between the frontal area of geometries and
+        the cross section of the tunnel. Distances start from the minimums in
+        the best practice guidelines for urban flows: 5H upstream, above and on
+        the sides of the geometries and 15H downstream, and a blockage ratio
+        below 3% [1, 2]. Top and side distances are increased by the same value
+        until the blockage ratio is less than the target.
+
+        [1] Franke, J., Hellsten, A., Schluenzen, H., Carissimo, B. (2007).
+            Best practice guideline for the CFD simulation of flows in the urban
+            environment. COST Action 732.
+        [2] Tominaga, Y. et al. (2008). AIJ guidelines for practical
+            applications of CFD to pedestrian wind environment around buildings.
+            Journal of Wind Engineering and Industrial Aerodynamics 96.
+
+        Args:
+            geometries: A list of butterfly geometries.
+            windVector: Wind vector as (x, y, z).
+            blockageRatio: Target blockage ratio (default: 0.03).
+            windward: Minimum windward distance as multiple of height
+                (default: 5).
+            top: Minimum distance above the geometries as multiple of height
+                (default: 5).
+            side: Minimum side distance as multiple of height (default: 5).
+            leeward: Minimum leeward distance as multiple of height
+                (default: 15).
+        """
+        assert 0 < blockageRatio < 1, \
+            'blockageRatio should be between 0 and 1 not {}.'.format(
+                blockageRatio)
+        width, length, height = cls.__geometrySize(geometries, windVector)
+        area = frontalArea(geometries, windVector)
+
+        def ratio(m):
+            return area / ((width + 2 * (side + m) * height) *
+                           (1 + top + m) * height)
+
+        # find the smallest increase in top and side distance with bisection
+        mn, mx = 0.0, 1.0
+        while ratio(mx) > blockageRatio:
+            mn, mx = mx, mx * 2
+        if ratio(mn) > blockageRatio:
+            for i in xrange(50):
+                m = (mn + mx) / 2.0
+                if ratio(m) > blockageRatio:
+                    mn = m
+                else:
+                    mx = m
+        else:
+            mx = 0
+
+        # top in TunnelParameters is measured from the ground
+        return cls(windward, round(1 + top + mx, 3), round(side + mx, 3),
+                   leeward)
+
+    @staticmethod
+    def __geometrySize(geometries, windVector):
+        """Size of geometries as (width, length, height) for a wind direction."""
+        windVector = (windVector[0], windVector[1], 0)
+        xAxis = vm.crossProduct(windVector, (0, 0, 1))
+        minPt, maxPt = calculateMinMaxFromBFGeometries(geometries, xAxis)
+        bmd = BlockMeshDict.fromMinMax(minPt, maxPt, xAxis=xAxis)
+        return bmd.width, bmd.length, bmd.height
+
+    def domainSize(self, geometries, windVector):
+        """Size of the tunnel as (width, length, height) for a wind direction."""
+        width, length, height = self.__geometrySize(geometries, windVector)
+        return (width + 2 * self.side * height,
+                length + (self.windward + self.leeward) * height,
+                self.top * height)
+
+    def blockageRatio(self, geometries, windVector):
+        """Calculate blockage ratio of the tunnel for a wind direction."""
+        width, length, height = self.domainSize(geometries, windVector)
+        return frontalArea(geometries, windVector) / (width * height)
+
+    def cellSavings(self, geometries, windVector, reference=None):
+        """Compare number of background cells with reference parameters.
+
+        Number of cells is compared for the same cell size.
+
+        Args:
+            geometries: A list of butterfly geometries.
+            windVector: Wind vector as (x, y, z).
+            reference: Reference TunnelParameters (default: TunnelParameters()).
+        Returns:
+            A namedtuple as (volume, referenceVolume, savings, reference).
+            savings is the fraction of cells saved compared to reference and
+            is negative if this tunnel needs more cells.
+        """
+        reference = reference or TunnelParameters()
+        volume, refVolume = (
+            reduce(lambda x, y: x * y, tp.domainSize(geometries, windVector))
+            for tp in (self, reference))
+        s = namedtuple('CellSavings', 'volume referenceVolume savings reference')
+        return s(volume, refVolume, 1 - volume / refVolume, reference)
+
     @staticmethod
     def __checkInput(input):
         """Check input values."""
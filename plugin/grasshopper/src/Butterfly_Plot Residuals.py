@@ -99,7 +99,12 @@ def main():
     assert hasattr(_solution, 'residualFile'), \
         '{} is not a valid Solution.'.format(_solution)
     
-    p = ResidualParser(_solution.residualFile)
+    # keep the parser to only parse the new lines on each update
+    key = 'butterfly_residuals_{}'.format(_solution.residualFile)
+    if key not in sc.sticky:
+        sc.sticky[key] = ResidualParser(_solution.residualFile, parse=False)
+    p = sc.sticky[key]
+    p.update()
     
     if not _fields_:
         try:
@@ -115,8 +120,9 @@ def main():
     timeRange = '{} To {}'.format(*p.timeRange)
     
     # calculate curves
-    crvs = tuple(rc.Geometry.PolylineCurve(rc.Geometry.Point3d(c, float(i), 0)
-        for c, i in enumerate(p.getResiduals(field, timeRange_)))
+    # downsample values to chart width to keep the curves light for long runs
+    crvs = tuple(rc.Geometry.PolylineCurve(rc.Geometry.Point3d(t, v, 0)
+        for t, v in p.getDownsampledResiduals(field, 500, timeRange_))
         for field in fields)
         
     # find bounding box for curves
@@ -89,7 +89,7 @@ if _case and _recipe and _write:
             ghComponentTimer(ghenv.Component, interval=_interval_*1000)
         else:
             # analysis is over
-            print 'done!'
+            print 'failed!' if solution.error else 'done!'
             solution = sticky[uniqueKey]
             solution.terminate()
             # remove solution from sticky
@@ -30,17 +30,6 @@ ghenv.Component.SubCategory = "03::Mesh"
 ghenv.Component.AdditionalHelpFromDocStrings = "1"
 
 
-try:
-    from butterfly.surfaceFeatureExtractDict import SurfaceFeatureExtractDict
-except ImportError as e:
-    msg = '\nFailed to import butterfly. Did you install butterfly on your machine?' + \
-            '\nYou can download the installer file from github: ' + \
-            'https://github.com/mostaphaRoudsari/Butterfly/tree/master/plugin/grasshopper/samplefiles' + \
-            '\nOpen an issue on github if you think this is a bug:' + \
-            ' https://github.com/mostaphaRoudsari/Butterfly/issues'
-        
-    raise ImportError('{}\n{}'.format(msg, e))
-
 if _case and _run:
     
     if _snappyHexMeshDict_:
@@ -88,11 +77,8 @@ if _case and _run:
         _case.decomposeParDict.save(_case.projectDir)
     
     if not _case.snappyHexMeshDict.isFeatureEdgeRefinementImplicit:
-        sfe = SurfaceFeatureExtractDict.fromStlFile(_case.projectName, includedAngle=150)
-        sfe.save(_case.projectDir)
-        log = _case.surfaceFeatureExtract()
-        if not log.success:
-            raise Exception("\n --> surfaceFeatureExtract Failed!\n%s" % log.error)
+        # write .eMesh file without running surfaceFeatureExtract
+        _case.extractFeatureEdges(includedAngle=150)
 
     log = _case.snappyHexMesh()
     
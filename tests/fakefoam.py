@@ -0,0 +1,113 @@
+# coding=utf-8
+"""Stand-in executables for OpenFOAM commands.
+
+Tests put a folder of small shell scripts in PATH instead of OpenFOAM so the
+run managers and the scheduler can be tested without an OpenFOAM installation.
+"""
+import os
+import stat
+import shutil
+import tempfile
+
+# append the command name to order.log in the case folder and exit
+ECHO = '''#!/bin/sh
+echo "$(basename "$0") $@" >> order.log
+echo "$(basename "$0") is done."
+'''
+
+# stand-in for mpirun: mpirun -np <n> <cmd> [args]
+MPIRUN = '''#!/bin/sh
+shift 2
+exec "$@"
+'''
+
+# decomposePar creates processor folders
+DECOMPOSEPAR = '''#!/bin/sh
+echo "decomposePar $@" >> order.log
+n=$(grep -o 'numberOfSubdomains *[0-9]*' system/decomposeParDict 2>/dev/null \
+    | grep -o '[0-9]*$')
+for i in $(seq 0 $((${n:-2} - 1))); do mkdir -p processor$i; done
+'''
+
+# a solver that writes a pid file for itself and a child and runs until it is
+# killed. Use FAKESOLVER_TIME to end it after some seconds.
+SLEEPER = '''#!/bin/sh
+echo "$(basename "$0") $@" >> order.log
+sleep ${FAKESOLVER_TIME:-60} &
+echo $$ $! > sleeper.pid
+wait
+'''
+
+
+class FakeFoam(object):
+    """A temporary folder with stand-in executables.
+
+    Args:
+        executables: A dictionary as {name: script}. Default stand-ins are
+            added for blockMesh, checkMesh, decomposePar, mpirun, simpleFoam,
+            reconstructPar and reconstructParMesh.
+    """
+
+    DEFAULTS = {
+        'blockMesh': ECHO, 'checkMesh': ECHO, 'simpleFoam': ECHO,
+        'snappyHexMesh': ECHO, 'reconstructPar': ECHO,
+        'reconstructParMesh': ECHO, 'decomposePar': DECOMPOSEPAR,
+        'mpirun': MPIRUN
+    }
+
+    def __init__(self, executables=None):
+        self.folder = tempfile.mkdtemp(prefix='fakefoam')
+        self.bin = os.path.join(self.folder, 'bin')
+        os.mkdir(self.bin)
+        scripts = dict(self.DEFAULTS)
+        scripts.update(executables or {})
+        for name, script in scripts.items():
+            self.add(name, script)
+
+    def add(self, name, script):
+        """Add a stand-in executable."""
+        fp = os.path.join(self.bin, name)
+        with open(fp, 'wb') as outf:
+            outf.write(script)
+        os.chmod(fp, os.stat(fp).st_mode | stat.S_IEXEC)
+
+    def env(self, **kwargs):
+        """Environment variables with stand-ins in PATH."""
+        env = dict(os.environ)
+        env['PATH'] = os.pathsep.join((self.bin, env.get('PATH', '')))
+        env.update((k, str(v)) for k, v in kwargs.items())
+        return env
+
+    def case(self, name='case'):
+        """Create an empty case folder and return the full path."""
+        fp = os.path.join(self.folder, name)
+        for f in ('system', 'constant', '0', 'log'):
+            os.makedirs(os.path.join(fp, f))
+        return fp
+
+    def close(self):
+        """Remove the temporary folder."""
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+
+def readOrder(projectDir):
+    """Read the commands that are executed in a case folder."""
+    try:
+        with open(os.path.join(projectDir, 'order.log'), 'rb') as inf:
+            return [l.split()[0] for l in inf.read().splitlines() if l.strip()]
+    except IOError:
+        return []
+
+
+def isAlive(pid):
+    """Check if a process is running."""
+    try:
+        os.kill(pid, 0)
+    except OSError:
+        return False
+    # zombies are not running
+    try:
+        with open('/proc/{}/stat'.format(pid)) as inf:
+            return inf.read().split(')')[-1].split()[0] != 'Z'
+    except IOError:
+        return True
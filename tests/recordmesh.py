@@ -0,0 +1,90 @@
+# coding=utf-8
+"""Record a meshed case as a reference mesh for the cell count estimator.
+
+The inputs for meshing (dictionaries in system, the stl files and 0 folder) are
+copied to tests/data/meshes/<name> with the number of cells from
+constant/polyMesh/owner.
+The peak memory of snappyHexMesh is also recorded if the case has a run report.
+
+Usage:
+    python -m tests.recordmesh path/to/meshed/case [name] [--tolerance 0.3]
+"""
+import os
+import sys
+import json
+import shutil
+import argparse
+
+from butterfly.meshestimator import cellCountFromPolyMesh
+from butterfly.runreport import RunReport
+
+FOLDER = os.path.join(os.path.dirname(__file__), 'data', 'meshes')
+
+# files that are needed to estimate the number of cells
+FILES = ('system/blockMeshDict', 'constant/polyMesh/blockMeshDict',
+         'system/snappyHexMeshDict', 'system/controlDict', 'system/fvSchemes',
+         'system/fvSolution')
+
+
+def openfoamVersion(projectDir):
+    """Get OpenFOAM version from the header of snappyHexMesh log."""
+    fp = os.path.join(projectDir, 'log', 'snappyHexMesh.log')
+    try:
+        with open(fp, 'rb') as inf:
+            for count, line in enumerate(inf):
+                if line.startswith('Build'):
+                    return line.split(':', 1)[-1].strip()
+                if count > 30:
+                    break
+    except IOError:
+        pass
+
+
+def record(projectDir, name=None, tolerance=0.3):
+    """Copy the inputs of a meshed case to tests/data/meshes."""
+    projectDir = os.path.normpath(projectDir)
+    name = name or os.path.basename(projectDir)
+    nCells = cellCountFromPolyMesh(os.path.join(projectDir, 'constant',
+                                                'polyMesh'))
+    assert nCells, '{} is not meshed.'.format(projectDir)
+
+    target = os.path.join(FOLDER, name)
+    if os.path.isdir(target):
+        shutil.rmtree(target)
+
+    for f in FILES:
+        source = os.path.join(projectDir, *f.split('/'))
+        if os.path.isfile(source):
+            if not os.path.isdir(os.path.dirname(os.path.join(target, f))):
+                os.makedirs(os.path.dirname(os.path.join(target, f)))
+            shutil.copyfile(source, os.path.join(target, f))
+
+    # boundary conditions in 0 are needed to load the case
+    for f in ('0', 'constant/triSurface'):
+        source = os.path.join(projectDir, *f.split('/'))
+        if os.path.isdir(source):
+            shutil.copytree(source, os.path.join(target, *f.split('/')))
+
+    maxRss = [c.maxRss for c in RunReport(projectDir).commands
+              if c.name == 'snappyHexMesh' and c.maxRss]
+    reference = {'nCells': nCells, 'tolerance': tolerance,
+                 'openfoam': openfoamVersion(projectDir),
+                 'snappyHexMeshMaxRss': max(maxRss) if maxRss else None}
+    with open(os.path.join(target, 'reference.json'), 'wb') as outf:
+        json.dump(reference, outf, indent=4)
+    return target
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(prog='python -m tests.recordmesh',
+                                     description=__doc__.split('\n')[0])
+    parser.add_argument('case', help='Path to a meshed case folder.')
+    parser.add_argument('name', nargs='?', help='Name for the reference.')
+    parser.add_argument('--tolerance', type=float, default=0.3,
+                        help='Accepted relative error for the estimate.')
+    args = parser.parse_args(args)
+    print('Recorded {}'.format(record(args.case, args.name, args.tolerance)))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
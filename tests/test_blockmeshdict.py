@@ -0,0 +1,89 @@
+# coding=utf-8
+"""Tests for reading BlockMeshDict and MultiBlockMeshDict files."""
+import os
+import shutil
+import tempfile
+import unittest
+
+from butterfly.case import Case
+from butterfly.geometry import BFGeometry
+from butterfly.windtunnel import WindTunnel, TunnelParameters
+from butterfly.blockMeshDict import BlockMeshDict, MultiBlockMeshDict
+
+from .test_scheduler import VERTICES, FACES
+
+
+class BlockMeshDictTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp(prefix='blockmeshdict')
+        os.mkdir(os.path.join(self.folder, 'system'))
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def roundTrip(self, bmd):
+        bmd.save(self.folder)
+        return BlockMeshDict.fromFile(
+            os.path.join(self.folder, 'system', 'blockMeshDict'))
+
+    def test_single_block(self):
+        bmd = BlockMeshDict.fromMinMax((0, 0, 0), (10, 6, 3), nDivXYZ=(7, 5, 3))
+        loaded = self.roundTrip(bmd)
+        self.assertNotIsInstance(loaded, MultiBlockMeshDict)
+        self.assertEqual(loaded.nDivXYZ, (7, 5, 3))
+        self.assertEqual(loaded.toOpenFOAM(), bmd.toOpenFOAM())
+
+    def test_multi_block(self):
+        bmd = MultiBlockMeshDict.fromMinMax((-100, -100, 0), (100, 300, 60))
+        bmd.nDivXYZByCellSize((5, 5, 5))
+        bmd.setCore(((-10, -10, 0), (20, 30, 15)), margin=10)
+        loaded = self.roundTrip(bmd)
+        self.assertIsInstance(loaded, MultiBlockMeshDict)
+        self.assertEqual(loaded.nDivXYZ, bmd.nDivXYZ)
+        self.assertEqual(loaded.core, bmd.core)
+        self.assertEqual(loaded.cellSizeXYZ, bmd.cellSizeXYZ)
+        self.assertAlmostEqual(loaded.expansionRatio, bmd.expansionRatio, 5)
+        self.assertEqual(loaded.toOpenFOAM(), bmd.toOpenFOAM())
+
+        # a new core recalculates the blocks
+        loaded.setCore(((0, 0, 0), (10, 10, 10)))
+        bmd.setCore(((0, 0, 0), (10, 10, 10)))
+        self.assertEqual(loaded.nDivXYZ, bmd.nDivXYZ)
+
+    def test_not_a_grid(self):
+        bmd = MultiBlockMeshDict.fromMinMax((0, 0, 0), (30, 30, 30))
+        bmd.nDivXYZByCellSize((1, 1, 1))
+        bmd.setCore(((10, 10, 10), (20, 20, 20)))
+        bmd.save(self.folder)
+        fp = os.path.join(self.folder, 'system', 'blockMeshDict')
+        with open(fp, 'rb') as inf:
+            content = inf.read()
+        # swap two vertices of the first block
+        with open(fp, 'wb') as outf:
+            outf.write(content.replace('hex (0 1 5 4', 'hex (1 0 5 4', 1))
+
+        with self.assertRaises(ValueError):
+            BlockMeshDict.fromFile(fp)
+
+    def test_multi_block_case(self):
+        geometry = BFGeometry('cube', VERTICES, FACES)
+        wt = WindTunnel.fromGeometriesWindVectorAndParameters(
+            'multiblock', (geometry,), (0, 4, 0), TunnelParameters(), 0.1,
+            multiBlock=True)
+        case = wt.toOpenFOAMCase()
+        case.workingDir = self.folder
+        case.save(overwrite=True)
+        self.assertTrue(case.blockMeshDict.core)
+
+        for lazy in (False, True):
+            loaded = Case.fromFolder(case.projectDir, lazy=lazy)
+            self.assertIsInstance(loaded.blockMeshDict, MultiBlockMeshDict)
+            self.assertEqual(loaded.blockMeshDict.nDivXYZ,
+                             case.blockMeshDict.nDivXYZ)
+            self.assertEqual(sorted(loaded.blockMeshDict.boundary),
+                             sorted(case.blockMeshDict.boundary))
+
+
+if __name__ == '__main__':
+    unittest.main()
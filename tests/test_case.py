@@ -0,0 +1,119 @@
+# coding=utf-8
+"""Tests for Case."""
+import os
+import time
+import shutil
+import tempfile
+import unittest
+
+from butterfly.case import Case
+from butterfly.geometry import BFGeometry
+from butterfly.windtunnel import WindTunnel, TunnelParameters
+from butterfly.recipe import SteadyIncompressible
+from butterfly.solution import Solution
+
+from .test_scheduler import VERTICES, FACES
+
+
+class LazyCaseTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp(prefix='lazycase')
+        wt = WindTunnel.fromGeometriesWindVectorAndParameters(
+            'lazy', (BFGeometry('cube', VERTICES, FACES),), (0, 4, 0),
+            TunnelParameters(), 0.1)
+        case = wt.toOpenFOAMCase()
+        case.workingDir = self.folder
+        case.save(overwrite=True)
+        # write 0 and constant folders for the recipe
+        Solution(case, SteadyIncompressible())
+        self.projectDir = case.projectDir
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def test_boundary_condition_loads_zero_folder(self):
+        case = Case.fromFolder(self.projectDir)
+        loaded = Case.fromFolder(self.projectDir, lazy=True)
+        bc, = (g.boundaryCondition for g in loaded.geometries
+               if g.name == 'cube')
+        expected, = (g.boundaryCondition for g in case.geometries
+                     if g.name == 'cube')
+        self.assertEqual(bc.U.valueDict, {'type': 'fixedValue',
+                                          'value': 'uniform (0 0 0)'})
+        self.assertEqual(bc.U.valueDict, expected.U.valueDict)
+        self.assertEqual(bc.k.valueDict, expected.k.valueDict)
+
+        # files in constant and system are not loaded for boundary conditions
+        self.assertTrue(loaded.isLazy)
+        self.assertEqual(len(loaded.getFoamFilesFromLocation('0')),
+                         len(case.getFoamFilesFromLocation('0')))
+        self.assertTrue(loaded.isLazy)
+        self.assertEqual(len(loaded.getFoamFilesFromLocation()),
+                         len(case.getFoamFilesFromLocation()))
+        self.assertFalse(loaded.isLazy)
+
+
+class CopySnappyHexMeshTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp(prefix='copysnappy')
+        case = Case.fromBFGeometries('snappy',
+                                     (BFGeometry('cube', VERTICES, FACES),))
+        case.workingDir = self.folder
+        case.save(overwrite=True)
+        self.case = case
+        self.write(os.path.join(case.polyMeshFolder, 'points'), 'blockMesh')
+        for folder in ('1', '2'):
+            for f in ('points', 'owner'):
+                self.write(os.path.join(case.projectDir, folder, 'polyMesh', f),
+                           '{} {}'.format(f, folder))
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def write(self, fp, content):
+        if not os.path.isdir(os.path.dirname(fp)):
+            os.makedirs(os.path.dirname(fp))
+        with open(fp, 'wb') as outf:
+            outf.write(content)
+
+    def read(self, name):
+        with open(os.path.join(self.case.polyMeshFolder, name), 'rb') as inf:
+            return inf.read()
+
+    def waitForFolders(self, timeout=10):
+        end = time.time() + timeout
+        while self.case.getSnappyHexMeshFolders() and time.time() < end:
+            time.sleep(0.05)
+        return self.case.getSnappyHexMeshFolders()
+
+    def test_move(self):
+        self.case.copySnappyHexMesh()
+        self.assertEqual(self.read('points'), 'points 2')
+        self.assertEqual(self.read('owner'), 'owner 2')
+        self.assertEqual(self.waitForFolders(), ())
+
+    def test_copy(self):
+        self.case.copySnappyHexMesh(move=False)
+        self.assertEqual(self.read('points'), 'points 2')
+        self.assertEqual(self.case.getSnappyHexMeshFolders(), ('1', '2'))
+        # the copy doesn't share data with the snappyHexMesh folder
+        self.assertFalse(os.path.samefile(
+            os.path.join(self.case.polyMeshFolder, 'points'),
+            os.path.join(self.case.projectDir, '2', 'polyMesh', 'points')))
+
+    @unittest.skipUnless(hasattr(os, 'link'), 'Hardlinks are not supported.')
+    def test_link(self):
+        self.case.copySnappyHexMesh(move=False, link=True)
+        self.assertTrue(os.path.samefile(
+            os.path.join(self.case.polyMeshFolder, 'points'),
+            os.path.join(self.case.projectDir, '2', 'polyMesh', 'points')))
+
+    def test_folder_number(self):
+        self.case.copySnappyHexMesh(folderNumber=1, move=False)
+        self.assertEqual(self.read('points'), 'points 1')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+# coding=utf-8
+"""Tests for DecomposeParDict.auto."""
+import unittest
+
+from butterfly.case import Case
+from butterfly.blockMeshDict import BlockMeshDict
+from butterfly.decomposeParDict import DecomposeParDict
+
+
+def case(blockMeshDict):
+    return Case.fromBFGeometries('decompose', (), blockMeshDict)
+
+
+def split(decomposeParDict):
+    """Number of subdomains in x, y and z for hierarchical method."""
+    n = decomposeParDict.values['hierarchicalCoeffs']['n']
+    return tuple(int(v) for v in n.strip('()').split())
+
+
+class AutoTestCase(unittest.TestCase):
+
+    def setUp(self):
+        # 8000 cells
+        self.case = case(BlockMeshDict.fromMinMax(
+            (0, 0, 0), (40, 20, 10), nDivXYZ=(40, 20, 10)))
+
+    def test_serial(self):
+        self.assertIsNone(DecomposeParDict.auto(self.case, maxCores=8,
+                                                cellsPerCore=10000))
+        self.assertIsNone(DecomposeParDict.auto(self.case, maxCores=1,
+                                                cellsPerCore=1))
+
+    def test_number_of_subdomains(self):
+        d = DecomposeParDict.auto(self.case, maxCores=8, cellsPerCore=2000)
+        self.assertEqual(d.numberOfSubdomains, '4')
+        # limited to maxCores
+        d = DecomposeParDict.auto(self.case, maxCores=3, cellsPerCore=1)
+        self.assertEqual(d.numberOfSubdomains, '3')
+
+    def test_hierarchical(self):
+        # the longest side is split first
+        for n, expected in ((2, (2, 1, 1)), (4, (2, 2, 1)), (6, (3, 2, 1)),
+                            (8, (4, 2, 1))):
+            d = DecomposeParDict.auto(self.case, maxCores=n, cellsPerCore=1)
+            self.assertEqual(d.values['method'], 'hierarchical')
+            self.assertEqual(d.numberOfSubdomains, str(n))
+            self.assertEqual(split(d), expected)
+
+    def test_swapped_axes(self):
+        # width of the block is along world y
+        c = case(BlockMeshDict.fromOriginAndSize(
+            (0, 0, 0), 40, 20, 10, nDivXYZ=(40, 20, 10), xAxis=(0, 1, 0)))
+        d = DecomposeParDict.auto(c, maxCores=2, cellsPerCore=1)
+        self.assertEqual(split(d), (1, 2, 1))
+
+    def test_2d(self):
+        # a single cell in z is never split
+        c = case(BlockMeshDict.fromMinMax((0, 0, 0), (40, 40, 1),
+                                          nDivXYZ=(40, 40, 1)))
+        d = DecomposeParDict.auto(c, maxCores=4, cellsPerCore=1)
+        self.assertEqual(split(d), (2, 2, 1))
+
+    def test_scotch(self):
+        # 7 slices have more area between subdomains than scotch
+        d = DecomposeParDict.auto(self.case, maxCores=7, cellsPerCore=1)
+        self.assertEqual(d.values['method'], 'scotch')
+        self.assertEqual(d.numberOfSubdomains, '7')
+
+        # not enough divisions for a hierarchical split
+        c = case(BlockMeshDict.fromMinMax((0, 0, 0), (40, 20, 10),
+                                          nDivXYZ=(2, 1, 1)))
+        d = DecomposeParDict.auto(c, maxCores=4, cellsPerCore=0.5)
+        self.assertEqual(d.values['method'], 'scotch')
+        self.assertEqual(d.numberOfSubdomains, '4')
+
+    def test_rotated_block(self):
+        # hierarchical splits along world axes
+        for xAxis in ((1, 1, 0), (1, 0.01, 0)):
+            c = case(BlockMeshDict.fromOriginAndSize(
+                (0, 0, 0), 40, 20, 10, nDivXYZ=(40, 20, 10), xAxis=xAxis))
+            d = DecomposeParDict.auto(c, maxCores=4, cellsPerCore=1)
+            self.assertEqual(d.values['method'], 'scotch')
+            self.assertEqual(d.numberOfSubdomains, '4')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+# coding=utf-8
+"""Tests for DecompositionState."""
+import os
+import shutil
+import tempfile
+import unittest
+
+from butterfly.decomposition import DecompositionState
+
+
+class DecompositionStateTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp(prefix='decomposition')
+        for name in ('0', 'system', 'log', os.path.join('constant', 'polyMesh')):
+            os.makedirs(os.path.join(self.folder, name))
+        self.write('0/U', 'uniform (0 0 0)')
+        self.write('system/decomposeParDict', 'numberOfSubdomains 2;')
+        for name in ('points', 'faces', 'owner', 'neighbour', 'boundary'):
+            self.write('constant/polyMesh/' + name, name)
+        self.state = DecompositionState(self.folder)
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def write(self, name, content):
+        with open(os.path.join(self.folder, name), 'wb') as outf:
+            outf.write(content)
+
+    def decompose(self, numberOfSubdomains=2):
+        """Save the state and mimic a successful decomposePar."""
+        self.state.save()
+        for i in range(numberOfSubdomains):
+            folder = os.path.join(self.folder, 'processor{}'.format(i))
+            if not os.path.isdir(folder):
+                os.mkdir(folder)
+        self.write('log/decomposePar.log', 'Decomposing mesh\n\nEnd\n')
+        self.write('log/decomposePar.err', '')
+
+    def test_no_state(self):
+        self.assertEqual(self.state.decomposeArgs(2), ('force',))
+        self.decompose()
+        self.assertIsNone(self.state.decomposeArgs(2))
+        self.state.reset()
+        self.assertEqual(self.state.decomposeArgs(2), ('force',))
+
+    def test_corrupt_state(self):
+        self.decompose()
+        self.write('log/decomposition.json', '{"mesh":')
+        self.assertEqual(self.state.state, {})
+        self.assertEqual(self.state.decomposeArgs(2), ('force',))
+
+    def test_up_to_date(self):
+        self.decompose()
+        self.assertIsNone(self.state.decomposeArgs(2))
+        # a new instance reads the saved state
+        self.assertIsNone(DecompositionState(self.folder).decomposeArgs(2))
+
+    def test_fields(self):
+        self.decompose()
+        self.write('0/U', 'uniform (1 0 0)')
+        self.assertEqual(self.state.decomposeArgs(2), ('fields',))
+        # new field
+        self.decompose()
+        self.write('0/p', 'uniform 0')
+        self.assertEqual(self.state.decomposeArgs(2), ('fields',))
+
+    def test_decompose_par_dict(self):
+        self.decompose()
+        self.write('system/decomposeParDict', 'numberOfSubdomains 2; // x')
+        self.write('0/U', 'uniform (1 0 0)')
+        # force wins over fields
+        self.assertEqual(self.state.decomposeArgs(2), ('force',))
+
+    def test_mesh(self):
+        self.decompose()
+        # the mesh is hashed by size and modification time
+        fp = os.path.join(self.folder, 'constant', 'polyMesh', 'points')
+        mtime = os.path.getmtime(fp) - 10
+        os.utime(fp, (mtime, mtime))
+        self.assertEqual(self.state.decomposeArgs(2), ('force',))
+
+        self.decompose()
+        os.remove(os.path.join(self.folder, 'constant', 'polyMesh', 'owner'))
+        self.assertEqual(self.state.decomposeArgs(2), ('force',))
+
+    def test_not_decomposed(self):
+        self.decompose()
+        # different number of subdomains
+        self.assertEqual(self.state.decomposeArgs(4), ('force',))
+
+        # decomposePar has failed
+        self.write('log/decomposePar.err', 'FOAM FATAL ERROR')
+        self.assertEqual(self.state.decomposeArgs(2), ('force',))
+        self.write('log/decomposePar.err', '')
+        self.write('log/decomposePar.log', 'Decomposing mesh\n')
+        self.assertEqual(self.state.decomposeArgs(2), ('force',))
+
+        # processor folder is removed
+        self.write('log/decomposePar.log', 'End\n')
+        self.assertIsNone(self.state.decomposeArgs(2))
+        shutil.rmtree(os.path.join(self.folder, 'processor1'))
+        self.assertEqual(self.state.decomposeArgs(2), ('force',))
+
+
+if __name__ == '__main__':
+    unittest.main()
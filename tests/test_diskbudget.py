@@ -0,0 +1,157 @@
+# coding=utf-8
+"""Tests for DiskBudget on temporary case folders."""
+import os
+import shutil
+import tempfile
+import unittest
+
+from butterfly.case import Case
+from butterfly.geometry import BFGeometry
+from butterfly.diskbudget import DiskBudget
+
+from .test_scheduler import VERTICES, FACES
+
+# size of each field file in result folders
+FIELDSIZE = 10000
+
+
+class DiskBudgetTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp(prefix='diskbudget')
+        self.case = self.createCase('budget')
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def createCase(self, name, times=(10, 20, 30, 40)):
+        """Create a case with snappyHexMesh stages and result folders."""
+        case = Case.fromBFGeometries(name,
+                                     (BFGeometry('cube', VERTICES, FACES),))
+        case.workingDir = self.folder
+        case.save(overwrite=True)
+        self.write(case, os.path.join('0', 'U'), 'U')
+        self.write(case, os.path.join('constant', 'polyMesh', 'points'),
+                   'mesh')
+        for stage in ('1', '2'):
+            self.write(case, os.path.join(stage, 'polyMesh', 'points'), stage)
+        for t in times:
+            for field in ('U', 'p'):
+                # random values so gzip doesn't change the size much
+                self.write(case, os.path.join(str(t), field),
+                           os.urandom(FIELDSIZE))
+        return case
+
+    @staticmethod
+    def write(case, path, content):
+        fp = os.path.join(case.projectDir, path)
+        if not os.path.isdir(os.path.dirname(fp)):
+            os.makedirs(os.path.dirname(fp))
+        with open(fp, 'wb') as outf:
+            outf.write(content)
+
+    @staticmethod
+    def files(case, folder):
+        return sorted(os.listdir(os.path.join(case.projectDir, folder)))
+
+    def assertUntouched(self, case):
+        """0 folder, mesh and the latest time folders are never changed."""
+        self.assertEqual(self.files(case, '0'), ['U'])
+        self.assertEqual(
+            self.files(case, os.path.join('constant', 'polyMesh')), ['points'])
+        for t in ('30', '40'):
+            self.assertEqual(self.files(case, t), ['U', 'p'])
+
+    def test_gz(self):
+        usage = DiskBudget(keepLatest=2, compression='gz').apply(self.case)
+        self.assertEqual(usage.compressed, ('10', '20'))
+        self.assertEqual(usage.removed, ('1',))
+        for t in ('10', '20'):
+            self.assertEqual(self.files(self.case, t), ['U.gz', 'p.gz'])
+        self.assertUntouched(self.case)
+        # the latest snappyHexMesh stage is kept
+        self.assertEqual(self.case.getSnappyHexMeshFolders(), ('2',))
+        self.assertEqual(self.case.getResultFolders(),
+                         ('10', '20', '30', '40'))
+
+    def test_remove(self):
+        usage = DiskBudget(keepLatest=2, compression=None).apply(self.case)
+        self.assertEqual(usage.compressed, ())
+        self.assertEqual(usage.removed, ('1', '10', '20'))
+        self.assertEqual(self.case.getResultFolders(), ('30', '40'))
+        self.assertUntouched(self.case)
+        self.assertLess(usage.after, usage.before)
+
+    def test_openfoam(self):
+        budget = DiskBudget(keepLatest=2, compression='openfoam',
+                            removeSnappyHexMeshStages=False)
+        usage = budget.apply(self.case)
+        self.assertEqual((usage.compressed, usage.removed), ((), ()))
+        self.assertEqual(usage.before, usage.after)
+        self.assertEqual(self.case.getSnappyHexMeshFolders(), ('1', '2'))
+        self.assertEqual(self.case.getResultFolders(),
+                         ('10', '20', '30', '40'))
+
+        self.assertTrue(budget.updateControlDict(self.case.controlDict))
+        self.assertEqual(self.case.controlDict.writeCompression, 'on')
+        self.assertFalse(budget.updateControlDict(self.case.controlDict))
+
+    def test_purge_write(self):
+        budget = DiskBudget(keepLatest=3, compression=None)
+        self.assertTrue(budget.updateControlDict(self.case.controlDict))
+        self.assertEqual(self.case.controlDict.purgeWrite, '3')
+
+    def test_renamed_stages(self):
+        self.case.renameSnappyHexMeshFolders()
+        usage = DiskBudget(compression='gz').apply(self.case)
+        self.assertEqual(usage.removed, ('1.org',))
+        self.assertTrue(os.path.isdir(
+            os.path.join(self.case.projectDir, '2.org', 'polyMesh')))
+
+    def test_quota(self):
+        size = DiskBudget(compression='gz').apply(self.case).after
+        # one of the older folders should be removed to fit in the quota
+        quota = size - FIELDSIZE
+        usage = DiskBudget(keepLatest=1, compression='gz',
+                           quota=quota).apply(self.case)
+        self.assertEqual(usage.compressed, ('30',))
+        self.assertEqual(usage.removed, ('10',))
+        self.assertLessEqual(usage.after, quota)
+        self.assertEqual(self.case.getResultFolders(), ('20', '30', '40'))
+        self.assertEqual(self.files(self.case, '40'), ['U', 'p'])
+
+    def test_quota_keeps_latest(self):
+        usage = DiskBudget(keepLatest=2, compression='gz',
+                           quota=1).apply(self.case)
+        self.assertEqual(usage.removed, ('1', '10', '20'))
+        self.assertGreater(usage.after, 1)
+        self.assertUntouched(self.case)
+
+    def test_batch_quota(self):
+        other = self.createCase('other', times=(10, 20, 30))
+        budget = DiskBudget(keepLatest=2, compression='gz')
+        sizes = [u.after for u in budget.applyCases((self.case, other))]
+
+        # make the older folders of other older than the folders of case
+        for case, mtimes in ((self.case, (3000, 4000)), (other, (1000, 2000))):
+            for f, mtime in zip(budget.olderFolders(case), mtimes):
+                os.utime(os.path.join(case.projectDir, f), (mtime, mtime))
+
+        budget.batchQuota = sum(sizes) - FIELDSIZE
+        usages = budget.applyCases((self.case, other))
+        self.assertEqual(usages[0].removed, ())
+        self.assertEqual(usages[1].removed, ('10',))
+        self.assertLessEqual(sum(u.after for u in usages), budget.batchQuota)
+
+        # other has no older folders anymore
+        budget.batchQuota = sum(u.after for u in usages) - FIELDSIZE
+        usages = budget.applyCases((self.case, other))
+        self.assertEqual(usages[0].removed, ('10',))
+        self.assertEqual(usages[1].removed, ())
+        self.assertEqual(self.case.getResultFolders(), ('20', '30', '40'))
+        self.assertEqual(other.getResultFolders(), ('20', '30'))
+        self.assertUntouched(self.case)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+# coding=utf-8
+"""Tests for LocalRunManager with stand-in executables."""
+import os
+import time
+import signal
+import unittest
+
+from butterfly.localrunmanager import LocalRunManager
+from butterfly.decomposeParDict import DecomposeParDict
+
+from .fakefoam import FakeFoam, SLEEPER, readOrder, isAlive
+
+
+@unittest.skipIf(os.name == 'nt', 'Stand-in executables are shell scripts.')
+class LocalRunManagerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.foam = FakeFoam({'fail': '#!/bin/sh\necho failed >&2\nexit 3\n',
+                              'sleeper': SLEEPER})
+        self.projectDir = self.foam.case()
+        self.rm = LocalRunManager('case', self.projectDir, self.foam.env(),
+                                  report=False)
+
+    def tearDown(self):
+        self.rm.terminate(force=True)
+        self.foam.close()
+
+    def test_sequence(self):
+        log = self.rm.run(('blockMesh', 'checkMesh'), (None, ('latestTime',)))
+        self.assertEqual(log.process.returncode, 0)
+        self.assertEqual(log.process.returncodes, (0, 0))
+        self.assertEqual(readOrder(self.projectDir), ['blockMesh', 'checkMesh'])
+        with open(log.logfiles[1], 'rb') as inf:
+            self.assertEqual(inf.read().strip(), 'checkMesh is done.')
+        with open(os.path.join(self.projectDir, 'order.log'), 'rb') as inf:
+            self.assertIn('checkMesh -latestTime', inf.read())
+
+    def test_parallel(self):
+        log = self.rm.run('simpleFoam', None, DecomposeParDict.scotch(2))
+        self.assertEqual(log.process.returncode, 0)
+        self.assertEqual(readOrder(self.projectDir),
+                         ['decomposePar', 'simpleFoam', 'reconstructPar'])
+        self.assertFalse(any(f.startswith('processor')
+                             for f in os.listdir(self.projectDir)))
+
+    def test_keep_processor_folders(self):
+        log = self.rm.run('simpleFoam', None, DecomposeParDict.scotch(2),
+                          reconstruct=False)
+        self.assertEqual(log.process.returncode, 0)
+        self.assertEqual(readOrder(self.projectDir),
+                         ['decomposePar', 'simpleFoam'])
+        self.assertTrue(os.path.isdir(os.path.join(self.projectDir,
+                                                   'processor1')))
+
+    def test_exit_code(self):
+        log = self.rm.run(('blockMesh', 'fail', 'checkMesh'))
+        self.assertEqual(log.process.returncode, 3)
+        self.assertEqual(log.process.returncodes, (0, 3))
+        # the sequence stops at the failed command
+        self.assertEqual(readOrder(self.projectDir), ['blockMesh'])
+        hasContent, content = self.rm.checkFileContents(log.errorfiles, True)
+        self.assertTrue(hasContent)
+        self.assertEqual(content, 'failed')
+
+    def test_missing_executable(self):
+        log = self.rm.run('notAnOpenFOAMCommand')
+        self.assertEqual(log.process.returncode, 127)
+        with open(log.errorfiles[0], 'rb') as inf:
+            self.assertIn('notAnOpenFOAMCommand', inf.read())
+
+    def test_terminate(self):
+        log = self.rm.run(('sleeper', 'checkMesh'), wait=False)
+        pids = self.__waitForPids()
+        self.assertTrue(all(isAlive(pid) for pid in pids))
+        self.rm.terminate()
+        self.assertEqual(log.process.wait(10), -signal.SIGTERM)
+        # children of the command are terminated with the command
+        time.sleep(0.2)
+        self.assertFalse(any(isAlive(pid) for pid in pids))
+        # the rest of the sequence is cancelled
+        self.assertEqual(readOrder(self.projectDir), ['sleeper'])
+
+    def test_kill(self):
+        log = self.rm.run('sleeper', wait=False)
+        pids = self.__waitForPids()
+        self.rm.terminate(force=True)
+        self.assertEqual(log.process.wait(10), -signal.SIGKILL)
+        time.sleep(0.2)
+        self.assertFalse(any(isAlive(pid) for pid in pids))
+
+    def __waitForPids(self, timeout=10):
+        fp = os.path.join(self.projectDir, 'sleeper.pid')
+        end = time.time() + timeout
+        while time.time() < end:
+            try:
+                with open(fp, 'rb') as inf:
+                    pids = [int(p) for p in inf.read().split()]
+                if len(pids) == 2:
+                    return pids
+            except (IOError, ValueError):
+                pass
+            time.sleep(0.05)
+        self.fail('sleeper has not started.')
+
+
+if __name__ == '__main__':
+    unittest.main()
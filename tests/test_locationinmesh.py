@@ -0,0 +1,68 @@
+# coding=utf-8
+"""Tests for locationInMesh in Case.fromBFGeometries."""
+import unittest
+
+from butterfly.case import Case
+from butterfly.geometry import BFGeometry
+from butterfly.blockMeshDict import BlockMeshDict
+from butterfly.boundarycondition import IndoorWallBoundaryCondition
+from butterfly.meshingparameters import MeshingParameters
+from butterfly.locationinmesh import SolidIndex, validateLocationInMesh
+
+from .test_scheduler import VERTICES, FACES
+
+
+def cube(name, scale=1, boundaryCondition=None):
+    return BFGeometry(name, tuple(tuple(c * scale for c in v) for v in VERTICES),
+                      FACES, boundaryCondition=boundaryCondition)
+
+
+class LocationInMeshTestCase(unittest.TestCase):
+
+    def locationInMesh(self, geometries, blockMeshDict, **kwargs):
+        case = Case.fromBFGeometries('location', geometries, blockMeshDict,
+                                     MeshingParameters(**kwargs))
+        return case.snappyHexMeshDict.locationInMesh
+
+    def test_solid_index(self):
+        index = SolidIndex((cube('cube'),))
+        self.assertTrue(index.isInside((0.3, 0.6, 0.5)))
+        self.assertFalse(index.isInside((1.3, 0.6, 0.5)))
+        self.assertFalse(index.isInside((0.3, 0.6, 1.5)))
+
+    def test_not_moved_by_default(self):
+        bmd = BlockMeshDict.fromMinMax((-3, -3, 0), (4, 4, 3), nDivXYZ=(7, 7, 3))
+        location = self.locationInMesh((cube('cube'),), bmd)
+        point = tuple(float(v) for v in location[1:-1].split())
+        for c, e in zip(point, bmd.center):
+            self.assertAlmostEqual(c, e)
+
+    def test_find(self):
+        bmd = BlockMeshDict.fromMinMax((-3, -3, -1), (4, 4, 2), nDivXYZ=(7, 7, 3))
+        location = self.locationInMesh((cube('cube'),), bmd,
+                                       findLocationInMesh=True)
+        point = tuple(float(v) for v in location[1:-1].split())
+        self.assertNotEqual(point, (0.5, 0.5, 0.5))
+        self.assertTrue(validateLocationInMesh(point, bmd, (cube('cube'),))
+                        .isValid)
+
+    def test_provided_point_is_not_moved(self):
+        bmd = BlockMeshDict.fromMinMax((-3, -3, -1), (4, 4, 2), nDivXYZ=(7, 7, 3))
+        location = self.locationInMesh(
+            (cube('cube'),), bmd, locationInMesh=(0.3, 0.6, 0.5),
+            findLocationInMesh=True)
+        self.assertEqual(location, '(0.3 0.6 0.5)')
+
+    def test_indoor(self):
+        # the room encloses the mesh by design
+        room = cube('room', 10, IndoorWallBoundaryCondition())
+        bmd = BlockMeshDict.fromMinMax((0, 0, 0), (10, 10, 10),
+                                       nDivXYZ=(7, 7, 7))
+        location = self.locationInMesh((room,), bmd, findLocationInMesh=True)
+        point = tuple(float(v) for v in location[1:-1].split())
+        # the center is on the faces of the cells and is moved in the room
+        self.assertTrue(validateLocationInMesh(point, bmd, ()).isValid)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+# coding=utf-8
+"""Tests for MeshCache."""
+import os
+import stat
+import shutil
+import tempfile
+import unittest
+
+from butterfly.case import Case
+from butterfly.geometry import BFGeometry
+from butterfly.meshcache import MeshCache
+
+from .test_scheduler import VERTICES, FACES
+
+
+class MeshCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp(prefix='meshcache')
+        self.cache = MeshCache(os.path.join(self.folder, '.meshcache'))
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def case(self, name):
+        case = Case.fromBFGeometries(name, (BFGeometry('cube', VERTICES, FACES),))
+        case.workingDir = self.folder
+        case.save(overwrite=True)
+        return case
+
+    def test_restore(self):
+        case = self.case('source')
+        for f in ('points', 'faces', 'owner', 'neighbour', 'boundary'):
+            with open(os.path.join(case.polyMeshFolder, f), 'wb') as outf:
+                outf.write(f)
+        key = self.cache.store(case)
+
+        other = self.case('other')
+        self.assertEqual(self.cache.key(other), key)
+        self.assertTrue(self.cache.restore(other))
+
+        fp = os.path.join(other.polyMeshFolder, 'points')
+        with open(fp, 'rb') as inf:
+            self.assertEqual(inf.read(), 'points')
+        # restored files are writable copies (e.g. renumberMesh -overwrite)
+        st = os.stat(fp)
+        self.assertTrue(st.st_mode & stat.S_IWUSR)
+        self.assertEqual(st.st_nlink, 1)
+        with open(fp, 'wb') as outf:
+            outf.write('renumbered')
+
+        # editing the case doesn't change the cache
+        third = self.case('third')
+        self.assertTrue(self.cache.restore(third))
+        with open(os.path.join(third.polyMeshFolder, 'points'), 'rb') as inf:
+            self.assertEqual(inf.read(), 'points')
+
+        other.removePolyMeshContent()
+        self.assertFalse(os.path.isfile(fp))
+
+
+if __name__ == '__main__':
+    unittest.main()
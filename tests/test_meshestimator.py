@@ -0,0 +1,103 @@
+# coding=utf-8
+"""Tests for CellCountEstimator.
+
+test_references compares the estimates against reference meshes that are
+recorded in tests/data/meshes. No reference mesh is committed yet so the test
+is skipped until one is recorded.
+"""
+import os
+import json
+import shutil
+import tempfile
+import unittest
+
+from butterfly.case import Case
+from butterfly.geometry import BFGeometry
+from butterfly.blockMeshDict import BlockMeshDict
+from butterfly.polymesh import PolyMesh
+from butterfly.meshestimator import CellCountEstimator, cellCountFromPolyMesh
+
+from .recordmesh import FOLDER
+from .test_scheduler import VERTICES, FACES
+
+
+def references():
+    """Folders of recorded reference meshes."""
+    if not os.path.isdir(FOLDER):
+        return []
+    return sorted(os.path.join(FOLDER, f) for f in os.listdir(FOLDER)
+                  if os.path.isfile(os.path.join(FOLDER, f, 'reference.json')))
+
+
+class CellCountEstimatorTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp(prefix='meshestimator')
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def case(self, name='case'):
+        geometry = BFGeometry('cube', VERTICES, FACES)
+        bmd = BlockMeshDict.fromMinMax((-4, -4, 0), (5, 5, 4), nDivXYZ=(9, 9, 4))
+        case = Case.fromBFGeometries(name, (geometry,), bmd)
+        case.workingDir = self.folder
+        return case
+
+    def test_block_mesh(self):
+        # without refinement the estimate is the number of cells in blockMesh
+        bmd = BlockMeshDict.fromMinMax((0, 0, 0), (10, 6, 3), nDivXYZ=(7, 5, 3))
+        folder = os.path.join(self.folder, 'polyMesh')
+        PolyMesh.fromBlockMeshDict(bmd).save(folder)
+        self.assertEqual(CellCountEstimator(bmd, ()).cellCount,
+                         cellCountFromPolyMesh(folder))
+
+    def test_max_global_cells(self):
+        case = self.case()
+        case.snappyHexMeshDict.maxGlobalCells = 100
+        estimator = CellCountEstimator.fromCase(case)
+        self.assertEqual(estimator.maxGlobalCells, 100)
+        self.assertTrue(estimator.exceedsMaxGlobalCells())
+        self.assertFalse(estimator.exceedsMaxGlobalCells(10 ** 9))
+        self.assertEqual(estimator.whatIf(refLevels=(0, 0)).maxGlobalCells, 100)
+
+        # read from the file
+        case.save(overwrite=True)
+        case = Case.fromFolder(case.projectDir)
+        self.assertEqual(CellCountEstimator.fromCase(case).maxGlobalCells, 100)
+
+    def test_references(self):
+        folders = references()
+        if not folders:
+            self.skipTest('No reference meshes in {}. See README.md in the '
+                          'folder to record one.'.format(FOLDER))
+
+        errors = []
+        for folder in folders:
+            with open(os.path.join(folder, 'reference.json'), 'rb') as inf:
+                reference = json.load(inf)
+            estimator = CellCountEstimator.fromCase(Case.fromFolder(folder))
+            error = abs(estimator.cellCount - reference['nCells']) / \
+                float(reference['nCells'])
+            if error > reference.get('tolerance', 0.3):
+                errors.append('{}: estimated {} cells for {} cells ({:.0%}).'
+                              .format(os.path.basename(folder),
+                                      estimator.cellCount, reference['nCells'],
+                                      error))
+
+            maxRss = reference.get('snappyHexMeshMaxRss')
+            if maxRss:
+                error = abs(estimator.memory.snappyHexMesh - maxRss) / \
+                    float(maxRss)
+                if error > reference.get('memoryTolerance', 1.0):
+                    errors.append('{}: estimated {} bytes for {} bytes of memory '
+                                  '({:.0%}).'.format(
+                                      os.path.basename(folder),
+                                      estimator.memory.snappyHexMesh, maxRss,
+                                      error))
+
+        self.assertFalse(errors, '\n'.join(errors))
+
+
+if __name__ == '__main__':
+    unittest.main()
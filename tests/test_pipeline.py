@@ -0,0 +1,152 @@
+# coding=utf-8
+"""Tests for Pipeline with stand-in step functions."""
+import os
+import shutil
+import tempfile
+import unittest
+
+from butterfly.pipeline import Pipeline, Step
+
+
+class PipelineTestCase(unittest.TestCase):
+    """A mesh > refine > solve pipeline.
+
+    refine replaces the mesh of the mesh step similar to snappyHexMesh and
+    copySnappyHexMesh.
+    """
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp(prefix='pipeline')
+        for f in ('system', 'mesh', 'log'):
+            os.mkdir(os.path.join(self.folder, f))
+        for name in ('meshDict', 'refineDict', 'fvSchemes'):
+            self.write(os.path.join('system', name), name)
+        self.calls = []
+        self.failing = set()
+        self.refinedFrom = None
+        self.pipeline = Pipeline(self.folder, (
+            Step('solve', self.solve, (os.path.join('system', 'fvSchemes'),),
+                 (os.path.join('log', 'solve.log'),), ('refine',),
+                 ('mesh',)),
+            Step('mesh', self.mesh, (os.path.join('system', 'meshDict'),),
+                 (os.path.join('mesh', 'points'),)),
+            Step('refine', self.refine,
+                 (os.path.join('system', 'refineDict'),), dependsOn=('mesh',))
+        ))
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def write(self, path, content):
+        with open(os.path.join(self.folder, path), 'wb') as outf:
+            outf.write(content)
+
+    def read(self, path):
+        with open(os.path.join(self.folder, path), 'rb') as inf:
+            return inf.read()
+
+    def mesh(self):
+        self.calls.append('mesh')
+        self.write(os.path.join('mesh', 'points'), 'background')
+
+    def refine(self):
+        self.calls.append('refine')
+        if 'refine' in self.failing:
+            return False
+        self.refinedFrom = self.read(os.path.join('mesh', 'points'))
+        # replace the mesh with a new file
+        fp = os.path.join(self.folder, 'mesh', 'points')
+        os.remove(fp)
+        self.write(os.path.join('mesh', 'points'), 'refined')
+
+    def solve(self):
+        self.calls.append('solve')
+        self.write(os.path.join('log', 'solve.log'), 'done')
+        return True
+
+    def runSteps(self, **kwargs):
+        self.calls = []
+        return dict((r.name, r.status) for r in self.pipeline.run(**kwargs))
+
+    def test_order(self):
+        self.assertEqual([s.name for s in self.pipeline.steps],
+                         ['mesh', 'refine', 'solve'])
+
+    def test_skip_unchanged(self):
+        self.runSteps()
+        self.assertEqual(self.calls, ['mesh', 'refine', 'solve'])
+        self.assertEqual(self.runSteps(), {'mesh': 'skipped',
+                                           'refine': 'skipped',
+                                           'solve': 'skipped'})
+        self.assertEqual(self.calls, [])
+        self.assertTrue(self.pipeline.isUpToDate('solve'))
+
+    def test_upstream_change(self):
+        self.runSteps()
+        self.write(os.path.join('system', 'meshDict'), 'changed')
+        self.assertFalse(self.pipeline.isUpToDate('solve'))
+        self.runSteps()
+        self.assertEqual(self.calls, ['mesh', 'refine', 'solve'])
+
+    def test_only_schemes_changed(self):
+        self.runSteps()
+        self.write(os.path.join('system', 'fvSchemes'), 'changed')
+        self.assertTrue(self.pipeline.isUpToDate('refine'))
+        self.assertEqual(self.runSteps(), {'mesh': 'skipped',
+                                           'refine': 'skipped',
+                                           'solve': 'success'})
+        self.assertEqual(self.calls, ['solve'])
+
+    def test_refine_uses_background_mesh(self):
+        self.runSteps()
+        self.assertEqual(self.refinedFrom, 'background')
+        # the mesh of the mesh step is replaced by refine
+        self.write(os.path.join('system', 'refineDict'), 'changed')
+        self.assertFalse(self.pipeline.isUpToDate('mesh'))
+        self.runSteps()
+        self.assertEqual(self.calls, ['mesh', 'refine', 'solve'])
+        self.assertEqual(self.refinedFrom, 'background')
+
+    def test_mesh_is_hashed_by_stat(self):
+        self.runSteps()
+        # same content with a new modification time
+        fp = os.path.join(self.folder, 'mesh', 'points')
+        mtime = os.path.getmtime(fp) + 10
+        os.utime(fp, (mtime, mtime))
+        self.assertFalse(self.pipeline.isUpToDate('solve'))
+        self.assertTrue(self.pipeline.isUpToDate('refine'))
+
+    def test_stop_at_failure(self):
+        self.failing.add('refine')
+        self.assertEqual(self.runSteps(), {'mesh': 'success',
+                                           'refine': 'failed',
+                                           'solve': 'notExecuted'})
+        self.assertNotIn('refine', self.pipeline.state)
+        self.assertFalse(os.path.isfile(
+            os.path.join(self.folder, 'log', 'solve.log')))
+
+        self.failing.clear()
+        self.runSteps()
+        self.assertEqual(self.calls, ['refine', 'solve'])
+
+    def test_until(self):
+        self.assertEqual(self.runSteps(until='refine'),
+                         {'mesh': 'success', 'refine': 'success'})
+        self.assertEqual(self.runSteps(), {'mesh': 'skipped',
+                                           'refine': 'skipped',
+                                           'solve': 'success'})
+
+    def test_force(self):
+        self.runSteps()
+        self.runSteps(force=True)
+        self.assertEqual(self.calls, ['mesh', 'refine', 'solve'])
+
+    def test_reset(self):
+        self.runSteps()
+        self.pipeline.reset('solve')
+        self.runSteps()
+        self.assertEqual(self.calls, ['solve'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,257 @@
+# coding=utf-8
+"""Tests for PolyMesh against blockMesh ordering.
+
+The expected mesh is built cell by cell from OpenFOAM's hex cell model the same
+way blockMesh and polyMesh build it: faces are collected from the cells and
+internal faces are sorted by owner and then by neighbour. Boundary faces are
+collected in the order of blockMesh's block::createBoundary.
+
+Recorded blockMesh output in tests/data/blockmesh is also compared if there is
+any. See README.md in the folder to record one.
+"""
+import os
+import re
+import shutil
+import tempfile
+import unittest
+from array import array
+
+from butterfly.blockMeshDict import BlockMeshDict
+from butterfly.polymesh import PolyMesh
+
+FOLDER = os.path.join(os.path.dirname(__file__), 'data', 'blockmesh')
+
+# faces of OpenFOAM's hex cell model
+HEXFACES = ((0, 4, 7, 3), (1, 2, 6, 5), (0, 1, 5, 4), (3, 7, 6, 2),
+            (0, 3, 2, 1), (4, 5, 6, 7))
+
+
+def readList(fp):
+    """Read an OpenFOAM list from a polyMesh file in ascii or binary format.
+
+    Returns:
+        A tuple of (header count, items). Each item is a tuple of numbers.
+    """
+    with open(fp, 'rb') as inf:
+        data = inf.read()
+
+    header = data[:data.index('}', data.index('FoamFile')) + 1]
+    fileFormat = re.search(r'format\s+(\w+);', header).group(1)
+    cls = re.search(r'class\s+(\w+);', header).group(1)
+    pos = len(header)
+
+    if fileFormat == 'ascii':
+        match = re.compile(r'(\d+)\s*\(').search(data, pos)
+        count = int(match.group(1))
+        if cls == 'labelList' and data[match.end()] != '\n':
+            # OpenFOAM writes short lists of labels in one line
+            values = data[match.end():data.index(')', match.end())].split()
+            return count, tuple((int(v),) for v in values)
+        lines = data[match.end():].strip().split('\n')
+        assert lines[count].strip() == ')', \
+            '{} has more or less than {} items.'.format(fp, count)
+        items = []
+        for line in lines[:count]:
+            line = line.strip()
+            if cls == 'faceList':
+                # remove number of points before the face
+                line = line[line.index('('):]
+            items.append(tuple(float(v) if cls == 'vectorField' else int(v)
+                               for v in re.findall(r'[-+.\deE]+', line)))
+        return count, tuple(items)
+
+    def binaryList(pos, typecode, size):
+        match = re.compile(r'(\d+)\s*\(').search(data, pos)
+        count = int(match.group(1))
+        values = array(typecode)
+        end = match.end() + count * size * values.itemsize
+        values.fromstring(data[match.end():end])
+        assert data[end] == ')', \
+            '{} has more or less than {} items.'.format(fp, count)
+        return count, tuple(tuple(values[i:i + size])
+                            for i in xrange(0, len(values), size)), end + 1
+
+    if cls == 'vectorField':
+        count, items, _ = binaryList(pos, 'd', 3)
+    elif cls == 'faceCompactList':
+        count, offsets, pos = binaryList(pos, 'i', 1)
+        _, indices, _ = binaryList(pos, 'i', 1)
+        # offsets has one more item than faces
+        count -= 1
+        items = tuple(tuple(i[0] for i in indices[offsets[f][0]:offsets[f + 1][0]])
+                      for f in xrange(count))
+    else:
+        count, items, _ = binaryList(pos, 'i', 1)
+    return count, items
+
+
+def readPolyMesh(folder):
+    """Read points, faces, owner and neighbour from a polyMesh folder."""
+    mesh = {}
+    for name in ('points', 'faces', 'owner', 'neighbour'):
+        count, items = readList(os.path.join(folder, name))
+        assert count == len(items)
+        mesh[name] = items if name in ('points', 'faces') else \
+            tuple(i[0] for i in items)
+    return mesh
+
+
+def blockMesh(minPt, maxPt, nDivXYZ, patches):
+    """Build a mesh for a box cell by cell in blockMesh order.
+
+    Args:
+        minPt: Minimum point of the box.
+        maxPt: Maximum point of the box.
+        nDivXYZ: Number of divisions in (x, y, z).
+        patches: A list of (name, blockFaces).
+    Returns:
+        A dictionary with points, faces, owner and neighbour.
+    """
+    nx, ny, nz = nDivXYZ
+
+    def vtxLabel(i, j, k):
+        return i + j * (nx + 1) + k * (nx + 1) * (ny + 1)
+
+    points = tuple(
+        tuple(mn + (mx - mn) * float(n) / d
+              for mn, mx, n, d in zip(minPt, maxPt, (i, j, k), nDivXYZ))
+        for k in xrange(nz + 1) for j in xrange(ny + 1) for i in xrange(nx + 1))
+
+    cells = tuple(
+        (vtxLabel(i, j, k), vtxLabel(i + 1, j, k), vtxLabel(i + 1, j + 1, k),
+         vtxLabel(i, j + 1, k), vtxLabel(i, j, k + 1),
+         vtxLabel(i + 1, j, k + 1), vtxLabel(i + 1, j + 1, k + 1),
+         vtxLabel(i, j + 1, k + 1))
+        for k in xrange(nz) for j in xrange(ny) for i in xrange(nx))
+
+    cellFaces = {}
+    for cell, shape in enumerate(cells):
+        for f in HEXFACES:
+            cellFaces.setdefault(frozenset(shape[i] for i in f), []).append(cell)
+
+    faces, owner, neighbour = [], [], []
+    for cell, shape in enumerate(cells):
+        # internal faces of the cell sorted by neighbour
+        internal = []
+        for f in HEXFACES:
+            face = tuple(shape[i] for i in f)
+            other = [c for c in cellFaces[frozenset(face)] if c != cell]
+            if other and other[0] > cell:
+                internal.append((other[0], face))
+        for nei, face in sorted(internal):
+            faces.append(face)
+            owner.append(cell)
+            neighbour.append(nei)
+
+    def boundaryFaces(blockFace):
+        # block::createBoundary
+        if blockFace == 0:
+            return [(vtxLabel(0, j, k), vtxLabel(0, j, k + 1),
+                     vtxLabel(0, j + 1, k + 1), vtxLabel(0, j + 1, k))
+                    for k in xrange(nz) for j in xrange(ny)]
+        elif blockFace == 1:
+            return [(vtxLabel(nx, j, k), vtxLabel(nx, j + 1, k),
+                     vtxLabel(nx, j + 1, k + 1), vtxLabel(nx, j, k + 1))
+                    for k in xrange(nz) for j in xrange(ny)]
+        elif blockFace == 2:
+            return [(vtxLabel(i, 0, k), vtxLabel(i + 1, 0, k),
+                     vtxLabel(i + 1, 0, k + 1), vtxLabel(i, 0, k + 1))
+                    for i in xrange(nx) for k in xrange(nz)]
+        elif blockFace == 3:
+            return [(vtxLabel(i, ny, k), vtxLabel(i, ny, k + 1),
+                     vtxLabel(i + 1, ny, k + 1), vtxLabel(i + 1, ny, k))
+                    for i in xrange(nx) for k in xrange(nz)]
+        elif blockFace == 4:
+            return [(vtxLabel(i, j, 0), vtxLabel(i, j + 1, 0),
+                     vtxLabel(i + 1, j + 1, 0), vtxLabel(i + 1, j, 0))
+                    for i in xrange(nx) for j in xrange(ny)]
+        return [(vtxLabel(i, j, nz), vtxLabel(i + 1, j, nz),
+                 vtxLabel(i + 1, j + 1, nz), vtxLabel(i, j + 1, nz))
+                for i in xrange(nx) for j in xrange(ny)]
+
+    for name, blockFaces in patches:
+        for blockFace in blockFaces:
+            for face in boundaryFaces(blockFace):
+                faces.append(face)
+                owner.append(cellFaces[frozenset(face)][0])
+
+    return {'points': points, 'faces': tuple(faces), 'owner': tuple(owner),
+            'neighbour': tuple(neighbour)}
+
+
+def recordings():
+    """Folders of recorded blockMesh output."""
+    if not os.path.isdir(FOLDER):
+        return []
+    return sorted(
+        os.path.join(FOLDER, f) for f in os.listdir(FOLDER)
+        if os.path.isfile(os.path.join(FOLDER, f, 'system', 'blockMeshDict')))
+
+
+class PolyMeshTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp(prefix='polymesh')
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def assertSameMesh(self, mesh, expected, places=5):
+        for name in ('faces', 'owner', 'neighbour'):
+            self.assertEqual(mesh[name], expected[name],
+                             '{} is not the same.'.format(name))
+        self.assertEqual(len(mesh['points']), len(expected['points']))
+        for pt, ept in zip(mesh['points'], expected['points']):
+            for c, ec in zip(pt, ept):
+                self.assertAlmostEqual(c, ec, places)
+
+    def save(self, mesh, fileFormat):
+        folder = os.path.join(self.folder, fileFormat)
+        mesh.save(folder, fileFormat)
+        return folder
+
+    def test_block_mesh_ordering(self):
+        patches = (('inlet', (0,)), ('outlet', (1,)), ('sides', (2, 3)),
+                   ('ground', (4,)), ('top', (5,)))
+        for nDivXYZ in ((1, 1, 1), (2, 2, 2), (4, 3, 2), (2, 5, 3)):
+            bmd = BlockMeshDict.fromMinMax((-2, 0, 1), (6, 3, 4), nDivXYZ=nDivXYZ)
+            mesh = PolyMesh(bmd.vertices, nDivXYZ,
+                            patches=[(n, 'patch', f) for n, f in patches])
+            expected = blockMesh((-2, 0, 1), (6, 3, 4), nDivXYZ, patches)
+            for fileFormat in ('ascii', 'binary'):
+                self.assertSameMesh(
+                    readPolyMesh(self.save(mesh, fileFormat)), expected)
+
+    def test_binary_header(self):
+        mesh = PolyMesh.fromBlockMeshDict(
+            BlockMeshDict.fromMinMax((0, 0, 0), (1, 1, 1), nDivXYZ=(2, 2, 2)))
+        folder = self.save(mesh, 'binary')
+        self.assertEqual(readList(os.path.join(folder, 'points'))[0], 27)
+        self.assertEqual(readList(os.path.join(folder, 'faces'))[0], 36)
+        self.assertEqual(readList(os.path.join(folder, 'owner'))[0], 36)
+        self.assertEqual(readList(os.path.join(folder, 'neighbour'))[0], 12)
+
+    def test_ascii_binary(self):
+        bmd = BlockMeshDict.fromMinMax((0, 0, 0), (10, 6, 3), nDivXYZ=(7, 5, 3))
+        mesh = PolyMesh.fromBlockMeshDict(bmd)
+        self.assertSameMesh(readPolyMesh(self.save(mesh, 'binary')),
+                            readPolyMesh(self.save(mesh, 'ascii')))
+
+    def test_recordings(self):
+        folders = recordings()
+        if not folders:
+            self.skipTest('No recorded blockMesh output in {}. See README.md in '
+                          'the folder to record one.'.format(FOLDER))
+
+        for folder in folders:
+            expected = readPolyMesh(os.path.join(folder, 'constant', 'polyMesh'))
+            bmd = BlockMeshDict.fromFile(
+                os.path.join(folder, 'system', 'blockMeshDict'))
+            mesh = PolyMesh.fromBlockMeshDict(bmd)
+            for fileFormat in ('ascii', 'binary'):
+                self.assertSameMesh(readPolyMesh(self.save(mesh, fileFormat)),
+                                    expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+# coding=utf-8
+"""Tests for ProbeMonitor."""
+import os
+import shutil
+import tempfile
+import unittest
+
+from butterfly.probemonitor import ProbeMonitor
+
+
+class ProbeMonitorTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp(prefix='probemonitor')
+        os.mkdir(os.path.join(self.folder, '0'))
+        self.monitor = ProbeMonitor(self.folder, fields=('p',), window=5,
+                                    tolerance=0.01)
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def write(self, times, mode='ab'):
+        with open(os.path.join(self.folder, '0', 'p'), mode) as outf:
+            outf.write(''.join('{} 1.0 2.0\n'.format(t) for t in times))
+
+    def test_stable(self):
+        self.write(range(1, 11))
+        status = self.monitor.check()
+        self.assertTrue(status.isStable)
+        self.assertEqual(status.timestep, 10)
+
+    def test_skip_existing(self):
+        # values of a previous run are stable
+        self.write(range(1, 11))
+        self.monitor.reset(skipExisting=True)
+        self.assertEqual(self.monitor.update(), 0)
+        self.assertFalse(self.monitor.check().isStable)
+
+        self.write(range(11, 14))
+        self.assertEqual(self.monitor.update(), 3)
+        self.assertFalse(self.monitor.check().isStable)
+        self.write(range(14, 16))
+        self.assertTrue(self.monitor.check().isStable)
+
+    def test_overwritten_file(self):
+        self.write(range(1, 11))
+        self.monitor.reset(skipExisting=True)
+        # a new run from the same time overwrites the file
+        self.write(range(1, 3), 'wb')
+        self.assertEqual(self.monitor.update(), 2)
+        self.assertEqual(self.monitor.latestTime, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
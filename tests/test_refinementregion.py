@@ -0,0 +1,140 @@
+# coding=utf-8
+"""Tests for wake refinement regions."""
+import math
+import unittest
+from collections import Counter
+
+from butterfly.geometry import BFGeometry
+from butterfly.refinementRegion import Distance, Inside, _extrude, \
+    wakeRefinementRegions
+from butterfly.windtunnel import WindTunnel, TunnelParameters
+
+from .test_scheduler import VERTICES, FACES
+
+
+def box(name, size=(1, 1, 1), origin=(0, 0, 0)):
+    return BFGeometry(name, tuple(
+        tuple(o + c * s for o, c, s in zip(origin, v, size)) for v in VERTICES),
+        FACES)
+
+
+def signedVolume(vertices, faces):
+    """Volume of a closed mesh. It is negative if faces point inward."""
+    volume = 0
+    for a, b, c in faces:
+        (x0, y0, z0), (x1, y1, z1), (x2, y2, z2) = \
+            vertices[a], vertices[b], vertices[c]
+        volume += (x0 * (y1 * z2 - z1 * y2) - y0 * (x1 * z2 - z1 * x2) +
+                   z0 * (x1 * y2 - y1 * x2)) / 6.0
+    return volume
+
+
+class WakeRefinementRegionTestCase(unittest.TestCase):
+
+    def assertClosedOutward(self, vertices, faces, volume=None):
+        # each edge is shared by two faces in opposite directions
+        edges = Counter((f[i], f[(i + 1) % 3]) for f in faces for i in range(3))
+        for (a, b), count in edges.items():
+            self.assertEqual(count, 1)
+            self.assertEqual(edges[(b, a)], 1)
+        v = signedVolume(vertices, faces)
+        self.assertGreater(v, 0)
+        if volume is not None:
+            self.assertAlmostEqual(v, volume)
+
+    def test_level(self):
+        cube = (box('cube'),)
+        for base, target, level in ((1, 1, 0), (1, 0.5, 1), (1, 0.3, 2),
+                                    (1, 0.25, 2), (2, 0.24, 4), (1, 2, 0)):
+            region, = wakeRefinementRegions(cube, (0, 1, 0), base, target)
+            self.assertIsInstance(region.refinementMode, Inside)
+            self.assertEqual(region.refinementMode.levels[0][1], level)
+
+    def test_distance_levels(self):
+        region, = wakeRefinementRegions((box('cube'),), (0, 1, 0), 1, 0.25,
+                                        mode='distance')
+        self.assertIsInstance(region.refinementMode, Distance)
+        # 3 cells of level 2 and then 3 cells of level 1
+        self.assertEqual(region.refinementMode.levels, ((0.75, 2), (2.25, 1)))
+
+        region, = wakeRefinementRegions((box('cube'),), (0, 1, 0), 1, 0.25,
+                                        mode='distance', nCellsBetweenLevels=2)
+        self.assertEqual(region.refinementMode.levels, ((0.5, 2), (1.5, 1)))
+
+        with self.assertRaises(AssertionError):
+            wakeRefinementRegions((box('cube'),), (0, 1, 0), 1, 0.25,
+                                  mode='outside')
+
+    def test_box(self):
+        geometry = box('building', (2, 1, 4), (10, 0, 0))
+        region, = wakeRefinementRegions((geometry,), (0, 5, 0), 1, 0.5)
+        self.assertEqual(region.name, 'wake_building')
+        # 0.5H on the sides, 1H upstream, 3H downstream and 0.5H above
+        self.assertEqual(tuple(round(v, 6) for v in region.min), (8, -4, 0))
+        self.assertEqual(tuple(round(v, 6) for v in region.max), (14, 13, 6))
+        self.assertClosedOutward(region.vertices, region.faceIndices,
+                                 6 * 17 * 6)
+
+    def test_rotated_wind(self):
+        windVector = (1, 1, 0)
+        region, = wakeRefinementRegions((box('cube'),), windVector, 1, 0.5)
+        yAxis = (math.sqrt(0.5), math.sqrt(0.5))
+        xAxis = (math.sqrt(0.5), -math.sqrt(0.5))
+        # size of the cube along and across the wind is sqrt(2)
+        size = math.sqrt(2)
+        along = [v[0] * yAxis[0] + v[1] * yAxis[1] for v in region.vertices]
+        across = [v[0] * xAxis[0] + v[1] * xAxis[1] for v in region.vertices]
+        self.assertAlmostEqual(max(along) - min(along), size + 1 + 3)
+        self.assertAlmostEqual(max(across) - min(across), size + 1)
+        # the cube starts at 0 along the wind
+        self.assertAlmostEqual(min(along), -1)
+        # all the vertices are on the corners of the box
+        for a, c in zip(along, across):
+            self.assertTrue(any(abs(a - e) < 1e-6
+                                for e in (min(along), max(along))))
+            self.assertTrue(any(abs(c - e) < 1e-6
+                                for e in (min(across), max(across))))
+        self.assertClosedOutward(region.vertices, region.faceIndices,
+                                 (size + 4) * (size + 1) * 1.5)
+
+    def test_footprint(self):
+        geometry = box('building', (2, 1, 4), (10, 0, 0))
+        region, = wakeRefinementRegions((geometry,), (0, 1, 0), 1, 0.5,
+                                        footprint=True)
+        # the footprint has the same bounds as the box but corners are cut
+        # between the moved points (2 x 4 upstream and 2 x 12 downstream)
+        self.assertEqual(tuple(round(v, 6) for v in region.min), (8, -4, 0))
+        self.assertEqual(tuple(round(v, 6) for v in region.max), (14, 13, 6))
+        self.assertClosedOutward(region.vertices, region.faceIndices,
+                                 (6 * 17 - 2 * 4 - 2 * 12) * 6)
+
+        region, = wakeRefinementRegions((box('cube'),), (1, 1, 0), 1, 0.5,
+                                        footprint=True)
+        self.assertClosedOutward(region.vertices, region.faceIndices)
+
+    def test_extrude(self):
+        outline = ((0, 0), (2, 0), (3, 1), (1, 2), (-1, 1))
+        vertices, faces = _extrude(outline, 1, 3)
+        self.assertEqual(len(vertices), 10)
+        # 3 faces at bottom and top and 2 for each side
+        self.assertEqual(len(faces), 16)
+        # area of the outline is 5
+        self.assertClosedOutward(vertices, faces, 5 * 2)
+
+    def test_wind_tunnel(self):
+        cube = box('cube')
+        wt = WindTunnel.fromGeometriesWindVectorAndParameters(
+            'wake', (cube,), (0, 4, 0), TunnelParameters(), 0.1)
+        count = len(wt.refinementRegions)
+        baseCellSize = max(
+            s / n for s, n in zip((wt.width, wt.length, wt.height),
+                                  wt.blockMeshDict.nDivXYZ))
+        regions = wt.addWakeRefinementRegions(baseCellSize / 4.0)
+        self.assertEqual(len(wt.refinementRegions), count + 1)
+        self.assertEqual([r.name for r in regions], ['wake_cube'])
+        self.assertEqual(regions[0].refinementMode.levels[0][1], 2)
+        self.assertAlmostEqual(regions[0].max[1], 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+# coding=utf-8
+"""Tests for DockerSession with a stand-in docker executable."""
+import os
+import time
+import threading
+import unittest
+
+from butterfly.runmanager import DockerSession
+
+from .fakefoam import FakeFoam
+
+# docker exec -i <container> su - ofuser > a bash shell on this machine
+DOCKER = '''#!/bin/sh
+exec bash
+'''
+
+
+@unittest.skipIf(os.name == 'nt', 'Stand-in executables are shell scripts.')
+class DockerSessionTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.foam = FakeFoam({'docker': DOCKER})
+        self.session = DockerSession('of_plus', self.foam.env())
+
+    def tearDown(self):
+        self.session.close()
+        self.foam.close()
+
+    def execute(self, script, timeout=10):
+        """Execute a script and fail if it doesn't finish before timeout."""
+        result = []
+        t = threading.Thread(target=lambda: result.append(
+            self.session.execute(script)))
+        t.daemon = True
+        t.start()
+        t.join(timeout)
+        if not result:
+            self.fail('{} has not finished in {} seconds.'.format(script, timeout))
+        return result[0]
+
+    def test_exit_code(self):
+        self.assertEqual(self.execute('true'), 0)
+        self.assertEqual(self.execute('exit 3'), 3)
+        self.assertEqual(self.execute('false && true'), 1)
+        # the session is still alive after a failed script
+        self.assertTrue(self.session.isAlive)
+        self.assertEqual(self.execute('true'), 0)
+
+    def test_stdin(self):
+        # commands can't read the lines that are sent to the shell
+        self.assertEqual(self.execute('cat > /dev/null'), 0)
+        self.assertEqual(self.execute('read line; test -z "$line"'), 0)
+
+    def test_quotes(self):
+        fp = os.path.join(self.foam.folder, 'quotes.txt')
+        script = "cd {} && bash -c 'echo \"it'\\''s\" > quotes.txt'".format(
+            self.foam.folder)
+        self.assertEqual(self.execute(script), 0)
+        with open(fp, 'rb') as inf:
+            self.assertEqual(inf.read().strip(), "it's")
+
+    def test_busy(self):
+        fp = os.path.join(self.foam.folder, 'started')
+        result = []
+        t = threading.Thread(target=lambda: result.append(
+            self.session.execute('touch {} && sleep 1'.format(fp))))
+        t.daemon = True
+        t.start()
+        end = time.time() + 10
+        while not os.path.isfile(fp) and time.time() < end:
+            time.sleep(0.05)
+        self.assertTrue(self.session.isBusy)
+        # the caller can start a new docker exec instead of waiting
+        self.assertIsNone(self.session.execute('true', blocking=False))
+        t.join(10)
+        self.assertEqual(result, [0])
+        self.assertFalse(self.session.isBusy)
+        self.assertEqual(self.session.execute('true', blocking=False), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
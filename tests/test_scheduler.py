@@ -0,0 +1,174 @@
+# coding=utf-8
+"""Tests for BatchScheduler with a fake solver executable."""
+import os
+import time
+import unittest
+
+from butterfly.case import Case
+from butterfly.geometry import BFGeometry
+from butterfly.recipe import SteadyIncompressible
+from butterfly.decomposeParDict import DecomposeParDict
+from butterfly.localrunmanager import LocalRunManager
+from butterfly.scheduler import Job, BatchScheduler
+
+from .fakefoam import FakeFoam, isAlive
+
+# a fake solver which writes start and end time to solver.log in the case folder.
+# FAKESOLVER_TIME sets the duration and FAKESOLVER_FAILURES sets the number of
+# times that the solver fails before it succeeds.
+SOLVER = '''#!/bin/sh
+echo $$ > solver.pid
+echo "start $(date +%s.%N)" >> solver.log
+failures=$(cat failures 2>/dev/null || echo 0)
+if [ "$failures" -lt "${FAKESOLVER_FAILURES:-0}" ]; then
+    echo $((failures + 1)) > failures
+    echo "fake failure" >&2
+    exit 1
+fi
+sleep ${FAKESOLVER_TIME:-0}
+echo "end $(date +%s.%N)" >> solver.log
+'''
+
+VERTICES = ((0, 0, 0), (1, 0, 0), (1, 1, 0), (0, 1, 0),
+            (0, 0, 1), (1, 0, 1), (1, 1, 1), (0, 1, 1))
+FACES = ((0, 2, 1), (0, 3, 2), (4, 5, 6), (4, 6, 7), (0, 1, 5), (0, 5, 4),
+         (1, 2, 6), (1, 6, 5), (2, 3, 7), (2, 7, 6), (3, 0, 4), (3, 4, 7))
+
+
+class TerminateCounter(LocalRunManager):
+    """LocalRunManager which counts the calls to terminate."""
+
+    terminated = 0
+
+    def terminate(self, force=False):
+        TerminateCounter.terminated += 1
+        super(TerminateCounter, self).terminate(force)
+
+
+@unittest.skipIf(os.name == 'nt', 'Stand-in executables are shell scripts.')
+class BatchSchedulerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.foam = FakeFoam({'simpleFoam': SOLVER})
+
+    def tearDown(self):
+        self.foam.close()
+
+    def job(self, name, cores=1, priority=0, retries=0, duration=0.3,
+            failures=0, runmanager=LocalRunManager):
+        geometry = BFGeometry('cube', VERTICES, FACES)
+        case = Case.fromBFGeometries(name, (geometry,))
+        case.workingDir = self.foam.folder
+        case.save(overwrite=True)
+        case.runmanager = runmanager(
+            name, case.projectDir, self.foam.env(FAKESOLVER_TIME=duration,
+                                                 FAKESOLVER_FAILURES=failures),
+            report=False)
+        dpd = DecomposeParDict.scotch(cores) if cores > 1 else None
+        return Job(case, SteadyIncompressible(), dpd, priority, retries)
+
+    @staticmethod
+    def times(job):
+        """Start and end time of the fake solver for a job."""
+        with open(os.path.join(job.case.projectDir, 'solver.log'), 'rb') as inf:
+            values = [l.split() for l in inf.read().splitlines()]
+        return [float(v[1]) for v in values]
+
+    def run(self, result=None):
+        # don't let a failed test leave running jobs behind
+        self.scheduler = None
+        try:
+            super(BatchSchedulerTestCase, self).run(result)
+        finally:
+            if self.scheduler:
+                self.scheduler.terminate()
+
+    def test_core_budget(self):
+        used = []
+        self.scheduler = BatchScheduler(
+            4, 0.05, callback=lambda p: used.append(p.usedCores))
+        self.scheduler.addJobs(self.job('j%d' % i, cores=2) for i in range(5))
+        progress = self.scheduler.run()
+        self.assertEqual(progress.succeeded, 5)
+        self.assertEqual(progress.percentage, 100)
+        self.assertEqual(max(used), 4)
+        # only two jobs can run at the same time
+        intervals = sorted(self.times(j) for j in self.scheduler.jobs)
+        for count, (start, end) in enumerate(intervals[2:]):
+            self.assertGreaterEqual(start, intervals[count][1])
+
+    def test_too_many_cores(self):
+        self.scheduler = BatchScheduler(2)
+        self.assertRaises(ValueError, self.scheduler.add, self.job('j', 4))
+
+    def test_priority(self):
+        self.scheduler = BatchScheduler(1, 0.05)
+        jobs = [self.job('j%d' % p, priority=p, duration=0.1) for p in range(3)]
+        self.scheduler.addJobs(jobs)
+        self.scheduler.run()
+        starts = [self.times(j)[0] for j in jobs]
+        self.assertEqual(sorted(starts, reverse=True), starts)
+
+    def test_retry(self):
+        self.scheduler = BatchScheduler(2, 0.05)
+        retried = self.job('retried', retries=2, failures=2)
+        failed = self.job('failed', retries=1, failures=2)
+        self.scheduler.addJobs((retried, failed))
+        progress = self.scheduler.run()
+        self.assertEqual((progress.succeeded, progress.failed), (1, 1))
+        self.assertEqual((retried.status, retried.attempts), ('succeeded', 3))
+        self.assertEqual((failed.status, failed.attempts), ('failed', 2))
+        self.assertIn('fake failure', failed.error)
+
+    def test_backfill(self):
+        # a 2-core job waits for a long job. smaller jobs can use the free core.
+        self.scheduler = BatchScheduler(2, 0.05, backfillTime=None)
+        self.scheduler.add(self.job('long', duration=1))
+        self.scheduler.step()
+        large = self.job('large', cores=2, priority=1, duration=0.1)
+        small = [self.job('small%d' % i, duration=0.3) for i in range(6)]
+        self.scheduler.addJobs([large] + small)
+        self.scheduler.run()
+        largeStart = self.times(large)[0]
+        self.assertTrue(all(self.times(j)[0] < largeStart for j in small))
+
+    def test_reservation(self):
+        # once the waiting time is over the cores are reserved for large job
+        self.scheduler = BatchScheduler(2, 0.05, backfillTime=0)
+        self.scheduler.add(self.job('long', duration=0.5))
+        self.scheduler.step()
+        large = self.job('large', cores=2, priority=1, duration=0.1)
+        small = [self.job('small%d' % i, duration=0.3) for i in range(3)]
+        self.scheduler.addJobs([large] + small)
+        self.scheduler.step()
+        self.assertIs(self.scheduler.reserved, large)
+        self.scheduler.run()
+        largeStart = self.times(large)[0]
+        self.assertTrue(all(self.times(j)[0] > largeStart for j in small))
+
+    def test_terminate(self):
+        self.scheduler = BatchScheduler(2, 0.05)
+        job = self.job('j', duration=60, runmanager=TerminateCounter)
+        queued = self.job('queued')
+        self.scheduler.addJobs((job, self.job('k', duration=60), queued))
+        self.scheduler.step()
+        pidFile = os.path.join(job.case.projectDir, 'solver.pid')
+        end = time.time() + 10
+        while not os.path.isfile(pidFile) and time.time() < end:
+            time.sleep(0.05)
+        with open(pidFile, 'rb') as inf:
+            pid = int(inf.read())
+
+        self.scheduler.terminate()
+        self.scheduler = None
+        self.assertEqual(TerminateCounter.terminated, 1)
+        self.assertEqual(job.status, 'cancelled')
+        self.assertEqual(queued.status, 'cancelled')
+        end = time.time() + 10
+        while isAlive(pid) and time.time() < end:
+            time.sleep(0.05)
+        self.assertFalse(isAlive(pid))
+
+
+if __name__ == '__main__':
+    unittest.main()
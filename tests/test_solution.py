@@ -0,0 +1,103 @@
+# coding=utf-8
+"""Tests for Solution with stand-in executables."""
+import os
+import time
+import unittest
+
+from butterfly.case import Case
+from butterfly.geometry import BFGeometry
+from butterfly.recipe import SteadyIncompressible
+from butterfly.solution import Solution
+from butterfly.localrunmanager import LocalRunManager
+
+from .fakefoam import FakeFoam, isAlive
+from .test_scheduler import VERTICES, FACES
+
+# a command that writes its pid to <name>.pid in the case folder and runs until
+# it is terminated. It doesn't write on writeNow.
+RUNNER = '''#!/bin/sh
+echo $$ > $(basename "$0").pid
+sleep 60 &
+wait
+'''
+
+
+def readPid(projectDir, name, timeout=10):
+    fp = os.path.join(projectDir, '{}.pid'.format(name))
+    end = time.time() + timeout
+    while time.time() < end:
+        if os.path.isfile(fp) and os.path.getsize(fp):
+            with open(fp, 'rb') as inf:
+                return int(inf.read().strip())
+        time.sleep(0.05)
+    raise ValueError('{} is not started.'.format(name))
+
+
+@unittest.skipIf(os.name == 'nt', 'Stand-in executables are shell scripts.')
+class SolutionTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.foam = FakeFoam({'simpleFoam': RUNNER, 'checkMesh': RUNNER})
+        case = Case.fromBFGeometries('solution',
+                                     (BFGeometry('cube', VERTICES, FACES),))
+        case.workingDir = self.foam.folder
+        case.save(overwrite=True)
+        case.runmanager = LocalRunManager(case.projectName, case.projectDir,
+                                          self.foam.env(), report=False)
+        self.case = case
+
+    def tearDown(self):
+        self.case.runmanager.terminate(force=True)
+        self.foam.close()
+
+    def test_stop_only_terminates_the_solver(self):
+        other = self.case.commandAsync('checkMesh')
+        solution = Solution(self.case, SteadyIncompressible())
+        future = solution.run()
+        solver = readPid(self.case.projectDir, 'simpleFoam')
+        checkMesh = readPid(self.case.projectDir, 'checkMesh')
+
+        stop = solution.stop(timeout=0.5, killTimeout=5)
+        self.assertEqual(stop.signal, 'SIGTERM')
+        self.assertTrue(future.wait(5))
+        self.assertFalse(isAlive(solver))
+        # the other command of the case is still running
+        self.assertTrue(isAlive(checkMesh))
+        self.assertFalse(other.isDone)
+
+        solution.terminate()
+        self.assertTrue(isAlive(checkMesh))
+        other.cancel()
+        self.assertTrue(other.wait(5))
+
+    def test_failed_solution(self):
+        self.foam.add('simpleFoam', '#!/bin/sh\necho diverged >&2\nexit 1\n')
+        solution = Solution(self.case, SteadyIncompressible())
+        self.assertIsNone(solution.success)
+        solution.run().wait(5)
+        # failure is reported with no AssertionError
+        self.assertFalse(solution.isRunning)
+        self.assertFalse(solution.isRunning)
+        self.assertFalse(solution.success)
+        self.assertEqual(solution.error, 'diverged')
+
+    def test_async_command_is_recorded(self):
+        # the run manager doesn't record the commands
+        future = self.case.commandAsync('checkMesh')
+        readPid(self.case.projectDir, 'checkMesh')
+        self.assertEqual(self.case.runReport.commands, ())
+        future.cancel()
+        self.assertTrue(future.wait(5))
+        # the command is recorded from a done callback
+        end = time.time() + 5
+        while not self.case.runReport.commands and time.time() < end:
+            time.sleep(0.05)
+        record, = self.case.runReport.commands
+        self.assertEqual(record.name, 'checkMesh')
+        self.assertEqual(record.exitCode, future.returncode)
+        self.assertIsNone(record.bytesWritten)
+
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+# coding=utf-8
+"""Tests for parseTime and TimeIndex."""
+import os
+import time
+import shutil
+import tempfile
+import unittest
+
+from butterfly.timeindex import TimeIndex, parseTime
+
+
+class ParseTimeTestCase(unittest.TestCase):
+
+    def test_integer(self):
+        for value in ('100', '0', '1e3', '100.0'):
+            self.assertIsInstance(parseTime(value), int)
+        self.assertEqual(parseTime('1e3'), 1000)
+
+    def test_float(self):
+        self.assertEqual(parseTime('0.01'), 0.01)
+        self.assertEqual(parseTime('1e-05'), 1e-05)
+        self.assertEqual(parseTime('-0.5'), -0.5)
+
+    def test_invalid(self):
+        for value in ('1.org', 'constant', 'inf', 'nan', ''):
+            with self.assertRaises(ValueError):
+                parseTime(value)
+
+
+class TimeIndexTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp(prefix='timeindex')
+        TimeIndex.clearCache()
+
+    def tearDown(self):
+        TimeIndex.clearCache()
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def mkdirs(self, names, folder=None):
+        for name in names:
+            os.mkdir(os.path.join(folder or self.folder, name))
+
+    def setMtime(self, folder, mtime):
+        os.utime(folder, (mtime, mtime))
+
+    def test_order(self):
+        self.mkdirs(('0', '0.1', '0.02', '1e-05', '10', '2', '1.5',
+                     'constant', 'system', '1.org', 'processor0'))
+        # files are not time folders
+        open(os.path.join(self.folder, '3'), 'wb').close()
+        ti = TimeIndex(self.folder)
+        self.assertEqual(ti.names,
+                         ('0', '1e-05', '0.02', '0.1', '1.5', '2', '10'))
+        self.assertEqual(ti.times, (0, 1e-05, 0.02, 0.1, 1.5, 2, 10))
+        self.assertEqual(ti.latest, 10)
+        self.assertEqual(ti.latestName, '10')
+
+    def test_missing_directory(self):
+        ti = TimeIndex(os.path.join(self.folder, 'missing'))
+        self.assertEqual(ti.items, ())
+        self.assertIsNone(ti.latest)
+
+    def test_same_tick(self):
+        self.mkdirs(('0',))
+        mtime = int(time.time())
+        self.setMtime(self.folder, mtime)
+        self.assertEqual(TimeIndex(self.folder).names, ('0',))
+        # a folder is created in the same tick of a coarse file system
+        self.mkdirs(('1',))
+        self.setMtime(self.folder, mtime)
+        self.assertEqual(TimeIndex(self.folder).names, ('0', '1'))
+
+    def test_cache(self):
+        self.mkdirs(('0',))
+        mtime = time.time() - 60
+        self.setMtime(self.folder, mtime)
+        self.assertEqual(TimeIndex(self.folder).names, ('0',))
+        # an old modification time is trusted
+        self.mkdirs(('1',))
+        self.setMtime(self.folder, mtime)
+        self.assertEqual(TimeIndex(self.folder).names, ('0',))
+        TimeIndex.clearCache(self.folder)
+        self.assertEqual(TimeIndex(self.folder).names, ('0', '1'))
+
+    def test_cache_size(self):
+        maxSize = TimeIndex.MAXCACHESIZE
+        TimeIndex.MAXCACHESIZE = 2
+        try:
+            folders = [os.path.join(self.folder, str(i)) for i in range(3)]
+            mtime = time.time() - 60
+            for folder in folders:
+                os.mkdir(folder)
+                self.mkdirs(('0',), folder)
+                self.setMtime(folder, mtime)
+                TimeIndex(folder).names
+
+            # the first folder is removed from the cache
+            for folder in folders:
+                self.mkdirs(('1',), folder)
+                self.setMtime(folder, mtime)
+            self.assertEqual(TimeIndex(folders[0]).names, ('0', '1'))
+            self.assertEqual(TimeIndex(folders[2]).names, ('0',))
+        finally:
+            TimeIndex.MAXCACHESIZE = maxSize
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+# coding=utf-8
+"""Tests for folder utilities."""
+import os
+import errno
+import shutil
+import tempfile
+import unittest
+
+from butterfly import utilities
+from butterfly.utilities import linktree, movetree, removetree
+
+
+class FolderTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp(prefix='utilities')
+        self.source = os.path.join(self.folder, 'source')
+        self.write(os.path.join(self.source, 'points'), 'points')
+        self.write(os.path.join(self.source, 'sets', 'walls'), 'walls')
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def write(self, fp, content):
+        if not os.path.isdir(os.path.dirname(fp)):
+            os.makedirs(os.path.dirname(fp))
+        with open(fp, 'wb') as outf:
+            outf.write(content)
+
+    def read(self, fp):
+        with open(fp, 'rb') as inf:
+            return inf.read()
+
+    def files(self, folder):
+        return sorted(os.path.relpath(os.path.join(root, f), folder)
+                      for root, dirs, fs in os.walk(folder) for f in fs)
+
+    @unittest.skipUnless(hasattr(os, 'link'), 'Hardlinks are not supported.')
+    def test_linktree(self):
+        target = os.path.join(self.folder, 'target')
+        self.write(os.path.join(target, 'points'), 'old points')
+        self.assertEqual(linktree(self.source, target), 0)
+        self.assertEqual(self.files(target), self.files(self.source))
+        self.assertEqual(self.read(os.path.join(target, 'points')), 'points')
+        # files share the same data
+        self.assertTrue(os.path.samefile(os.path.join(target, 'sets', 'walls'),
+                                         os.path.join(self.source, 'sets',
+                                                      'walls')))
+
+    def test_linktree_copy(self):
+        target = os.path.join(self.folder, 'target')
+        self.assertEqual(linktree(self.source, target, ignore=('points',),
+                                  hardlink=False), 1)
+        self.assertEqual(self.files(target), [os.path.join('sets', 'walls')])
+        fp = os.path.join(target, 'sets', 'walls')
+        self.assertFalse(os.path.samefile(
+            fp, os.path.join(self.source, 'sets', 'walls')))
+        # changing the copy in place doesn't change the source
+        with open(fp, 'r+b') as outf:
+            outf.write('W')
+        self.assertEqual(self.read(os.path.join(self.source, 'sets', 'walls')),
+                         'walls')
+
+    def test_movetree(self):
+        files = self.files(self.source)
+        target = os.path.join(self.folder, 'target')
+        self.assertEqual(movetree(self.source, target), target)
+        self.assertFalse(os.path.exists(self.source))
+        self.assertEqual(self.files(target), files)
+
+    def test_movetree_across_file_systems(self):
+        files = self.files(self.source)
+        target = os.path.join(self.folder, 'target')
+        rename = utilities.os.rename
+
+        def failingRename(s, t):
+            raise OSError(errno.EXDEV, 'Invalid cross-device link')
+
+        utilities.os.rename = failingRename
+        try:
+            movetree(self.source, target)
+        finally:
+            utilities.os.rename = rename
+
+        self.assertFalse(os.path.exists(self.source))
+        self.assertEqual(self.files(target), files)
+
+    def test_removetree(self):
+        self.assertIsNone(removetree(os.path.join(self.folder, 'missing')))
+        self.assertIsNone(removetree(self.source, wait=True))
+        self.assertEqual(os.listdir(self.folder), [])
+
+    def test_removetree_background(self):
+        t = removetree(self.source)
+        # the folder is renamed before it is removed
+        self.assertFalse(os.path.exists(self.source))
+        t.join(10)
+        self.assertFalse(t.is_alive())
+        # trash folder is removed
+        self.assertEqual(os.listdir(self.folder), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+# coding=utf-8
+"""Tests for frontal area and tunnel parameters."""
+import math
+import unittest
+
+from butterfly.geometry import BFGeometry
+from butterfly.windtunnel import TunnelParameters, frontalArea
+
+from .test_scheduler import VERTICES, FACES
+
+
+def box(name, size=(1, 1, 1), origin=(0, 0, 0)):
+    return BFGeometry(name, tuple(
+        tuple(o + c * s for o, c, s in zip(origin, v, size)) for v in VERTICES),
+        FACES)
+
+
+class FrontalAreaTestCase(unittest.TestCase):
+
+    def test_cube(self):
+        cube = box('cube', (2, 3, 4))
+        # H * W for the wind along each axis
+        self.assertAlmostEqual(frontalArea((cube,), (0, 1, 0)), 8, 2)
+        self.assertAlmostEqual(frontalArea((cube,), (-1, 0, 0)), 12, 2)
+        # z value of wind vector is ignored
+        self.assertAlmostEqual(frontalArea((cube,), (0, 1, 1)), 8, 2)
+
+    def test_rotated_wind(self):
+        cube = box('cube')
+        self.assertAlmostEqual(frontalArea((cube,), (1, 1, 0)), math.sqrt(2),
+                               2)
+
+    def test_overlapping_boxes(self):
+        # the second box is behind the first one
+        boxes = (box('front'), box('back', origin=(0.5, 2, 0)))
+        self.assertAlmostEqual(frontalArea(boxes, (0, 1, 0)), 1.5, 2)
+        # fully hidden
+        boxes = (box('front'), box('back', (0.5, 1, 0.5), (0.25, 3, 0)))
+        self.assertAlmostEqual(frontalArea(boxes, (0, 1, 0)), 1, 2)
+
+    def test_no_geometry(self):
+        self.assertEqual(frontalArea((), (0, 1, 0)), 0)
+
+
+class TunnelParametersTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.geometries = (box('cube'),)
+        self.windVector = (0, 4, 0)
+
+    def test_domain_size(self):
+        tp = TunnelParameters()
+        self.assertEqual(tp.domainSize(self.geometries, self.windVector),
+                         (5, 19, 3))
+        self.assertAlmostEqual(
+            tp.blockageRatio(self.geometries, self.windVector), 1 / 15.0, 3)
+
+    def test_guideline_distances(self):
+        tp = TunnelParameters.fromBlockageRatio(self.geometries,
+                                                self.windVector)
+        # blockage ratio is already met for the minimum distances
+        self.assertEqual((tp.windward, tp.top, tp.side, tp.leeward),
+                         (5, 6, 5, 15))
+        self.assertLess(tp.blockageRatio(self.geometries, self.windVector),
+                        0.03)
+
+    def test_blockage_ratio(self):
+        tp = TunnelParameters.fromBlockageRatio(self.geometries,
+                                                self.windVector, 0.005)
+        ratio = tp.blockageRatio(self.geometries, self.windVector)
+        self.assertLessEqual(ratio, 0.005 * 1.001)
+        self.assertGreater(ratio, 0.005 * 0.99)
+        # top and side are increased by the same value
+        self.assertAlmostEqual(tp.top - 6, tp.side - 5, 2)
+        self.assertGreater(tp.side, 5)
+        self.assertEqual((tp.windward, tp.leeward), (5, 15))
+
+    def test_invalid_blockage_ratio(self):
+        with self.assertRaises(AssertionError):
+            TunnelParameters.fromBlockageRatio(self.geometries,
+                                               self.windVector, 0)
+
+    def test_cell_savings(self):
+        tp = TunnelParameters(windward=5, top=6, side=5, leeward=15)
+        savings = tp.cellSavings(self.geometries, self.windVector)
+        self.assertEqual(savings.volume, 11 * 21 * 6)
+        self.assertEqual(savings.referenceVolume, 5 * 19 * 3)
+        self.assertAlmostEqual(savings.savings, 1 - 1386 / 285.0)
+        self.assertLess(savings.savings, 0)
+
+        smaller = TunnelParameters(windward=3, top=3, side=1, leeward=15)
+        savings = smaller.cellSavings(self.geometries, self.windVector)
+        self.assertAlmostEqual(savings.savings, 1 - 3 * 19 * 3 / 285.0)
+
+        savings = tp.cellSavings(self.geometries, self.windVector, tp)
+        self.assertEqual(savings.savings, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()